@@ -0,0 +1,29 @@
+import timeit
+
+import torch
+
+from vigision.pose_nms import pose_nms
+from vigision.test.test_pose_nms import create_poses, reference_pose_nms, run_pose_nms
+
+# compare the vectorized pose nms with the original loop based implementation
+for persons in [1, 5, 20, 50]:
+    poses = create_poses(persons, 3)
+    result = run_pose_nms(pose_nms, poses)
+    expected = run_pose_nms(reference_pose_nms, poses)
+
+    parity = len(result) == len(expected) and all(
+        torch.equal(r["bbox"], e["bbox"])
+        and torch.allclose(r["keypoints"], e["keypoints"], atol=1e-4)
+        and torch.allclose(r["kp_score"], e["kp_score"], atol=1e-4)
+        for r, e in zip(result, expected)
+    )
+
+    duration = timeit.timeit(lambda: run_pose_nms(pose_nms, poses), number=50) / 50
+    reference_duration = (
+        timeit.timeit(lambda: run_pose_nms(reference_pose_nms, poses), number=50) / 50
+    )
+    print(
+        f"{len(poses[0])} poses, {len(result)} kept, parity: {parity}, "
+        f"vectorized: {duration * 1000:.2f}ms, "
+        f"reference: {reference_duration * 1000:.2f}ms"
+    )
@@ -0,0 +1,33 @@
+import timeit
+
+from norfair.distances import ScalarDistance, VectorizedDistance
+
+from vigision.test.test_norfair_tracker import create_scene, track_scene
+from vigision.track.norfair_tracker import distance_matrix, vigision_distance
+
+# compare the tracker distance matrix with the original pairwise distance
+for objects in [5, 20, 50]:
+    scene = create_scene(objects, 50)
+    matches = track_scene(scene, VectorizedDistance(distance_matrix))
+    expected = track_scene(scene, ScalarDistance(vigision_distance))
+
+    duration = (
+        timeit.timeit(
+            lambda: track_scene(scene, VectorizedDistance(distance_matrix)), number=5
+        )
+        / 5
+        / len(scene)
+    )
+    reference_duration = (
+        timeit.timeit(
+            lambda: track_scene(scene, ScalarDistance(vigision_distance)), number=5
+        )
+        / 5
+        / len(scene)
+    )
+    print(
+        f"{objects} objects, {sum(len(m) for m in matches)} matches, "
+        f"parity: {matches == expected}, "
+        f"vectorized: {duration * 1000:.2f}ms/frame, "
+        f"pairwise: {reference_duration * 1000:.2f}ms/frame"
+    )
@@ -35,9 +35,11 @@ from vigision.const import (
     CONFIG_DIR,
     DEFAULT_DB_PATH,
     EXPORT_DIR,
+    FRAME_RING_SLOTS,
     MODEL_CACHE_DIR,
     RECORD_DIR,
 )
+from vigision.detect_rate import DetectRateController
 from vigision.events.audio import listen_to_audio
 from vigision.events.cleanup import EventCleanup
 from vigision.events.external import ExternalEventProcessor
@@ -55,10 +57,19 @@ from vigision.models import (
     User,
     OTP,
 )
-from vigision.object_detection import ObjectDetectProcess
+from vigision.object_detection import (
+    DETECTION_SLOTS,
+    ObjectDetectProcess,
+    detection_output_size,
+)
 from vigision.object_processing import TrackedObjectProcessor
 from vigision.output.output import output_frames
 from vigision.plus import PlusApi
+from vigision.pose_estimation import (
+    PoseEstimateProcess,
+    PoseInputBuffers,
+    PoseOutputBuffers,
+)
 from vigision.ptz.autotrack import PtzAutoTrackerThread
 from vigision.ptz.onvif import OnvifController
 from vigision.record.cleanup import RecordingCleanup
@@ -72,6 +83,7 @@ from vigision.timeline import TimelineProcessor
 from vigision.types import CameraMetricsTypes, PTZMetricsTypes
 from vigision.util.builtin import empty_and_close_queue, save_default_config
 from vigision.util.config import migrate_vigision_config
+from vigision.util.image import SharedFrameRing
 from vigision.util.object import get_camera_regions_grid
 from vigision.version import VERSION
 from vigision.video import capture_camera, track_camera
@@ -85,8 +97,13 @@ class VigisionApp:
         self.stop_event: MpEvent = mp.Event()
         self.detection_queue: Queue = mp.Queue()
         self.detectors: dict[str, ObjectDetectProcess] = {}
-        self.detection_out_events: dict[str, MpEvent] = {}
+        self.detection_out_events: dict[str, list[MpEvent]] = {}
         self.detection_shms: list[mp.shared_memory.SharedMemory] = []
+        self.frame_rings: list[SharedFrameRing] = []
+        self.pose_queues: list[Queue] = [mp.Queue()]
+        self.camera_pose_queues: dict[str, Queue] = {}
+        self.pose_estimators: dict[str, PoseEstimateProcess] = {}
+        self.pose_out_events: dict[str, MpEvent] = {}
         self.log_queue: Queue = mp.Queue()
         self.plus_api = PlusApi()
         self.camera_metrics: dict[str, CameraMetricsTypes] = {}
@@ -153,10 +170,19 @@ class VigisionApp:
                 # issue https://github.com/python/typeshed/issues/8799
                 # from mypy 0.981 onwards
                 "skipped_fps": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
+                "short_reads": mp.Value("i", 0),  # type: ignore[typeddict-item]
+                "corrupt_reads": mp.Value("i", 0),  # type: ignore[typeddict-item]
                 # issue https://github.com/python/typeshed/issues/8799
                 # from mypy 0.981 onwards
                 "process_fps": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
                 "detection_fps": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
+                "detection_dropped": mp.Value("i", 0),  # type: ignore[typeddict-item]
+                "detect_rate": mp.Value(  # type: ignore[typeddict-item]
+                    "d", float(self.config.cameras[camera_name].detect.fps)
+                ),
+                "detect_priority": mp.Value("i", 0),  # type: ignore[typeddict-item]
+                "mosaic_fill": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
+                "fall_filtered": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
                 # issue https://github.com/python/typeshed/issues/8799
                 # from mypy 0.981 onwards
                 "detection_frame": mp.Value("d", 0.0),  # type: ignore[typeddict-item]
@@ -405,8 +431,12 @@ class VigisionApp:
         )
 
     def start_detectors(self) -> None:
-        for name in self.config.cameras.keys():
-            self.detection_out_events[name] = mp.Event()
+        for name, camera_config in self.config.cameras.items():
+            self.detection_out_events[name] = [
+                mp.Event() for _ in range(DETECTION_SLOTS)
+            ]
+            # one input slot per region of every request in flight
+            region_slots = camera_config.detect.max_regions * DETECTION_SLOTS
 
             try:
                 largest_frame = max(
@@ -418,14 +448,16 @@ class VigisionApp:
                 shm_in = mp.shared_memory.SharedMemory(
                     name=name,
                     create=True,
-                    size=largest_frame,
+                    size=largest_frame * region_slots,
                 )
             except FileExistsError:
                 shm_in = mp.shared_memory.SharedMemory(name=name)
 
             try:
                 shm_out = mp.shared_memory.SharedMemory(
-                    name=f"out-{name}", create=True, size=20 * 6 * 4
+                    name=f"out-{name}",
+                    create=True,
+                    size=detection_output_size(camera_config.detect.max_regions),
                 )
             except FileExistsError:
                 shm_out = mp.shared_memory.SharedMemory(name=f"out-{name}")
@@ -439,6 +471,84 @@ class VigisionApp:
                 self.detection_queue,
                 self.detection_out_events,
                 detector_config,
+                {
+                    camera: self.camera_metrics[camera]["detection_dropped"]
+                    for camera in self.detection_out_events
+                },
+            )
+
+    def start_pose_estimators(self) -> None:
+        max_persons = self.config.pose_estimator.max_persons
+
+        for name, camera_config in self.config.cameras.items():
+            if not camera_config.fall_detect.enabled:
+                continue
+
+            self.pose_out_events[name] = mp.Event()
+
+            try:
+                shm_in = mp.shared_memory.SharedMemory(
+                    name=f"pose-{name}",
+                    create=True,
+                    size=PoseInputBuffers.size(max_persons),
+                )
+            except FileExistsError:
+                shm_in = mp.shared_memory.SharedMemory(name=f"pose-{name}")
+
+            try:
+                shm_out = mp.shared_memory.SharedMemory(
+                    name=f"pose-out-{name}",
+                    create=True,
+                    size=PoseOutputBuffers.size(max_persons),
+                )
+            except FileExistsError:
+                shm_out = mp.shared_memory.SharedMemory(name=f"pose-out-{name}")
+
+            self.detection_shms.append(shm_in)
+            self.detection_shms.append(shm_out)
+
+        if not self.pose_out_events:
+            return
+
+        device = "cpu"
+        if any(det.type == "gpu" for det in self.config.detectors.values()):
+            device = "cuda"
+
+        workers = self.config.pose_estimator.workers
+        if self.config.pose_estimator.streaming_fall:
+            # the fall streams of a camera live in the worker that sees all its poses
+            self.pose_queues += [mp.Queue() for _ in range(workers - 1)]
+
+        for i, name in enumerate(self.pose_out_events.keys()):
+            self.camera_pose_queues[name] = self.pose_queues[i % len(self.pose_queues)]
+
+        for i in range(workers):
+            name = f"pose{i}"
+            pose_queue = self.pose_queues[i % len(self.pose_queues)]
+            self.pose_estimators[name] = PoseEstimateProcess(
+                name,
+                pose_queue,
+                {
+                    camera: event
+                    for camera, event in self.pose_out_events.items()
+                    if self.camera_pose_queues[camera] is pose_queue
+                },
+                self.config.pose_estimator,
+                device,
+            )
+
+    def init_frame_rings(self) -> None:
+        for name, camera_config in self.config.cameras.items():
+            if not camera_config.enabled:
+                continue
+
+            self.frame_rings.append(
+                SharedFrameRing(
+                    name,
+                    camera_config.frame_shape_yuv[0] * camera_config.frame_shape_yuv[1],
+                    FRAME_RING_SLOTS,
+                    create=True,
+                )
             )
 
     def start_ptz_autotracker(self) -> None:
@@ -502,6 +612,9 @@ class VigisionApp:
                     self.config.model.merged_labelmap,
                     self.detection_queue,
                     self.detection_out_events[name],
+                    self.camera_pose_queues.get(name),
+                    self.pose_out_events.get(name),
+                    self.config.pose_estimator,
                     self.detected_frames_queue,
                     self.camera_metrics[name],
                     self.ptz_metrics[name],
@@ -575,27 +688,58 @@ class VigisionApp:
         self.stats_emitter = StatsEmitter(
             self.config,
             stats_init(
-                self.config, self.camera_metrics, self.detectors, self.processes
+                self.config,
+                self.camera_metrics,
+                self.detectors,
+                self.pose_estimators,
+                self.processes,
             ),
             self.stop_event,
         )
         self.stats_emitter.start()
 
+    def start_detect_rate_controller(self) -> None:
+        self.detect_rate_controller = DetectRateController(
+            self.config,
+            self.camera_metrics,
+            self.detectors,
+            self.detection_queue,
+            self.stop_event,
+        )
+        self.detect_rate_controller.start()
+
     def start_watchdog(self) -> None:
         self.vigision_watchdog = VigisionWatchdog(self.detectors, self.stop_event)
         self.vigision_watchdog.start()
 
     def check_shm(self) -> None:
         available_shm = round(shutil.disk_usage("/dev/shm").total / pow(2, 20), 1)
-        min_req_shm = 30
+        min_req_shm = 30.0
 
         for _, camera in self.config.cameras.items():
             min_req_shm += round(
-                (camera.detect.width * camera.detect.height * 1.5 * 9 + 270480)
+                (
+                    SharedFrameRing.size(
+                        camera.frame_shape_yuv[0] * camera.frame_shape_yuv[1],
+                        FRAME_RING_SLOTS,
+                    )
+                    + 270480
+                )
                 / 1048576,
                 1,
             )
 
+            if camera.fall_detect.enabled:
+                max_persons = self.config.pose_estimator.max_persons
+                min_req_shm += round(
+                    (
+                        PoseInputBuffers.size(max_persons)
+                        + PoseOutputBuffers.size(max_persons)
+                    )
+                    / 1048576,
+                    1,
+                )
+
         if available_shm < min_req_shm:
             logger.warning(
                 f"The current SHM size of {available_shm}MB is too small, recommend increasing it to at least {min_req_shm}MB."
@@ -709,6 +853,8 @@ class VigisionApp:
             self.log_process.terminate()
             sys.exit(1)
         self.start_detectors()
+        self.start_pose_estimators()
+        self.init_frame_rings()
         self.start_video_output_processor()
         self.start_ptz_autotracker()
         self.init_historical_regions()
@@ -724,6 +870,7 @@ class VigisionApp:
         self.start_event_processor()
         self.start_event_cleanup()
         self.start_record_cleanup()
+        self.start_detect_rate_controller()
         self.start_watchdog()
         self.check_shm()
         self.init_auth()
@@ -787,6 +934,14 @@ class VigisionApp:
         empty_and_close_queue(self.detection_queue)
         logger.info("Detection queue closed")
 
+        # ensure the pose estimators are done
+        for pose_estimator in self.pose_estimators.values():
+            pose_estimator.stop()
+
+        for pose_queue in self.pose_queues:
+            empty_and_close_queue(pose_queue)
+        logger.info("Pose queues closed")
+
         self.detected_frames_processor.join()
         empty_and_close_queue(self.detected_frames_queue)
         logger.info("Detected frames queue closed")
@@ -812,6 +967,7 @@ class VigisionApp:
         self.event_cleanup.join()
         self.record_cleanup.join()
         self.stats_emitter.join()
+        self.detect_rate_controller.join()
         self.vigision_watchdog.join()
         self.db.stop()
 
@@ -825,6 +981,9 @@ class VigisionApp:
             shm.close()
             shm.unlink()
 
+        while len(self.frame_rings) > 0:
+            self.frame_rings.pop().unlink()
+
         self.log_process.terminate()
         self.log_process.join()
 
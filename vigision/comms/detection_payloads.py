@@ -0,0 +1,252 @@
+"""Binary columnar encoding of video and audio detection messages."""
+
+import json
+from typing import Iterator, Union
+
+import numpy as np
+
+# number of keypoints of a pose in the fall data
+POSE_KEY_POINTS = 13
+
+# object fields sent as packed columns, strings are indexes in the string table
+VIDEO_OBJECT_DTYPE = np.dtype(
+    [
+        ("id", np.uint32),
+        ("label", np.uint32),
+        ("frame_time", np.float64),
+        ("start_time", np.float64),
+        ("score", np.float64),
+        ("top_score", np.float64),
+        ("box", np.int32, (4,)),
+        ("estimated_box", np.int32, (4,)),
+        ("region", np.int32, (4,)),
+        ("area", np.int64),
+        ("ratio", np.float64),
+        ("motionless_count", np.int32),
+        ("position_changes", np.int32),
+        ("stationary", np.bool_),
+        ("false_positive", np.bool_),
+        ("has_clip", np.bool_),
+        ("has_snapshot", np.bool_),
+        ("has_fall_data", np.bool_),
+        ("fall_label", np.uint32),
+        ("fall_score", np.float64),
+        ("fall_box", np.int32, (4,)),
+        ("pose", np.float32, (POSE_KEY_POINTS, 3)),
+    ]
+)
+# fields copied as they are between the objects and their columns
+VIDEO_OBJECT_COLUMNS = [
+    "frame_time",
+    "start_time",
+    "score",
+    "top_score",
+    "box",
+    "estimated_box",
+    "region",
+    "area",
+    "ratio",
+    "motionless_count",
+    "position_changes",
+    "stationary",
+    "false_positive",
+    "has_clip",
+    "has_snapshot",
+]
+# fields that are not sent in the header
+VIDEO_OBJECT_FIELDS = {"id", "label", "camera", "fall_data", *VIDEO_OBJECT_COLUMNS}
+
+
+class StringTable:
+    """Interns the strings of a message, columns refer to them by index."""
+
+    def __init__(self) -> None:
+        self.indexes: dict[str, int] = {}
+
+    def index(self, value: str) -> int:
+        return self.indexes.setdefault(value, len(self.indexes))
+
+    def strings(self) -> list[str]:
+        return list(self.indexes)
+
+
+class VideoDetections:
+    """Tracked objects of a binary video detection message.
+
+    Behaves as the list of object dicts of a JSON message but only builds the
+    dicts when they are accessed, the columns can be read without them.
+    """
+
+    def __init__(
+        self,
+        camera: str,
+        columns: np.ndarray,
+        strings: list[str],
+        extras: dict[str, dict[str, any]],
+    ) -> None:
+        self.camera = camera
+        self.columns = columns
+        self.strings = strings
+        self.extras = extras
+        self.objects: list[dict[str, any]] = None
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __getitem__(self, index: int) -> dict[str, any]:
+        return self.to_list()[index]
+
+    def __iter__(self) -> Iterator[dict[str, any]]:
+        return iter(self.to_list())
+
+    @property
+    def ids(self) -> list[str]:
+        return [self.strings[i] for i in self.columns["id"]]
+
+    @property
+    def labels(self) -> list[str]:
+        return [self.strings[i] for i in self.columns["label"]]
+
+    @property
+    def boxes(self) -> np.ndarray:
+        return self.columns["box"]
+
+    def active_count(self) -> int:
+        """Number of objects that are not false positives and moved this frame."""
+        return int(
+            np.count_nonzero(
+                ~self.columns["false_positive"]
+                & (self.columns["motionless_count"] == 0)
+            )
+        )
+
+    def to_list(self) -> list[dict[str, any]]:
+        if self.objects is None:
+            self.objects = [self._object(row) for row in self.columns]
+
+        return self.objects
+
+    def _object(self, row: np.void) -> dict[str, any]:
+        id = self.strings[row["id"]]
+        obj = {
+            **self.extras.get(id, {}),
+            "id": id,
+            "camera": self.camera,
+            "label": self.strings[row["label"]],
+            "fall_data": None,
+        }
+
+        for name in VIDEO_OBJECT_COLUMNS:
+            obj[name] = row[name].tolist()
+
+        if row["has_fall_data"]:
+            obj["fall_data"] = {
+                "label": self.strings[row["fall_label"]],
+                "score": row["fall_score"].item(),
+                "box": row["fall_box"].tolist(),
+                "pose": row["pose"].tolist(),
+            }
+
+        return obj
+
+
+def count_active_objects(objects: Union[list[dict[str, any]], VideoDetections]) -> int:
+    """Number of objects that are not false positives and moved this frame."""
+    if isinstance(objects, VideoDetections):
+        return objects.active_count()
+
+    return len(
+        [o for o in objects if not o["false_positive"] and o["motionless_count"] == 0]
+    )
+
+
+def encode_video_detections(encoder, payload: tuple) -> list[bytes]:
+    """Encode video detections as a JSON header and the packed object columns.
+
+    The fields without a column are sent in the header as deltas by the
+    DetectionDeltaEncoder given.
+    """
+    camera, frame_time, tracked_objects, motion_boxes, regions = payload
+    strings = StringTable()
+    columns = np.zeros(len(tracked_objects), dtype=VIDEO_OBJECT_DTYPE)
+
+    if tracked_objects:
+        columns["id"] = [strings.index(obj["id"]) for obj in tracked_objects]
+        columns["label"] = [strings.index(obj["label"]) for obj in tracked_objects]
+
+        for name in VIDEO_OBJECT_COLUMNS:
+            columns[name] = [obj[name] for obj in tracked_objects]
+
+    for row, obj in zip(columns, tracked_objects):
+        fall_data = obj.get("fall_data")
+
+        if fall_data is not None:
+            row["has_fall_data"] = True
+            row["fall_label"] = strings.index(fall_data["label"])
+            row["fall_score"] = fall_data["score"]
+            row["fall_box"] = fall_data["box"]
+            row["pose"] = fall_data["pose"]
+
+    extras = [
+        {
+            "id": obj["id"],
+            **{
+                field: value
+                for field, value in obj.items()
+                if field not in VIDEO_OBJECT_FIELDS
+            },
+        }
+        for obj in tracked_objects
+    ]
+
+    header = encoder.encode((camera, frame_time, extras, motion_boxes, regions))
+    header["strings"] = strings.strings()
+    return [json.dumps(header).encode(), columns.tobytes()]
+
+
+def decode_video_detections(decoder, parts: list[bytes]) -> tuple:
+    """Decode video detections with the DetectionDeltaDecoder given."""
+    header = json.loads(parts[0])
+    camera, frame_time, extras, motion_boxes, regions = decoder.decode(header)
+    columns = np.frombuffer(parts[1], dtype=VIDEO_OBJECT_DTYPE)
+    known = {o["id"] for o in extras}
+
+    # objects sent before the subscriber connected wait for a keyframe
+    if len(known) < len(columns):
+        columns = columns[[header["strings"][i] in known for i in columns["id"]]]
+    return (
+        camera,
+        frame_time,
+        VideoDetections(
+            camera, columns, header["strings"], {o["id"]: o for o in extras}
+        ),
+        motion_boxes,
+        regions,
+    )
+
+
+def encode_audio_detections(payload: tuple) -> list[bytes]:
+    """Encode audio detections as a JSON header and the packed label indexes."""
+    camera, frame_time, dBFS, audio_detections = payload
+    strings = StringTable()
+    labels = np.array(
+        [strings.index(label) for label in audio_detections], dtype=np.uint32
+    )
+    header = {
+        "camera": camera,
+        "frame_time": frame_time,
+        "dBFS": dBFS,
+        "strings": strings.strings(),
+    }
+    return [json.dumps(header).encode(), labels.tobytes()]
+
+
+def decode_audio_detections(parts: list[bytes]) -> tuple:
+    header = json.loads(parts[0])
+    labels = np.frombuffer(parts[1], dtype=np.uint32)
+    return (
+        header["camera"],
+        header["frame_time"],
+        header["dBFS"],
+        [header["strings"][i] for i in labels],
+    )
@@ -1,15 +1,30 @@
 """Facilitates communication between processes."""
 
+import copy
+import json
+import logging
 import threading
 from enum import Enum
 from typing import Optional
 
 import zmq
 
+from vigision.comms.detection_payloads import (
+    decode_audio_detections,
+    decode_video_detections,
+    encode_audio_detections,
+    encode_video_detections,
+)
+
+logger = logging.getLogger(__name__)
+
 SOCKET_CONTROL = "inproc://control.detections_updater"
 SOCKET_PUB = "ipc:///tmp/cache/detect_pub"
 SOCKET_SUB = "ipc:///tmp/cache/detect_sub"
 
+# video detections of a camera carry the full object state this often
+DETECTION_KEYFRAME_INTERVAL = 30
+
 
 class DetectionTypeEnum(str, Enum):
     all = ""
@@ -56,17 +71,146 @@ class DetectionProxy:
         self.context.destroy()
 
 
+class DetectionDeltaEncoder:
+    """Encodes the video detections of each camera as keyframes with the full
+    state of every object and deltas with only the fields that changed."""
+
+    def __init__(self, keyframe_interval: int = DETECTION_KEYFRAME_INTERVAL) -> None:
+        self.keyframe_interval = keyframe_interval
+        self.sequences: dict[str, int] = {}
+        # published fields of the objects of each camera
+        self.objects: dict[str, dict[str, dict[str, any]]] = {}
+
+    def encode(self, payload: tuple) -> dict[str, any]:
+        camera, frame_time, tracked_objects, motion_boxes, regions = payload
+        sequence = self.sequences.get(camera, -1) + 1
+        self.sequences[camera] = sequence
+        keyframe = sequence % self.keyframe_interval == 0
+        previous = {} if keyframe else self.objects.get(camera, {})
+        current = {}
+        changes = {}
+
+        for obj in tracked_objects:
+            id = obj["id"]
+            last = previous.get(id)
+
+            # new objects are sent in full
+            if last is None:
+                current[id] = copy.deepcopy(obj)
+                changes[id] = obj
+                continue
+
+            changed = {
+                field: value
+                for field, value in obj.items()
+                if field not in last or last[field] != value
+            }
+
+            if changed:
+                # copied so changes made in place are found on the next frame
+                current[id] = {**last, **copy.deepcopy(changed)}
+                changes[id] = changed
+            else:
+                current[id] = last
+
+        self.objects[camera] = current
+        return {
+            "camera": camera,
+            "frame_time": frame_time,
+            "sequence": sequence,
+            "keyframe": keyframe,
+            "objects": changes,
+            "removed": [id for id in previous if id not in current],
+            "motion_boxes": motion_boxes,
+            "regions": regions,
+        }
+
+
+class DetectionDeltaDecoder:
+    """Rebuilds the video detections of each camera from keyframes and deltas.
+
+    After a missed message, for example one dropped by the publisher, the
+    known objects may have missed changes. They are kept with "stale" set
+    until the next keyframe or until they are sent in full again, objects
+    that left in the missed message stay until then. Objects sent before the
+    subscriber connected are unknown until the next keyframe. Decoded object
+    dicts are replaced on change and never modified.
+    """
+
+    def __init__(self) -> None:
+        self.objects: dict[str, dict[str, dict[str, any]]] = {}
+        # sequence of the last message of each camera
+        self.sequences: dict[str, int] = {}
+
+    def decode(self, message: dict[str, any]) -> tuple:
+        camera = message["camera"]
+        sequence = message["sequence"]
+
+        if message["keyframe"]:
+            objects = message["objects"]
+        else:
+            if self.sequences.get(camera) == sequence - 1:
+                objects = dict(self.objects.get(camera, {}))
+            else:
+                # the known objects may have missed changes
+                logger.debug(f"{camera}: missed detections before {sequence}")
+                objects = {
+                    id: {**obj, "stale": True}
+                    for id, obj in self.objects.get(camera, {}).items()
+                }
+
+            for id in message["removed"]:
+                objects.pop(id, None)
+
+            for id, changed in message["objects"].items():
+                if id in objects:
+                    objects[id] = {**objects[id], **changed}
+                # a new object is sent in full, including its id
+                elif "id" in changed:
+                    objects[id] = changed
+
+        self.objects[camera] = objects
+        self.sequences[camera] = sequence
+        return (
+            camera,
+            message["frame_time"],
+            list(objects.values()),
+            message["motion_boxes"],
+            message["regions"],
+        )
+
+
 class DetectionPublisher:
     """Simplifies receiving video and audio detections."""
 
-    def __init__(self, topic: DetectionTypeEnum) -> None:
+    def __init__(self, topic: DetectionTypeEnum, binary: bool = False) -> None:
         self.topic = topic
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
         self.socket.connect(SOCKET_PUB)
+        # video and audio detections can be sent as packed binary columns
+        self.binary = binary and topic in (
+            DetectionTypeEnum.video,
+            DetectionTypeEnum.audio,
+        )
+        self.encoder = (
+            DetectionDeltaEncoder() if topic == DetectionTypeEnum.video else None
+        )
 
     def send_data(self, payload: any) -> None:
         """Publish detection."""
+        if self.binary:
+            if self.topic == DetectionTypeEnum.video:
+                parts = encode_video_detections(self.encoder, payload)
+            else:
+                parts = encode_audio_detections(payload)
+
+            self.socket.send_multipart([self.topic.value.encode(), *parts])
+            return
+
+        if self.encoder is not None:
+            payload = self.encoder.encode(payload)
+
         self.socket.send_string(self.topic.value, flags=zmq.SNDMORE)
         self.socket.send_json(payload)
 
@@ -83,6 +227,7 @@ class DetectionSubscriber:
         self.socket = self.context.socket(zmq.SUB)
         self.socket.setsockopt_string(zmq.SUBSCRIBE, topic.value)
         self.socket.connect(SOCKET_SUB)
+        self.decoder = DetectionDeltaDecoder()
 
     def get_data(self, timeout: float = None) -> Optional[tuple[str, any]]:
         """Returns detections or None if no update."""
@@ -91,7 +236,21 @@ class DetectionSubscriber:
 
             if has_update:
                 topic = DetectionTypeEnum[self.socket.recv_string(flags=zmq.NOBLOCK)]
-                return (topic, self.socket.recv_json())
+                parts = self.socket.recv_multipart()
+
+                # binary messages have a header and the packed columns
+                if len(parts) > 1:
+                    if topic == DetectionTypeEnum.video:
+                        return (topic, decode_video_detections(self.decoder, parts))
+
+                    return (topic, decode_audio_detections(parts))
+
+                data = json.loads(parts[0])
+
+                if topic == DetectionTypeEnum.video:
+                    data = self.decoder.decode(data)
+
+                return (topic, data)
         except zmq.ZMQError:
             pass
 
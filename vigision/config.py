@@ -462,6 +462,25 @@ class StationaryConfig(VigisionBaseModel):
     )
 
 
+class RegionPackerEnum(str, Enum):
+    shelf = "shelf"
+
+
+class MosaicConfig(VigisionBaseModel):
+    enabled: bool = Field(
+        default=False,
+        title="Pack small regions at native scale into a single detector input.",
+    )
+    packer: RegionPackerEnum = Field(
+        default=RegionPackerEnum.shelf, title="Algorithm used to pack the regions."
+    )
+    min_region_size: Optional[int] = Field(
+        None,
+        title="Minimum size of a packed region, defaults to half the model size.",
+        ge=32,
+    )
+
+
 class DetectConfig(VigisionBaseModel):
     height: Optional[int] = Field(
         None, title="Height of the stream for the detect role."
@@ -486,9 +505,218 @@ class DetectConfig(VigisionBaseModel):
     annotation_offset: int = Field(
         default=0, title="Milliseconds to offset detect annotations by."
     )
+    max_regions: int = Field(
+        default=1,
+        title="Maximum number of regions sent to the detector in one batched request, 1 merges all regions into one encompassing square.",
+        ge=1,
+    )
+    mosaic: MosaicConfig = Field(
+        default_factory=MosaicConfig, title="Region mosaic config."
+    )
+    pipeline: bool = Field(
+        default=True,
+        title="Prepare the next frame while the detector runs on the current one, regions are then chosen from tracking one frame behind.",
+    )
+
+class FallPrefilterConfig(VigisionBaseModel):
+    enabled: bool = Field(
+        default=True,
+        title="Only estimate poses of fall candidates found from tracker data.",
+    )
+    aspect_ratio: float = Field(
+        default=0.8,
+        title="Box width to height ratio above which a person is a fall candidate.",
+        gt=0.0,
+    )
+    velocity: float = Field(
+        default=0.04,
+        title="Downward speed of the box top or bottom per frame, relative to the box height, above which a person is a fall candidate.",
+        gt=0.0,
+    )
+    hold_frames: int = Field(
+        default=30,
+        title="Frames a person stays a fall candidate after the last trigger.",
+        ge=0,
+    )
+    keep_warm_interval: int = Field(
+        default=10,
+        title="Estimate the pose of persons that are no fall candidate once every this many pose requests.",
+        ge=1,
+    )
+
+
+class StationaryPoseConfig(VigisionBaseModel):
+    enabled: bool = Field(
+        default=True,
+        title="Reuse the last pose of stationary persons that don't overlap motion.",
+    )
+    refresh_interval: int = Field(
+        default=10,
+        title="Estimate the pose of a stationary person again after reusing it this many times.",
+        ge=1,
+    )
+    min_iou: float = Field(
+        default=0.9,
+        title="Overlap with the box of the last estimated pose below which the pose is estimated again.",
+        ge=0.0,
+        le=1.0,
+    )
+
+
+class PoseCarryOverConfig(VigisionBaseModel):
+    enabled: bool = Field(
+        default=True,
+        title="Hand the pose history of a lost person track to a new track that continues it.",
+    )
+    max_age: float = Field(
+        default=3.0,
+        title="Seconds since its last detection a lost track can hand over its pose history.",
+        gt=0.0,
+    )
+    max_distance: float = Field(
+        default=1.0,
+        title="Change of the box position and size, relative to the box size, up to which a new track continues a lost one.",
+        gt=0.0,
+    )
+    min_iou: float = Field(
+        default=0.3,
+        title="Minimum overlap of the new box with the last box of the lost track, so a person next to it doesn't take over its poses.",
+        ge=0.0,
+        le=1.0,
+    )
+
 
 class FallDetectConfig(VigisionBaseModel):
     enabled: bool = Field(default=True, title="Fall Detection Enabled.")
+    prefilter: FallPrefilterConfig = Field(
+        default_factory=FallPrefilterConfig,
+        title="Fall candidate pre-filter config.",
+    )
+    stationary_pose: StationaryPoseConfig = Field(
+        default_factory=StationaryPoseConfig,
+        title="Stationary person pose reuse config.",
+    )
+    pose_carry_over: PoseCarryOverConfig = Field(
+        default_factory=PoseCarryOverConfig,
+        title="Pose history carry over between tracks config.",
+    )
+    stride: int = Field(
+        default=5,
+        title="Classify a person every this many poses while upright and stable.",
+        ge=1,
+    )
+    confirm_windows: int = Field(
+        default=3,
+        title="Positive windows needed before a fall is reported.",
+        ge=1,
+    )
+    confirm_history: int = Field(
+        default=5,
+        title="Number of latest windows the positive windows are counted in.",
+        ge=1,
+    )
+    velocity_threshold: float = Field(
+        default=0.05,
+        title="Mean keypoint movement between poses, relative to the box height, that switches to classifying every pose.",
+        gt=0.0,
+    )
+    aspect_ratio_threshold: float = Field(
+        default=0.25,
+        title="Relative change of the box aspect ratio that switches to classifying every pose.",
+        gt=0.0,
+    )
+    hip_height_threshold: float = Field(
+        default=0.35,
+        title="Hip height above the box bottom, relative to the box height, below which every pose is classified.",
+        ge=0.0,
+        le=1.0,
+    )
+
+    @field_validator("confirm_history")
+    @classmethod
+    def validate_confirm_history(cls, v, info):
+        if v < info.data.get("confirm_windows", 1):
+            raise ValueError("confirm_history must be at least confirm_windows.")
+
+        return v
+
+
+class PoseEstimatorConfig(VigisionBaseModel):
+    workers: int = Field(
+        default=1,
+        title="Number of pose estimation processes shared by all cameras.",
+        ge=1,
+    )
+    max_persons: int = Field(
+        default=10,
+        title="Maximum number of persons per camera sent in one pose estimation request.",
+        ge=1,
+    )
+    batch_size: int = Field(
+        default=16,
+        title="Maximum number of persons from all cameras to run as one batch.",
+        ge=1,
+    )
+    batch_timeout: float = Field(
+        default=0.0,
+        title="Milliseconds to wait for more pose estimation requests to fill a batch.",
+        ge=0.0,
+    )
+    track_aware: bool = Field(
+        default=True,
+        title="Skip pose NMS since every person box comes from a different track.",
+    )
+    streaming_fall: bool = Field(
+        default=False,
+        title="Stream every new pose through the fall model instead of full keypoint windows.",
+    )
+
+
+class DetectionBusConfig(VigisionBaseModel):
+    binary: bool = Field(
+        default=False,
+        title="Send video and audio detections between processes as packed binary columns instead of JSON.",
+    )
+
+
+class DetectRateConfig(VigisionBaseModel):
+    enabled: bool = Field(
+        default=True,
+        title="Lower the detection rate of idle cameras first when the detectors fall behind.",
+    )
+    interval: float = Field(
+        default=2.0,
+        title="Seconds between detection rate updates.",
+        gt=0.0,
+    )
+    min_fps: float = Field(
+        default=1.0,
+        title="Lowest detection rate of a throttled camera.",
+        gt=0.0,
+    )
+    max_queue_depth: int = Field(
+        default=4,
+        title="Detection requests waiting in the queue above which the detectors are overloaded.",
+        ge=1,
+    )
+    max_utilization: float = Field(
+        default=0.9,
+        title="Share of the detector time in use above which the detectors are overloaded.",
+        gt=0.0,
+        le=1.0,
+    )
+    backoff: float = Field(
+        default=0.8,
+        title="Factor of the achieved detection rate the total rate is lowered to when overloaded.",
+        gt=0.0,
+        lt=1.0,
+    )
+    recovery: float = Field(
+        default=0.1,
+        title="Share of the configured rate of all cameras added back per update while not overloaded.",
+        gt=0.0,
+        le=1.0,
+    )
 
 
 
@@ -1382,6 +1610,18 @@ class VigisionConfig(VigisionBaseModel):
     fall_detect: FallDetectConfig = Field(
         default_factory=FallDetectConfig, title="Global fall detection configuration."
     )
+    pose_estimator: PoseEstimatorConfig = Field(
+        default_factory=PoseEstimatorConfig,
+        title="Shared pose estimation configuration.",
+    )
+    detect_rate: DetectRateConfig = Field(
+        default_factory=DetectRateConfig,
+        title="Load aware detection rate configuration.",
+    )
+    detection_bus: DetectionBusConfig = Field(
+        default_factory=DetectionBusConfig,
+        title="Detection messages between processes configuration.",
+    )
     cameras: Dict[str, CameraConfig] = Field(
         default_factory=dict, title="Camera configuration."
     )    
@@ -73,6 +73,16 @@ MAX_SEGMENT_DURATION = 600
 MAX_SEGMENTS_IN_CACHE = 6
 MAX_PLAYLIST_SECONDS = 7200  # support 2 hour segments for a single playlist to account for cameras with inconsistent segment times
 
+# Frame Values
+
+# preallocated frames of each camera shared by all processes, enough for the
+# frame being captured, the frame queue (2), the frames of pipelined detection
+# (2), the detected frames queue (2), the frames held by the tracked object
+# processor (2) and the output process (2) with room for messages in flight
+FRAME_RING_SLOTS = 20
+# seconds after which a frame whose references were never released is reclaimed
+FRAME_RING_MAX_AGE = 10
+
 # Internal Comms Topics
 
 INSERT_MANY_RECORDINGS = "insert_many_recordings"
@@ -0,0 +1,149 @@
+"""Lower the detection rate of idle cameras first when the detectors fall behind."""
+
+import logging
+import threading
+from multiprocessing import Queue
+from multiprocessing.synchronize import Event as MpEvent
+
+from vigision.config import DetectRateConfig, VigisionConfig
+from vigision.object_detection import ObjectDetectProcess
+from vigision.types import CameraMetricsTypes
+
+logger = logging.getLogger(__name__)
+
+# a camera processing less than this share of its frames falls behind
+MIN_PROCESSED_SHARE = 0.9
+
+
+def allocate_detect_rates(
+    max_rates: dict[str, float], active: set[str], budget: float, min_fps: float
+) -> dict[str, float]:
+    """Split the total detection rate over the cameras.
+
+    Active cameras keep their full rate and the rest of the budget is shared
+    evenly by the idle cameras, each between min_fps and its own full rate.
+    """
+    rates = {name: rate for name, rate in max_rates.items() if name in active}
+    remaining = budget - sum(rates.values())
+
+    # cameras with a low rate are served first and leave their share to the others
+    idle = sorted((name for name in max_rates if name not in active), key=max_rates.get)
+    for i, name in enumerate(idle):
+        share = remaining / (len(idle) - i)
+        rates[name] = min(max_rates[name], max(min_fps, share))
+        remaining -= rates[name]
+
+    return rates
+
+
+def next_detect_budget(
+    config: DetectRateConfig,
+    budget: float,
+    max_budget: float,
+    achieved_rate: float,
+    overloaded: bool,
+) -> float:
+    """Back off to below the rate the detectors achieved when overloaded,
+    otherwise recover a share of the full rate."""
+    if overloaded:
+        return min(budget, achieved_rate * config.backoff)
+
+    return min(max_budget, budget + max_budget * config.recovery)
+
+
+class DetectRateController(threading.Thread):
+    """Chooses the detection rate of every camera from the detector load.
+
+    The detectors are overloaded when requests pile up in the detection queue,
+    the estimated share of detector time in use is too high or a camera
+    processes fewer frames than it receives.
+    """
+
+    def __init__(
+        self,
+        config: VigisionConfig,
+        camera_metrics: dict[str, CameraMetricsTypes],
+        detectors: dict[str, ObjectDetectProcess],
+        detection_queue: Queue,
+        stop_event: MpEvent,
+    ):
+        threading.Thread.__init__(self)
+        self.name = "detect_rate_controller"
+        self.config = config.detect_rate
+        self.camera_metrics = camera_metrics
+        self.detectors = detectors
+        self.detection_queue = detection_queue
+        self.stop_event = stop_event
+        self.max_rates = {
+            name: float(camera.detect.fps)
+            for name, camera in config.cameras.items()
+            if camera.enabled and camera.detect.enabled
+        }
+        self.budget = sum(self.max_rates.values())
+
+    def is_overloaded(self) -> bool:
+        try:
+            queue_depth = self.detection_queue.qsize()
+        except NotImplementedError:
+            queue_depth = 0
+
+        if queue_depth > self.config.max_queue_depth:
+            return True
+
+        # every camera request of a batch shares one inference
+        request_time = sum(
+            detector.avg_inference_speed.value / max(detector.avg_batch_size.value, 1)
+            for detector in self.detectors.values()
+        ) / max(len(self.detectors), 1)
+        request_rate = sum(
+            self.camera_metrics[name]["detection_fps"].value for name in self.max_rates
+        )
+        utilization = request_rate * request_time / max(len(self.detectors), 1)
+
+        if utilization > self.config.max_utilization:
+            return True
+
+        return any(
+            self.camera_metrics[name]["process_fps"].value
+            < self.camera_metrics[name]["camera_fps"].value * MIN_PROCESSED_SHARE
+            for name in self.max_rates
+        )
+
+    def update(self):
+        achieved_rate = sum(
+            self.camera_metrics[name]["detection_fps"].value for name in self.max_rates
+        )
+        self.budget = next_detect_budget(
+            self.config,
+            self.budget,
+            sum(self.max_rates.values()),
+            achieved_rate,
+            self.is_overloaded(),
+        )
+        rates = allocate_detect_rates(
+            self.max_rates,
+            {
+                name
+                for name in self.max_rates
+                if self.camera_metrics[name]["detect_priority"].value
+            },
+            self.budget,
+            self.config.min_fps,
+        )
+
+        for name, rate in rates.items():
+            detect_rate = self.camera_metrics[name]["detect_rate"]
+
+            if round(detect_rate.value, 1) != round(rate, 1):
+                logger.debug(f"{name}: detection rate set to {rate:.1f} fps")
+
+            detect_rate.value = rate
+
+    def run(self) -> None:
+        if not self.config.enabled:
+            return
+
+        while not self.stop_event.wait(self.config.interval):
+            self.update()
+
+        logger.info("Exiting detect rate controller...")
@@ -24,6 +24,34 @@ class DetectionApi(ABC):
     def detect_raw(self, tensor_input):
         pass
 
+    def detect_raw_batch(self, tensor_inputs):
+        """
+        @param tensor_inputs: batch of model inputs stacked on the first axis
+
+        @return: np.array(n, 20, 6), one detect_raw result per input.
+        Detectors that can run a real batched inference should override this.
+        """
+        detections = np.zeros((len(tensor_inputs), 20, 6), np.float32)
+        for i in range(len(tensor_inputs)):
+            detections[i] = self.detect_raw(tensor_inputs[i : i + 1])
+        return detections
+
+    def post_process_ultralytics(self, result):
+        """
+        @param result: single image result of an ultralytics model call
+
+        @return: np.array(20, 6) where each row is
+        in this order (class_id, score, y1/height, x1/width, y2/height, x2/width)
+        """
+        boxes = result.boxes.xyxyn.cpu().numpy()[:20]
+        count = len(boxes)
+
+        detections = np.zeros((20, 6), np.float32)
+        detections[:count, 0] = result.boxes.cls.cpu().numpy()[:count]
+        detections[:count, 1] = result.boxes.conf.cpu().numpy()[:count]
+        detections[:count, 2:] = boxes[:, [1, 0, 3, 2]]
+        return detections
+
     def post_process_yolonas(self, output):
         """
         @param output: output of inference
@@ -140,6 +140,16 @@ class BaseDetectorConfig(BaseModel):
     model: Optional[ModelConfig] = Field(
         default=None, title="Detector specific model configuration."
     )
+    batch_size: int = Field(
+        default=1,
+        title="Maximum number of queued detection requests to run as one batch.",
+        ge=1,
+    )
+    batch_timeout: float = Field(
+        default=0.0,
+        title="Milliseconds to wait for more detection requests to fill a batch.",
+        ge=0.0,
+    )
     model_config = ConfigDict(
         extra="allow", arbitrary_types_allowed=True, protected_namespaces=()
     )
\ No newline at end of file
@@ -62,23 +62,7 @@ class CpuTfl(DetectionApi):
 
         detections = np.zeros((20, 6), np.float32)
         for result in results:
-            boxes = np.array(result.boxes.xyxyn.cpu())
-            scores = np.array(result.boxes.conf.cpu())
-            class_ids = np.array(result.boxes.cls.cpu())
-            count = len(boxes)
-
-            for i in range(count):
-                if i == 20:
-                    break
-                # print(boxes[i])
-                detections[i] = [
-                    class_ids[i],
-                    float(scores[i]),
-                    boxes[i][1],
-                    boxes[i][0],
-                    boxes[i][3],
-                    boxes[i][2],
-                ]
+            detections = self.post_process_ultralytics(result)
             # frame_with_detections = self.plot_detections(tensor_input[0].copy(), detections)
             # cv2.imwrite("debug/test.jpg", frame_with_detections)
         # frame_with_detections = results[0].plot()
@@ -93,3 +77,8 @@ class CpuTfl(DetectionApi):
         # self.num_inference += 1
         # print("Average inference time: ", self.total_inference_time / self.num_inference)
         return detections
+
+    def detect_raw_batch(self, tensor_inputs):
+        # ultralytics runs a list of images as a single batch
+        results = self.model(list(tensor_inputs), verbose=False, device="cpu")
+        return np.stack([self.post_process_ultralytics(result) for result in results])
@@ -0,0 +1,151 @@
+import logging
+
+import numpy as np
+import onnxruntime as ort
+from pydantic import Field
+from typing_extensions import Literal
+
+from vigision.detectors.detection_api import DetectionApi
+from vigision.detectors.detector_config import BaseDetectorConfig
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_KEY = "onnx_cpu"
+
+DEFAULT_MODEL_PATH = "vigision/models/yolo/yolov8n_fp16.onnx"
+
+ONNX_INPUT_TYPES = {
+    "tensor(float16)": np.float16,
+    "tensor(float)": np.float32,
+}
+
+
+class OnnxCpuDetectorConfig(BaseDetectorConfig):
+    type: Literal[DETECTOR_KEY]
+    num_threads: int = Field(default=3, title="Number of detection threads")
+    score_threshold: float = Field(
+        default=0.25, title="Minimum score for a box to be kept before NMS."
+    )
+    iou_threshold: float = Field(default=0.7, title="IoU threshold used for NMS.")
+
+
+class OnnxCpuDetector(DetectionApi):
+    """Runs a YOLOv8 ONNX export directly with onnxruntime on the CPU."""
+
+    type_key = DETECTOR_KEY
+
+    def __init__(self, detector_config: OnnxCpuDetectorConfig):
+        model_path = detector_config.model.path or DEFAULT_MODEL_PATH
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = detector_config.num_threads or 3
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.score_threshold = detector_config.score_threshold
+        self.iou_threshold = detector_config.iou_threshold
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+        self.height = detector_config.model.height
+        self.width = detector_config.model.width
+
+        # preallocated buffers reused for every inference
+        self.input_buffer = np.zeros(
+            (1, 3, self.height, self.width),
+            dtype=ONNX_INPUT_TYPES.get(model_input.type, np.float32),
+        )
+        self.detections = np.zeros((20, 6), np.float32)
+        logger.info(f"ONNX CPU detector loaded {model_path} ({model_input.type})")
+
+    def detect_raw(self, tensor_input):
+        # tensor_input is a (1, h, w, 3) rgb view on shared memory,
+        # transpose the view and scale it straight into the model input buffer
+        np.multiply(
+            tensor_input.transpose(0, 3, 1, 2),
+            1 / 255,
+            out=self.input_buffer,
+            casting="unsafe",
+        )
+        output = self.session.run(
+            [self.output_name], {self.input_name: self.input_buffer}
+        )[0]
+        return self.post_process_yolov8(output[0])
+
+    def post_process_yolov8(self, output):
+        """
+        @param output: raw yolov8 output of a single image
+        expected shape: np.array(4 + num_classes, N)
+        where the box is (center x, center y, width, height) in model pixels
+
+        @return: best results: np.array(20, 6) where each row is
+        in this order (class_id, score, y1/height, x1/width, y2/height, x2/width)
+        """
+        self.detections[:] = 0
+
+        scores = output[4:]
+        class_ids = scores.argmax(axis=0)
+        class_scores = scores[class_ids, np.arange(scores.shape[1])]
+        candidates = np.flatnonzero(class_scores > self.score_threshold)
+
+        if len(candidates) == 0:
+            return self.detections
+
+        # highest scores first, at most 100 candidates go through nms
+        candidates = candidates[np.argsort(-class_scores[candidates])[:100]]
+        class_ids = class_ids[candidates]
+        class_scores = class_scores[candidates].astype(np.float32)
+        cx, cy, w, h = output[:4, candidates].astype(np.float32)
+        boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+
+        keep = self.non_max_suppression(boxes, class_ids)[:20]
+        count = len(keep)
+
+        self.detections[:count, 0] = class_ids[keep]
+        self.detections[:count, 1] = class_scores[keep]
+        self.detections[:count, 2] = boxes[keep, 1] / self.height
+        self.detections[:count, 3] = boxes[keep, 0] / self.width
+        self.detections[:count, 4] = boxes[keep, 3] / self.height
+        self.detections[:count, 5] = boxes[keep, 2] / self.width
+        np.clip(self.detections[:count, 2:], 0, 1, out=self.detections[:count, 2:])
+        return self.detections
+
+    def non_max_suppression(self, boxes, class_ids):
+        """Class aware greedy nms over score sorted boxes, returns kept indexes."""
+        # offset boxes by class so boxes of different classes never overlap
+        offset_boxes = boxes + (class_ids * max(self.width, self.height))[:, None]
+        x1, y1, x2, y2 = offset_boxes.T
+        areas = (x2 - x1) * (y2 - y1)
+
+        inter_w = np.clip(
+            np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]),
+            0,
+            None,
+        )
+        inter_h = np.clip(
+            np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]),
+            0,
+            None,
+        )
+        intersection = inter_w * inter_h
+        iou = intersection / (areas[:, None] + areas[None, :] - intersection + 1e-7)
+        overlaps = iou > self.iou_threshold
+
+        suppressed = np.zeros(len(boxes), dtype=bool)
+        keep = []
+        for i in range(len(boxes)):
+            if suppressed[i]:
+                continue
+
+            keep.append(i)
+
+            if len(keep) == 20:
+                break
+
+            suppressed |= overlaps[i]
+
+        return np.array(keep, dtype=int)
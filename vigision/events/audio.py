@@ -100,6 +100,7 @@ def listen_to_audio(
                 camera,
                 camera_metrics,
                 stop_event,
+                config.detection_bus.binary,
             )
             audio_threads.append(audio)
             audio.start()
@@ -171,6 +172,7 @@ class AudioEventMaintainer(threading.Thread):
         camera: CameraConfig,
         camera_metrics: dict[str, CameraMetricsTypes],
         stop_event: mp.Event,
+        binary_detections: bool = False,
     ) -> None:
         threading.Thread.__init__(self)
         self.name = f"{camera.name}_audio_event_processor"
@@ -189,7 +191,9 @@ class AudioEventMaintainer(threading.Thread):
         # create communication for audio detections
         self.requestor = InterProcessRequestor()
         self.config_subscriber = ConfigSubscriber(f"config/audio/{camera.name}")
-        self.detection_publisher = DetectionPublisher(DetectionTypeEnum.audio)
+        self.detection_publisher = DetectionPublisher(
+            DetectionTypeEnum.audio, binary_detections
+        )
 
     def detect_audio(self, audio) -> None:
         if not self.config.audio.enabled or self.stop_event.is_set():
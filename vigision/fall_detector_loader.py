@@ -4,7 +4,9 @@ import numpy as np
 
 from vigision.networks.linear_dense_stgcn import Lin_DenseSTGCN
 from vigision.networks.oneshot_stgcn_nano import OSA_STGCN_nano_1S
-from vigision.pose_utils import normalize_points_with_size, scale_pose
+from vigision.pose_utils import scale_poses
+
+FALL_CLASS_NAMES = ['Non-fall', 'Fall']
 
 
 class TSSTG(object):
@@ -19,7 +21,7 @@ class TSSTG(object):
         self.graph_args = {'strategy': 'spatial'}
         # self.class_names = ['Standing', 'Walking', 'Sitting', 'Lying Down',
         #                     'Stand up', 'Sit down', 'Fall Down']
-        self.class_names = ['Non-fall', 'Fall']
+        self.class_names = FALL_CLASS_NAMES
         self.num_class = len(self.class_names)
         self.device = device
 
@@ -38,16 +40,92 @@ class TSSTG(object):
         Returns:
             (numpy array) Probability of each class actions.
         """
-        pts[:, :, :2] = normalize_points_with_size(pts[:, :, :2], image_size[0], image_size[1])
-        pts[:, :, :2] = scale_pose(pts[:, :, :2])
-        pts = np.concatenate((pts, np.expand_dims((pts[:, 1, :] + pts[:, 2, :]) / 2, 1)), axis=1)
+        return self.predict_batch(pts[None], image_size)
+
+    def predict_batch(self, pts, image_size):
+        """Predict actions of several skeleton sequences in a single forward pass.
+        Args:
+            pts: (numpy array) points and score in shape `(n, t, v, c)` where
+                n : number of persons,
+                t, v, c : as in `predict`.
+            image_size: (tuple of int) width, height of image frame, or an
+                `(n, 2)` array with the frame size of each person.
+        Returns:
+            (numpy array) Probability of each class actions in shape `(n, classes)`.
+        """
+        pts = self.preprocess(pts, image_size)
+
+        with torch.inference_mode():
+            out = self.model(pts)
+
+        return out.cpu().numpy()
+
+    def preprocess(self, pts, image_size):
+        """Normalize `(n, t, v, c)` points into the `(n, c, t, v + 1)` model input."""
+        pts = np.array(pts, dtype=np.float32)
+        size = np.asarray(image_size, dtype=np.float32).reshape(-1, 1, 1, 2)
+        pts[..., :2] /= size
+        scale_poses(pts[..., :2])
+        # the model graph has an extra neck node between both shoulders
+        neck = (pts[:, :, 1] + pts[:, :, 2]) / 2
+        pts = np.concatenate((pts, neck[:, :, None]), axis=2)
+
+        return torch.from_numpy(pts).permute(0, 3, 1, 2).to(self.device)
+
+
+class FallStreams(object):
+    """Streaming fall predictions of many tracks sharing one model.
+    Every pose only goes through the model once, the temporal features of
+    each track are cached between calls.
+    Args:
+        fall_model: (TSSTG) loaded model.
+        window: (int) number of time steps the predictions are pooled over.
+    """
+    def __init__(self, fall_model, window=30):
+        self.fall_model = fall_model
+        self.window = window
+        self.states = {}
+
+    def __contains__(self, id):
+        return id in self.states
+
+    def keys(self):
+        return self.states.keys()
+
+    def update(self, ids, pts, image_size):
+        """Add the newest pose of several tracks.
+        Args:
+            ids: (list) hashable id of each track, new ids start a new stream.
+            pts: (numpy array) newest points and score in shape `(n, v, c)`.
+            image_size: as in `TSSTG.predict_batch`.
+        Returns:
+            (numpy array) Probability of each class actions in shape `(n, classes)`,
+            (numpy array) number of poses each stream has seen.
+        """
+        model = self.fall_model.model
+        for id in ids:
+            if id not in self.states:
+                self.states[id] = model.init_stream(1, self.window)
+
+        state = {
+            key: torch.cat([self.states[id][key] for id in ids])
+            for key in self.states[ids[0]].keys()
+        }
 
-        pts = torch.tensor(pts, dtype=torch.float32)
-        pts = pts.permute(2, 0, 1)[None, :]
+        with torch.inference_mode():
+            pts = self.fall_model.preprocess(pts[:, None], image_size)
+            out = model.stream(pts, state)
 
+        for i, id in enumerate(ids):
+            self.states[id] = {key: value[i : i + 1] for key, value in state.items()}
 
-        pts = pts.to(self.device)
+        return out.cpu().numpy(), state["ages"].cpu().numpy()
 
-        out = self.model(pts)
+    def move(self, source_id, id):
+        """Continue the stream of a track under another id."""
+        if source_id in self.states:
+            self.states[id] = self.states.pop(source_id)
 
-        return out.detach().cpu().numpy()
+    def remove(self, ids):
+        for id in ids:
+            self.states.pop(id, None)
@@ -0,0 +1,269 @@
+"""Decide when the pose and fall models run for a person and when a fall is reported."""
+
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from vigision.config import (
+    FallDetectConfig,
+    FallPrefilterConfig,
+    StationaryPoseConfig,
+)
+from vigision.fall_detector_loader import FALL_CLASS_NAMES
+from vigision.util.image import intersection_over_union
+
+FALL_CLASS = FALL_CLASS_NAMES.index("Fall")
+NON_FALL_CLASS = FALL_CLASS_NAMES.index("Non-fall")
+HIP_KEYPOINTS = [7, 8]
+# weight of the newest box in the aspect ratio a person usually has
+ASPECT_RATIO_ALPHA = 0.1
+
+
+class FallScheduler:
+    """Per track fall classification stride with a M of N hysteresis on the label.
+
+    While a person is upright and stable, only every `stride` pose is
+    classified. Fast keypoints, a changing box aspect ratio or low hips switch
+    the track to classifying every pose until the last `confirm_history` poses
+    were calm again. A fall is only reported once `confirm_windows` of the last
+    `confirm_history` windows were positive.
+    """
+
+    def __init__(self, config: FallDetectConfig):
+        self.config = config
+        self.tracks: dict[str, dict] = {}
+
+    def _track(self, id: str) -> dict:
+        if id not in self.tracks:
+            self.tracks[id] = {
+                # poses since the track was last classified
+                "since_classified": self.config.stride,
+                # poses left before an alerted track is calm again
+                "alert": 0,
+                "aspect_ratio": None,
+                "last_pose": None,
+                "windows": deque(maxlen=self.config.confirm_history),
+                "label": None,
+            }
+
+        return self.tracks[id]
+
+    def update(self, id: str, key_points: np.ndarray, box) -> bool:
+        """Add the newest pose of a track, returns if it suggests a possible fall."""
+        track = self._track(id)
+        track["since_classified"] += 1
+
+        height = max(box[3] - box[1], 1)
+        aspect_ratio = (box[2] - box[0]) / height
+        suspicious = False
+
+        if track["last_pose"] is not None:
+            movement = np.linalg.norm(
+                key_points[:, :2] - track["last_pose"][:, :2], axis=1
+            ).mean()
+            suspicious |= movement / height > self.config.velocity_threshold
+
+        if track["aspect_ratio"] is None:
+            track["aspect_ratio"] = aspect_ratio
+        else:
+            change = abs(aspect_ratio / track["aspect_ratio"] - 1)
+            suspicious |= change > self.config.aspect_ratio_threshold
+            track["aspect_ratio"] += ASPECT_RATIO_ALPHA * (
+                aspect_ratio - track["aspect_ratio"]
+            )
+
+        hip_height = (box[3] - key_points[HIP_KEYPOINTS, 1].mean()) / height
+        suspicious |= hip_height < self.config.hip_height_threshold
+
+        track["last_pose"] = key_points.copy()
+
+        if suspicious:
+            track["alert"] = self.config.confirm_history
+        elif track["alert"] > 0:
+            track["alert"] -= 1
+
+        return suspicious
+
+    def is_due(self, id: str) -> bool:
+        """If the next full keypoint window of the track should be classified."""
+        track = self._track(id)
+        return track["alert"] > 0 or track["since_classified"] >= self.config.stride
+
+    def is_alert(self) -> bool:
+        """If any track is classified at every pose."""
+        return any(track["alert"] > 0 for track in self.tracks.values())
+
+    def submitted(self, ids: list[str]):
+        for id in ids:
+            self._track(id)["since_classified"] = 0
+
+    def add_prediction(self, id: str, scores: np.ndarray):
+        track = self._track(id)
+        track["windows"].append(scores.argmax() == FALL_CLASS)
+        positives = sum(track["windows"])
+
+        if positives >= self.config.confirm_windows:
+            track["label"] = FALL_CLASS
+        elif track["label"] is None or positives == 0:
+            # a reported fall is only cleared once every window is negative
+            track["label"] = NON_FALL_CLASS
+
+    def label(self, id: str) -> Optional[int]:
+        """Class index of the reported label, None before the first prediction."""
+        track = self.tracks.get(id)
+        return track["label"] if track else None
+
+    def retain(self, ids):
+        """Forget the tracks that are not in ids."""
+        self.tracks = {id: track for id, track in self.tracks.items() if id in ids}
+
+
+class FallCandidateFilter:
+    """First stage of the fall cascade, only uses the tracker boxes and estimates.
+
+    Wide boxes and boxes whose top or bottom moves down fast are fall
+    candidates for the next `hold_frames` frames. Everyone else only gets a
+    pose in every `keep_warm_interval` pose request to keep their keypoint
+    history warm. The fall model only knows consecutive poses, so the sparse
+    history is restarted once a person becomes a candidate.
+    """
+
+    def __init__(self, config: FallPrefilterConfig):
+        self.config = config
+        self.tracks: dict[str, dict] = {}
+
+    def _track(self, id: str) -> dict:
+        if id not in self.tracks:
+            # frames left as a candidate, pose requests since the last pose
+            # and if the history has keep warm poses
+            self.tracks[id] = {
+                "hold": 0,
+                "since_pose": self.config.keep_warm_interval,
+                "sparse": False,
+            }
+
+        return self.tracks[id]
+
+    def is_candidate(self, id: str, box, velocity: np.ndarray) -> bool:
+        """Update a track every frame with its box and (2, 2) kalman velocity
+        of the box corners, returns if it is a fall candidate."""
+        track = self._track(id)
+        height = max(box[3] - box[1], 1)
+
+        if (box[2] - box[0]) / height > self.config.aspect_ratio or (
+            velocity[:, 1].max() / height > self.config.velocity
+        ):
+            track["hold"] = self.config.hold_frames
+            return True
+
+        candidate = track["hold"] > 0
+        track["hold"] = max(track["hold"] - 1, 0)
+        return candidate
+
+    def select(self, persons):
+        """Pick the persons whose pose is estimated in the next request.
+
+        @param persons: list of (id, box, score, is candidate)
+        @return: list of (id, box, score), number of persons filtered out, ids
+        whose sparse keypoint history has to be restarted
+        """
+        selected = []
+        restarted = []
+        for id, box, score, candidate in persons:
+            track = self._track(id)
+            track["since_pose"] += 1
+
+            if not self.config.enabled or candidate:
+                if track["sparse"]:
+                    track["sparse"] = False
+                    restarted.append(id)
+            elif track["since_pose"] < self.config.keep_warm_interval:
+                track["sparse"] = True
+                continue
+
+            track["since_pose"] = 0
+            selected.append((id, box, score))
+
+        return selected, len(persons) - len(selected), restarted
+
+    def sparse_ids(self) -> set[str]:
+        """Ids whose keypoint history has keep warm poses, which are too far
+        apart to classify."""
+        return {id for id, track in self.tracks.items() if track["sparse"]}
+
+    def retain(self, ids):
+        """Forget the tracks that are not in ids."""
+        self.tracks = {id: track for id, track in self.tracks.items() if id in ids}
+
+
+class StationaryPoseCache:
+    """Reuses the last pose of stationary persons instead of estimating it again.
+
+    The pose is estimated again when the person overlaps motion, after
+    `refresh_interval` reuses or once the box moved away from the box of the
+    last estimated pose.
+    """
+
+    def __init__(self, config: StationaryPoseConfig):
+        self.config = config
+        self.tracks: dict[str, dict] = {}
+
+    def _track(self, id: str) -> dict:
+        if id not in self.tracks:
+            self.tracks[id] = {
+                "box": None,
+                "key_points": None,
+                "reused": 0,
+                # box of the request in flight
+                "requested_box": None,
+            }
+
+        return self.tracks[id]
+
+    def select(self, persons, stationary_ids):
+        """Split the persons in the ones to estimate and the ones to reuse.
+
+        @param persons: list of (id, box, score)
+        @param stationary_ids: ids of the persons that are stationary and
+        don't overlap any motion
+        @return: list of (id, box, score), dict of reused keypoints by id
+        """
+        estimate = []
+        reused = {}
+        for id, box, score in persons:
+            track = self._track(id)
+
+            if (
+                self.config.enabled
+                and id in stationary_ids
+                and track["key_points"] is not None
+                and track["reused"] < self.config.refresh_interval
+                and intersection_over_union(box, track["box"]) >= self.config.min_iou
+            ):
+                # follow small box moves with the box center
+                delta = np.subtract(box, track["box"])
+                key_points = track["key_points"].copy()
+                key_points[:, 0] += (delta[0] + delta[2]) / 2
+                key_points[:, 1] += (delta[1] + delta[3]) / 2
+                track["reused"] += 1
+                reused[id] = key_points
+            else:
+                estimate.append((id, box, score))
+
+        return estimate, reused
+
+    def requested(self, persons):
+        for id, box, _ in persons:
+            self._track(id)["requested_box"] = box
+
+    def update(self, id: str, key_points: np.ndarray):
+        """Store an estimated pose of a person."""
+        track = self._track(id)
+        track["box"] = track["requested_box"]
+        track["key_points"] = key_points.copy()
+        track["reused"] = 0
+
+    def retain(self, ids):
+        """Forget the tracks that are not in ids."""
+        self.tracks = {id: track for id, track in self.tracks.items() if id in ids}
@@ -64,6 +64,17 @@ class STGCN_Layer(nn.Module):
         x = self.tcn(x) 
         return self.relu(x)
 
+    def spatial(self, x, A):
+        """Graph convolution part of the layer, independent for every time step."""
+        x = self.gcn(x, A)
+        return self.tcn[1](self.tcn[0](x))
+
+    def temporal(self, x):
+        """Temporal convolution part of the layer without padding (eval only)."""
+        conv = self.tcn[2]
+        x = F.conv2d(x, conv.weight, conv.bias, conv.stride)
+        return self.relu(self.tcn[3](x))
+
 
 class OneShot_STGCN_Block(nn.ModuleDict):
     def __init__(self, in_channels, n_layers, kernel_size, **kwargs):
@@ -145,7 +156,7 @@ class StreamSpatialTemporalGraph(nn.Module):
         else:
             self.cls = lambda x: x
 
-    def forward(self, x):
+    def normalize(self, x):
         # data normalization.
         N, C, T, V = x.size()
         x = x.permute(0, 3, 1, 2).contiguous()  # (N, V, C, T)
@@ -153,7 +164,10 @@ class StreamSpatialTemporalGraph(nn.Module):
         x = self.data_bn(x)
         x = x.view(N, V, C, T)
         x = x.permute(0, 2, 3, 1).contiguous()
-        x = x.view(N, C, T, V)
+        return x.view(N, C, T, V)
+
+    def forward(self, x):
+        x = self.normalize(x)
 
         x = self.gcn_0(x, self.A * self.edge_importance[0])
         x = self.osa_block_0(x, self.A, self.edge_importance[1:3])
@@ -167,6 +181,117 @@ class StreamSpatialTemporalGraph(nn.Module):
 
         return x
 
+    def stream_layers(self):
+        """(layer, edge importance, input layers) in forward order, -1 is the input."""
+        return [
+            (self.gcn_0, self.edge_importance[0], [-1]),
+            (self.osa_block_0.block["conv0"], self.edge_importance[1], [0]),
+            (self.osa_block_0.block["conv1"], self.edge_importance[2], [1]),
+            (self.osa_block_1.block["conv0"], self.edge_importance[3], [0, 1, 2]),
+            (self.osa_block_1.block["conv1"], self.edge_importance[4], [3]),
+        ]
+
+    def init_stream(self, n, window=30):
+        """Empty streaming state of n sequences pooled over the last `window` steps.
+
+        For every layer the state keeps the graph convolution outputs the next
+        temporal convolution still needs ("pre"), the last layer outputs that
+        no longer depend on future steps ("hist") and the spatial sums of those
+        outputs over the window ("sums").
+        """
+        layers = self.stream_layers()
+        V = self.A.size(1)
+        pad = layers[0][0].tcn[2].padding[0]
+        # oldest settled output a later layer or the padded tail still reads
+        history = 1 + max(
+            pad * (k - j - 1)
+            for k, (_, _, inputs) in enumerate(layers)
+            for j in inputs
+        )
+        assert window > pad * len(layers), "window shorter than the receptive field"
+
+        state = {"ages": torch.zeros(n, dtype=torch.long, device=self.A.device)}
+        for k, (layer, _, _) in enumerate(layers):
+            channels = layer.tcn[2].out_channels
+            state[f"pre{k}"] = self.A.new_zeros((n, channels, 2 * pad, V))
+            state[f"hist{k}"] = self.A.new_zeros((n, channels, history, V))
+            state[f"sums{k}"] = self.A.new_zeros((n, channels, window))
+        return state
+
+    def stream(self, x, state):
+        """Add the newest time step of every sequence and pool the cached features.
+
+        x: (N, C, 1, V), state: from `init_stream`, updated in place.
+        Returns the pooled features of the last `window` steps, identical to
+        `forward` on the full sequence for as long as it fits in the window.
+        Longer sequences keep their real history where the full window pass
+        would see zero padding.
+        """
+        ages = state["ages"] + 1
+        state["ages"] = ages
+
+        def positions_mask(last, count):
+            # mask out positions before the start of each sequence
+            first = last - count + 1
+            positions = first[:, None] + torch.arange(count, device=last.device)
+            return (positions >= 0).to(x.dtype)[:, None, :, None]
+
+        def last_steps(j, count):
+            # the last steps of a layer output, settled ones first
+            hist = hists[j][:, :, hists[j].size(2) - count + tails[j].size(2) :]
+            return torch.cat((hist, tails[j]), dim=2)
+
+        hists = {-1: self.normalize(x)}
+        tails = {}
+        features = []
+
+        for k, (layer, importance, inputs) in enumerate(self.stream_layers()):
+            A = self.A * importance
+            pad = layer.tcn[2].padding[0]
+
+            # the newest input step that no longer depends on future steps
+            # completes the receptive field of one more output step
+            settled = ages - 1 - pad * k
+            layer_input = torch.cat(
+                [hists[j][:, :, -1 - pad * (k - j - 1)].unsqueeze(2) for j in inputs],
+                dim=1,
+            )
+            pre = layer.spatial(layer_input, A) * positions_mask(settled, 1)
+            conv_input = torch.cat((state[f"pre{k}"], pre), dim=2)
+            y = layer.temporal(conv_input) * positions_mask(settled - pad, 1)
+            state[f"pre{k}"] = conv_input[:, :, 1:]
+            state[f"hist{k}"] = torch.cat((state[f"hist{k}"][:, :, 1:], y), dim=2)
+            state[f"sums{k}"] = torch.cat(
+                (state[f"sums{k}"][:, :, 1:], y.sum(dim=(2, 3))[:, :, None]), dim=2
+            )
+            hists[k] = state[f"hist{k}"]
+
+            # the steps after it see the zero padding at the end of the sequence
+            count = pad * k
+            if count:
+                tail_input = torch.cat([last_steps(j, count) for j in inputs], dim=1)
+                tail_pre = layer.spatial(tail_input, A) * positions_mask(ages - 1, count)
+            else:
+                tail_pre = pre[:, :, :0]
+            conv_input = torch.cat(
+                (
+                    state[f"pre{k}"],
+                    tail_pre,
+                    torch.zeros_like(pre).expand(-1, -1, pad, -1),
+                ),
+                dim=2,
+            )
+            tails[k] = layer.temporal(conv_input) * positions_mask(ages - 1, count + pad)
+
+            features.append(
+                state[f"sums{k}"][:, :, tails[k].size(2) :].sum(dim=2)
+                + tails[k].sum(dim=(2, 3))
+            )
+
+        steps = torch.clamp(ages, max=state["sums0"].size(2)) * x.size(3)
+        x = torch.cat(features, dim=1) / steps[:, None]
+        return self.cls(x[:, :, None, None]).view(x.size(0), -1)
+
 
 class OSA_STGCN_nano_1S(nn.Module):
     def __init__(self, num_class, graph_args, edge_importance_weighting=True, **kwargs):
@@ -185,6 +310,15 @@ class OSA_STGCN_nano_1S(nn.Module):
         out = self.fcn(out)
         return torch.sigmoid(out)
 
+    def init_stream(self, n, window=30):
+        return self.st_gcn.init_stream(n, window)
+
+    def stream(self, inputs, state):
+        """Class probabilities after adding the newest step (N, 3, 1, V) to state."""
+        out = self.st_gcn.stream(inputs, state)
+        out = self.fcn(out)
+        return torch.sigmoid(out)
+
 class OSA_STGCN_nano_2S(nn.Module):
     def __init__(self, num_class, graph_args, edge_importance_weighting=True,
                  **kwargs):
@@ -6,6 +6,8 @@ import queue
 import signal
 import threading
 from abc import ABC, abstractmethod
+from multiprocessing import shared_memory
+from typing import Optional
 
 import numpy as np
 from setproctitle import setproctitle
@@ -13,11 +15,17 @@ from setproctitle import setproctitle
 from vigision.detectors import create_detector
 from vigision.detectors.detector_config import InputTensorEnum
 from vigision.util.builtin import EventsPerSecond, load_labels
-from vigision.util.image import SharedMemoryFrameManager
 from vigision.util.services import listen
 
 logger = logging.getLogger(__name__)
 
+# seconds a camera waits for the detections of a request
+DETECTION_TIMEOUT = 5.0
+# requests of a camera in flight at once, each with its own input and output slot
+DETECTION_SLOTS = 2
+# an output slot starts with the request time of the detections it holds
+OUTPUT_TAG_SIZE = 8
+
 
 class ObjectDetector(ABC):
     @abstractmethod
@@ -74,14 +82,186 @@ class LocalObjectDetector(ObjectDetector):
             tensor_input = np.transpose(tensor_input, self.input_transform)
         return self.detect_api.detect_raw(tensor_input=tensor_input)
 
+    def detect_raw_batch(self, tensor_inputs):
+        if self.input_transform:
+            tensor_inputs = np.transpose(tensor_inputs, self.input_transform)
+        return self.detect_api.detect_raw_batch(tensor_inputs=tensor_inputs)
+
+
+def get_detection_batch(
+    request_queue: mp.Queue, batch_size: int, batch_timeout: float
+) -> list[tuple]:
+    """Wait for a request and drain pending requests until batch_size items are queued.
+
+    A request starts with (camera, request time, item count), such as the
+    persons of a pose request.
+    """
+    try:
+        batch = [request_queue.get(timeout=1)]
+    except queue.Empty:
+        return []
+
+    regions = batch[0][2]
+    deadline = datetime.datetime.now().timestamp() + batch_timeout
+    while regions < batch_size:
+        try:
+            remaining = deadline - datetime.datetime.now().timestamp()
+
+            if remaining > 0:
+                request = request_queue.get(timeout=remaining)
+            else:
+                request = request_queue.get(False)
+        except queue.Empty:
+            break
+
+        # a camera only has a single set of input slots, written by its newest
+        # request
+        previous = next((i for i, r in enumerate(batch) if r[0] == request[0]), None)
+
+        if previous is not None:
+            regions -= batch[previous][2]
+            batch[previous] = request
+        else:
+            batch.append(request)
+
+        regions += request[2]
+
+    return batch
+
+
+class DetectionScheduler:
+    """Pending detection requests of the cameras, served round robin.
+
+    A request is (camera, request time, region count, frame time, deadline,
+    slot). A camera only waits for the newest request in each of its slots, so
+    an older request for the same slot and requests past their deadline are
+    dropped and counted.
+    """
+
+    def __init__(self, dropped: Optional[dict[str, mp.Value]] = None):
+        self.dropped = dropped or {}
+        self.pending: dict[
+            tuple[str, int], tuple[str, float, int, float, float, int]
+        ] = {}
+        # camera of every served request, least recently served first
+        self.served: dict[str, None] = {}
+
+    def add(self, request):
+        key = (request[0], request[5])
+        previous = self.pending.pop(key, None)
+
+        if previous is not None:
+            self.drop(previous)
+
+        self.pending[key] = request
+
+    def drop(self, request):
+        logger.debug(f"{request[0]}: dropped detection request of {request[3]}")
+
+        # the counters are shared by the detectors taking from the same queue
+        if request[0] in self.dropped:
+            with self.dropped[request[0]].get_lock():
+                self.dropped[request[0]].value += 1
+
+    def regions(self) -> int:
+        return sum(request[2] for request in self.pending.values())
+
+    def is_expired(self, request, now: float) -> bool:
+        return request[4] <= now
+
+    def get_batch(
+        self, detection_queue: mp.Queue, batch_size: int, batch_timeout: float
+    ) -> list[tuple[str, float, int, float, float, int]]:
+        """Take queued requests until batch_size regions are pending and pick
+        up to batch_size regions of them, starting with the camera that was
+        served the longest ago.
+
+        The rest stays in the queue for the other detectors sharing it.
+        """
+        if not self.pending:
+            try:
+                self.add(detection_queue.get(timeout=1))
+            except queue.Empty:
+                return []
+
+        deadline = datetime.datetime.now().timestamp() + batch_timeout
+        while self.regions() < batch_size:
+            try:
+                remaining = deadline - datetime.datetime.now().timestamp()
+
+                if remaining > 0:
+                    self.add(detection_queue.get(timeout=remaining))
+                else:
+                    self.add(detection_queue.get(False))
+            except queue.Empty:
+                break
+
+        now = datetime.datetime.now().timestamp()
+        for key, request in list(self.pending.items()):
+            if self.is_expired(request, now):
+                self.drop(self.pending.pop(key))
+
+        cameras = list(dict.fromkeys(camera for camera, _ in self.pending))
+        # cameras that were never served go first
+        order = [camera for camera in cameras if camera not in self.served] + [
+            camera for camera in self.served if camera in cameras
+        ]
+        batch = []
+        regions = 0
+        for camera in order:
+            # the requests of a camera are served in the order they were made
+            for key in [key for key in self.pending if key[0] == camera]:
+                request = self.pending[key]
+
+                if batch and regions + request[2] > batch_size:
+                    continue
+
+                batch.append(self.pending.pop(key))
+                regions += request[2]
+                self.served.pop(camera, None)
+                self.served[camera] = None
+
+        return batch
+
+
+def get_slot_array(
+    shm: shared_memory.SharedMemory, slot: int, shape: tuple, dtype, offset: int = 0
+) -> np.ndarray:
+    """View of one of the DETECTION_SLOTS equally sized slots of a camera buffer."""
+    return np.ndarray(
+        shape,
+        dtype=dtype,
+        buffer=shm.buf,
+        offset=slot * (shm.size // DETECTION_SLOTS) + offset,
+    )
+
+
+def get_output_arrays(
+    shm: shared_memory.SharedMemory, slot: int, region_count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Request time tag and detections of an output slot."""
+    return (
+        get_slot_array(shm, slot, (1,), np.float64),
+        get_slot_array(
+            shm, slot, (region_count, 20, 6), np.float32, offset=OUTPUT_TAG_SIZE
+        ),
+    )
+
+
+def detection_output_size(max_regions: int) -> int:
+    return DETECTION_SLOTS * (OUTPUT_TAG_SIZE + max_regions * 20 * 6 * 4)
+
 
 def run_detector(
     name: str,
     detection_queue: mp.Queue,
-    out_events: dict[str, mp.Event],
+    out_events: dict[str, list[mp.Event]],
     avg_speed,
     start,
+    avg_batch_size,
+    avg_queue_wait,
     detector_config,
+    dropped: dict[str, mp.Value],
 ):
     threading.current_thread().name = f"detector:{name}"
     logger = logging.getLogger(f"detector.{name}")
@@ -98,37 +278,84 @@ def run_detector(
     signal.signal(signal.SIGTERM, receiveSignal)
     signal.signal(signal.SIGINT, receiveSignal)
 
-    frame_manager = SharedMemoryFrameManager()
     object_detector = LocalObjectDetector(detector_config=detector_config)
 
+    inputs = {}
     outputs = {}
     for name in out_events.keys():
+        inputs[name] = mp.shared_memory.SharedMemory(name=name, create=False)
         out_shm = mp.shared_memory.SharedMemory(name=f"out-{name}", create=False)
-        out_np = np.ndarray((20, 6), dtype=np.float32, buffer=out_shm.buf)
-        outputs[name] = {"shm": out_shm, "np": out_np}
+        outputs[name] = {"shm": out_shm}
+
+    batch_size = detector_config.batch_size
+    batch_timeout = detector_config.batch_timeout / 1000
+    input_shape = (detector_config.model.height, detector_config.model.width, 3)
+    batch_input = np.zeros((batch_size, *input_shape), dtype=np.uint8)
+    scheduler = DetectionScheduler(dropped)
 
     while not stop_event.is_set():
-        try:
-            connection_id = detection_queue.get(timeout=1)
-        except queue.Empty:
-            continue
-        input_frame = frame_manager.get(
-            connection_id,
-            (1, detector_config.model.height, detector_config.model.width, 3),
-        )
+        batch = scheduler.get_batch(detection_queue, batch_size, batch_timeout)
 
-        if input_frame is None:
+        if not batch:
             continue
 
+        dequeue_time = datetime.datetime.now().timestamp()
+        requests = []
+        for request in batch:
+            connection_id, request_time, region_count, _, _, slot = request
+            input_frames = get_slot_array(
+                inputs[connection_id], slot, (region_count, *input_shape), np.uint8
+            )
+            requests.append((request, input_frames))
+            avg_queue_wait.value = (
+                avg_queue_wait.value * 9 + (dequeue_time - request_time)
+            ) / 10
+
+        region_total = sum(len(input_frames) for _, input_frames in requests)
+
         # detect and send the output
         start.value = datetime.datetime.now().timestamp()
-        detections = object_detector.detect_raw(input_frame)
+        if region_total == 1:
+            detections = [object_detector.detect_raw(requests[0][1])]
+        elif len(requests) == 1:
+            # the regions of a single request are already contiguous in shared memory
+            detections = object_detector.detect_raw_batch(requests[0][1])
+        else:
+            if region_total > len(batch_input):
+                batch_input = np.zeros((region_total, *input_shape), dtype=np.uint8)
+
+            offset = 0
+            for _, input_frames in requests:
+                batch_input[offset : offset + len(input_frames)] = input_frames
+                offset += len(input_frames)
+
+            detections = object_detector.detect_raw_batch(batch_input[0:region_total])
         duration = datetime.datetime.now().timestamp() - start.value
-        outputs[connection_id]["np"][:] = detections[:]
-        out_events[connection_id].set()
+
+        end_time = datetime.datetime.now().timestamp()
+        offset = 0
+        for request, input_frames in requests:
+            connection_id, request_time, slot = request[0], request[1], request[5]
+
+            # the camera stopped waiting and may already use the slot for a new request
+            if scheduler.is_expired(request, end_time):
+                scheduler.drop(request)
+                offset += len(input_frames)
+                continue
+
+            out_tag, out_np = get_output_arrays(
+                outputs[connection_id]["shm"], slot, len(input_frames)
+            )
+            out_np[:] = detections[offset : offset + len(input_frames)]
+            offset += len(input_frames)
+            # a camera that stopped waiting in the meantime reads the tag of
+            # another request
+            out_tag[0] = request_time
+            out_events[connection_id][slot].set()
         start.value = 0.0
 
         avg_speed.value = (avg_speed.value * 9 + duration) / 10
+        avg_batch_size.value = (avg_batch_size.value * 9 + region_total) / 10
 
     logger.info("Exited detection process...")
 
@@ -140,12 +367,17 @@ class ObjectDetectProcess:
         detection_queue,
         out_events,
         detector_config,
+        dropped=None,
     ):
         self.name = name
         self.out_events = out_events
+        # detection requests dropped by deadline of each camera
+        self.dropped = dropped or {}
         self.detection_queue = detection_queue
         self.avg_inference_speed = mp.Value("d", 0.01)
         self.detection_start = mp.Value("d", 0.0)
+        self.avg_batch_size = mp.Value("d", 1.0)
+        self.avg_queue_wait = mp.Value("d", 0.0)
         self.detect_process = None
         self.detector_config = detector_config
         self.start_or_restart()
@@ -176,7 +408,10 @@ class ObjectDetectProcess:
                 self.out_events,
                 self.avg_inference_speed,
                 self.detection_start,
+                self.avg_batch_size,
+                self.avg_queue_wait,
                 self.detector_config,
+                self.dropped,
             ),
         )
         self.detect_process.daemon = True
@@ -184,46 +419,131 @@ class ObjectDetectProcess:
 
 
 class RemoteObjectDetector:
-    def __init__(self, name, labels, detection_queue, event, model_config, stop_event):
+    def __init__(
+        self,
+        name,
+        labels,
+        detection_queue,
+        events,
+        model_config,
+        stop_event,
+        max_regions=1,
+        timeout=DETECTION_TIMEOUT,
+    ):
         self.labels = labels
         self.name = name
         self.fps = EventsPerSecond()
         self.detection_queue = detection_queue
-        self.event = event
+        # one event per slot, set once the detections of its request are ready
+        self.events = events
         self.stop_event = stop_event
+        self.max_regions = max_regions
+        self.timeout = timeout
         self.shm = mp.shared_memory.SharedMemory(name=self.name, create=False)
-        self.np_shm = np.ndarray(
-            (1, model_config.height, model_config.width, 3),
-            dtype=np.uint8,
-            buffer=self.shm.buf,
-        )
+        self.np_shms = [
+            get_slot_array(
+                self.shm,
+                slot,
+                (max_regions, model_config.height, model_config.width, 3),
+                np.uint8,
+            )
+            for slot in range(len(events))
+        ]
         self.out_shm = mp.shared_memory.SharedMemory(
             name=f"out-{self.name}", create=False
         )
-        self.out_np_shm = np.ndarray((20, 6), dtype=np.float32, buffer=self.out_shm.buf)
+        self.out_np_shms = [
+            get_output_arrays(self.out_shm, slot, max_regions)
+            for slot in range(len(events))
+        ]
+        # region count, request time and deadline of the submitted requests by slot
+        self.requests: dict[int, tuple[int, float, float]] = {}
+        self.next_slot = 0
 
-    def detect(self, tensor_input, threshold=0.4):
-        detections = []
+    def detect(self, tensor_input, threshold=0.4, frame_time=None):
+        return self.detect_batch([tensor_input], threshold, frame_time)[0]
+
+    def detect_batch(self, tensor_inputs, threshold=0.4, frame_time=None):
+        """Detect up to max_regions tensor inputs with a single request."""
+        slot = self.submit(tensor_inputs, frame_time)
+
+        if slot is None:
+            return [[] for _ in tensor_inputs]
 
+        return self.collect(slot, threshold)
+
+    def submit(self, tensor_inputs, frame_time=None) -> Optional[int]:
+        """Send up to max_regions tensor inputs to the detectors without waiting.
+
+        Returns the slot to collect the detections from, None when stopped or
+        when every slot still has a request in flight.
+        """
         if self.stop_event.is_set():
-            return detections
+            return None
 
-        # copy input to shared memory
-        self.np_shm[:] = tensor_input[:]
-        self.event.clear()
-        self.detection_queue.put(self.name)
-        result = self.event.wait(timeout=5.0)
+        slot = next(
+            (
+                slot % len(self.events)
+                for slot in range(self.next_slot, self.next_slot + len(self.events))
+                if slot % len(self.events) not in self.requests
+            ),
+            None,
+        )
 
-        # if it timed out
-        if result is None:
-            return detections
+        if slot is None:
+            return None
 
-        for d in self.out_np_shm:
-            if d[1] < threshold:
-                break
-            detections.append(
-                (self.labels[int(d[0])], float(d[1]), (d[2], d[3], d[4], d[5]))
+        # copy inputs to the shared memory of the slot
+        np_shm = self.np_shms[slot]
+        for i, tensor_input in enumerate(tensor_inputs):
+            np_shm[i] = tensor_input[0]
+
+        self.events[slot].clear()
+        request_time = datetime.datetime.now().timestamp()
+        self.detection_queue.put(
+            (
+                self.name,
+                request_time,
+                len(tensor_inputs),
+                request_time if frame_time is None else frame_time,
+                request_time + self.timeout,
+                slot,
             )
+        )
+        self.requests[slot] = (
+            len(tensor_inputs),
+            request_time,
+            request_time + self.timeout,
+        )
+        self.next_slot = (slot + 1) % len(self.events)
+        return slot
+
+    def collect(self, slot, threshold=0.4):
+        """Wait for the detections of a submitted request.
+
+        The detectors drop the request once the camera stops waiting for it.
+        """
+        region_count, request_time, deadline = self.requests.pop(slot)
+        detections = [[] for _ in range(region_count)]
+        out_tag, out_np_shm = self.out_np_shms[slot]
+
+        while out_tag[0] != request_time:
+            remaining = deadline - datetime.datetime.now().timestamp()
+
+            # if it timed out
+            if not self.events[slot].wait(timeout=max(remaining, 0)):
+                return detections
+
+            if out_tag[0] != request_time:
+                # set for an earlier request of the slot that timed out
+                self.events[slot].clear()
+        for i, region_detections in enumerate(detections):
+            for d in out_np_shm[i]:
+                if d[1] < threshold:
+                    break
+                region_detections.append(
+                    (self.labels[int(d[0])], float(d[1]), (d[2], d[3], d[4], d[5]))
+                )
         self.fps.update()
         return detections
 
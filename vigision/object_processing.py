@@ -488,7 +488,7 @@ class CameraState:
         self.current_frame_time = 0.0
         self.motion_boxes = []
         self.regions = []
-        self.previous_frame_id = None
+        self.previous_frame_time = None
         self.callbacks = defaultdict(list)
         self.ptz_autotracker_thread = ptz_autotracker_thread
 
@@ -700,9 +700,8 @@ class CameraState:
 
     def update(self, frame_time, current_detections, motion_boxes, regions):
         # get the new frame
-        frame_id = f"{self.name}{frame_time}"
-        current_frame = self.frame_manager.get(
-            frame_id, self.camera_config.frame_shape_yuv
+        current_frame = self.frame_manager.get_frame(
+            self.name, frame_time, self.camera_config.frame_shape_yuv
         )
 
         tracked_objects = self.tracked_objects.copy()
@@ -896,9 +895,9 @@ class CameraState:
             self.motion_boxes = motion_boxes
             self.regions = regions
             self._current_frame = current_frame
-            if self.previous_frame_id is not None:
-                self.frame_manager.close(self.previous_frame_id)
-            self.previous_frame_id = frame_id
+            if self.previous_frame_time is not None:
+                self.frame_manager.close_frame(self.name, self.previous_frame_time)
+            self.previous_frame_time = frame_time
 
 
 class TrackedObjectProcessor(threading.Thread):
@@ -922,7 +921,9 @@ class TrackedObjectProcessor(threading.Thread):
         self.ptz_autotracker_thread = ptz_autotracker_thread
 
         self.requestor = InterProcessRequestor()
-        self.detection_publisher = DetectionPublisher(DetectionTypeEnum.video)
+        self.detection_publisher = DetectionPublisher(
+            DetectionTypeEnum.video, self.config.detection_bus.binary
+        )
         self.event_sender = EventUpdatePublisher()
         self.event_end_subscriber = EventEndSubscriber()
 
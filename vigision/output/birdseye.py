@@ -358,8 +358,8 @@ class BirdsEyeFrameManager:
             channel_dims = None
         else:
             try:
-                frame = self.frame_manager.get(
-                    f"{camera}{frame_time}", self.config.cameras[camera].frame_shape_yuv
+                frame = self.frame_manager.get_frame(
+                    camera, frame_time, self.config.cameras[camera].frame_shape_yuv
                 )
             except FileNotFoundError:
                 # TODO: better frame management would prevent this edge case
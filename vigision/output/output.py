@@ -93,9 +93,9 @@ def output_frames(
             regions,
         ) = data
 
-        frame_id = f"{camera}{frame_time}"
-
-        frame = frame_manager.get(frame_id, config.cameras[camera].frame_shape_yuv)
+        frame = frame_manager.get_frame(
+            camera, frame_time, config.cameras[camera].frame_shape_yuv
+        )
 
         # send camera frame to ffmpeg process if websockets are connected
         if any(
@@ -127,7 +127,7 @@ def output_frames(
 
         # delete frames after they have been used for output
         if camera in previous_frames:
-            frame_manager.delete(f"{camera}{previous_frames[camera]}")
+            frame_manager.delete_frame(camera, previous_frames[camera])
 
         previous_frames[camera] = frame_time
 
@@ -147,9 +147,7 @@ def output_frames(
             regions,
         ) = data
 
-        frame_id = f"{camera}{frame_time}"
-        frame = frame_manager.get(frame_id, config.cameras[camera].frame_shape_yuv)
-        frame_manager.delete(frame_id)
+        frame_manager.delete_frame(camera, frame_time)
 
     detection_subscriber.stop()
 
@@ -4,7 +4,7 @@ import torch
 
 from vigision.sppe.src.main_fast_inference import InferenNet_fast, InferenNet_fastRes50
 from vigision.sppe.src.utils.img import crop_dets
-from vigision.pose_nms import pose_nms
+from vigision.pose_nms import pose_nms, scoreThreds
 from vigision.sppe.src.utils.eval import getPrediction
 
 
@@ -27,12 +27,30 @@ class SPPE_FastPose(object):
 
     def predict(self, image, bboxs, bboxs_scores):
         inps, pt1, pt2 = crop_dets(image, bboxs, self.inp_h, self.inp_w)
+        pose_hm = self.estimate(inps)
+        return self.get_poses(pose_hm, pt1, pt2, bboxs, bboxs_scores)
+
+    def estimate(self, inps):
+        """Run the model on cropped person inputs of shape (n, 3, inp_h, inp_w)."""
         pose_hm = self.model(inps.to(self.device)).cpu().data
 
         # Cut eyes and ears.
-        pose_hm = torch.cat([pose_hm[:, :1, ...], pose_hm[:, 5:, ...]], dim=1)
+        return torch.cat([pose_hm[:, :1, ...], pose_hm[:, 5:, ...]], dim=1)
 
+    def get_poses(self, pose_hm, pt1, pt2, bboxs, bboxs_scores):
         xy_hm, xy_img, scores = getPrediction(pose_hm, pt1, pt2, self.inp_h, self.inp_w,
                                               pose_hm.shape[-2], pose_hm.shape[-1])
         result = pose_nms(bboxs, bboxs_scores, xy_img, scores)
-        return result
\ No newline at end of file
+        return result
+
+    def get_track_poses(self, pose_hm, pt1, pt2):
+        """Get the pose of every input box without pose NMS.
+
+        Used when each box belongs to a different track, the keypoints are
+        returned in input order along with whether the pose is confident.
+        """
+        xy_hm, xy_img, scores = getPrediction(pose_hm, pt1, pt2, self.inp_h, self.inp_w,
+                                              pose_hm.shape[-2], pose_hm.shape[-1])
+        scores[scores == 0] = 1e-5
+        valid = torch.max(scores[..., 0], dim=1).values >= scoreThreds
+        return xy_img - 0.3, scores, valid
@@ -0,0 +1,589 @@
+import datetime
+import logging
+import multiprocessing as mp
+import os
+import signal
+import threading
+
+import numpy as np
+import torch
+from setproctitle import setproctitle
+
+from vigision.config import PoseEstimatorConfig
+from vigision.fall_detector_loader import FALL_CLASS_NAMES, TSSTG, FallStreams
+from vigision.object_detection import get_detection_batch
+from vigision.pose_estimate_loader import SPPE_FastPose
+from vigision.sppe.src.utils.img import crop_dets
+from vigision.track.key_points import KeyPointStore
+from vigision.util.builtin import EventsPerSecond
+from vigision.util.services import listen
+
+logger = logging.getLogger(__name__)
+
+POSE_INPUT_HEIGHT = 320
+POSE_INPUT_WIDTH = 256
+POSE_KEYPOINTS = 13
+FALL_SEQUENCE_LENGTH = 30
+FALL_MODEL_PATH = "vigision/models/gcn/hfd_30frames.pth"
+
+
+class PoseInputBuffers:
+    """Views on the shared memory a camera writes its pose requests to."""
+
+    def __init__(self, buf, max_persons: int):
+        # request time of the request the buffers were last written for
+        self.request = np.ndarray((1,), dtype=np.float64, buffer=buf)
+        offset = self.request.nbytes
+        self.crops = np.ndarray(
+            (max_persons, 3, POSE_INPUT_HEIGHT, POSE_INPUT_WIDTH),
+            dtype=np.float32,
+            buffer=buf,
+            offset=offset,
+        )
+        offset += self.crops.nbytes
+        # x1, y1, x2, y2, score of the person boxes
+        self.boxes = np.ndarray(
+            (max_persons, 5), dtype=np.float32, buffer=buf, offset=offset
+        )
+        offset += self.boxes.nbytes
+        # top left and bottom right of the area cropped around each box
+        self.crop_boxes = np.ndarray(
+            (max_persons, 4), dtype=np.float32, buffer=buf, offset=offset
+        )
+        offset += self.crop_boxes.nbytes
+        # keypoint history of the persons that need a fall prediction
+        self.key_points = np.ndarray(
+            (max_persons, FALL_SEQUENCE_LENGTH, POSE_KEYPOINTS, 3),
+            dtype=np.float32,
+            buffer=buf,
+            offset=offset,
+        )
+
+    @staticmethod
+    def size(max_persons: int) -> int:
+        return 8 + (
+            max_persons
+            * 4
+            * (
+                3 * POSE_INPUT_HEIGHT * POSE_INPUT_WIDTH
+                + 5
+                + 4
+                + FALL_SEQUENCE_LENGTH * POSE_KEYPOINTS * 3
+            )
+        )
+
+
+class PoseOutputBuffers:
+    """Views on the shared memory the pose estimator writes its results to."""
+
+    def __init__(self, buf, max_persons: int):
+        # request time of the request the results were written for
+        self.request = np.ndarray((1,), dtype=np.float64, buffer=buf)
+        offset = self.request.nbytes
+        self.key_points = np.ndarray(
+            (max_persons, POSE_KEYPOINTS, 3),
+            dtype=np.float32,
+            buffer=buf,
+            offset=offset,
+        )
+        offset += self.key_points.nbytes
+        # pose nms can drop persons, only valid rows have keypoints
+        self.valid = np.ndarray(
+            (max_persons,), dtype=np.float32, buffer=buf, offset=offset
+        )
+        offset += self.valid.nbytes
+        self.fall = np.ndarray(
+            (max_persons, len(FALL_CLASS_NAMES)),
+            dtype=np.float32,
+            buffer=buf,
+            offset=offset,
+        )
+        offset += self.fall.nbytes
+        # streamed fall predictions line up with the persons, only full
+        # keypoint histories have one
+        self.fall_valid = np.ndarray(
+            (max_persons,), dtype=np.float32, buffer=buf, offset=offset
+        )
+
+    @staticmethod
+    def size(max_persons: int) -> int:
+        return 8 + max_persons * 4 * (POSE_KEYPOINTS * 3 + 2 + len(FALL_CLASS_NAMES))
+
+
+def write_pose_results(
+    pose_model: SPPE_FastPose,
+    pose_hm,
+    inputs: PoseInputBuffers,
+    outputs: PoseOutputBuffers,
+    person_count: int,
+    track_aware: bool = True,
+):
+    """Turn the heatmaps of a single camera request into keypoints."""
+    crop_boxes = torch.from_numpy(inputs.crop_boxes[:person_count].copy())
+
+    if track_aware:
+        # every box is a different track, the rows line up with the request
+        key_points, kp_scores, valid = pose_model.get_track_poses(
+            pose_hm, crop_boxes[:, :2], crop_boxes[:, 2:]
+        )
+        outputs.key_points[:person_count, :, :2] = key_points.numpy()
+        outputs.key_points[:person_count, :, 2:] = kp_scores.numpy()
+        outputs.valid[:person_count] = valid.numpy()
+    else:
+        boxes = torch.from_numpy(inputs.boxes[:person_count].copy())
+        poses = pose_model.get_poses(
+            pose_hm, crop_boxes[:, :2], crop_boxes[:, 2:], boxes[:, :4], boxes[:, 4]
+        )
+
+        outputs.valid[:person_count] = 0
+        for pose in poses:
+            index = int(torch.nonzero((boxes[:, :4] == pose["bbox"]).all(dim=1))[0])
+            outputs.key_points[index] = np.concatenate(
+                (pose["keypoints"].numpy(), pose["kp_score"].numpy()), axis=1
+            )
+            outputs.valid[index] = 1
+
+
+def write_fall_results(fall_model: TSSTG, requests):
+    """Classify the full keypoint windows of several camera requests at once.
+
+    @param requests: list of (inputs, outputs, fall count, image size)
+    """
+    requests = [request for request in requests if request[2] > 0]
+
+    if not requests:
+        return
+
+    key_points = np.concatenate(
+        [inputs.key_points[:fall_count] for inputs, _, fall_count, _ in requests]
+    )
+    image_sizes = np.repeat(
+        [image_size for *_, image_size in requests],
+        [fall_count for _, _, fall_count, _ in requests],
+        axis=0,
+    )
+    falls = fall_model.predict_batch(key_points, image_sizes)
+
+    offset = 0
+    for _, outputs, fall_count, _ in requests:
+        outputs.fall[:fall_count] = falls[offset : offset + fall_count]
+        offset += fall_count
+
+
+def write_fall_stream_results(fall_streams: FallStreams, requests):
+    """Stream the new poses of several camera requests through the fall model.
+
+    @param requests: list of (camera, person ids, dropped ids, moved ids,
+    outputs, fall count, image size), the poses of the first fall count
+    persons are streamed, the streams of the dropped ids are removed and the
+    ones of the (source id, id) moved ids continue under id
+    """
+    keys = []
+    key_points = []
+    image_sizes = []
+    for camera, ids, _, _, outputs, fall_count, image_size in requests:
+        outputs.fall_valid[:fall_count] = 0
+        rows = np.flatnonzero(outputs.valid[:fall_count])
+        keys.extend((camera, ids[i]) for i in rows)
+        key_points.append(outputs.key_points[rows])
+        image_sizes.extend([image_size] * len(rows))
+
+    # poses carried over to a new track keep their stream
+    for camera, _, _, moved_ids, *_ in requests:
+        for source_id, id in moved_ids:
+            fall_streams.move((camera, source_id), (camera, id))
+
+    # persons left out of a request keep their stream until the track is gone
+    fall_streams.remove(
+        [(camera, id) for camera, _, dropped_ids, *_ in requests for id in dropped_ids]
+    )
+
+    if not keys:
+        return
+
+    falls, ages = fall_streams.update(
+        keys, np.concatenate(key_points), np.array(image_sizes)
+    )
+
+    offset = 0
+    for *_, outputs, fall_count, _ in requests:
+        rows = np.flatnonzero(outputs.valid[:fall_count])
+        outputs.fall[rows] = falls[offset : offset + len(rows)]
+        outputs.fall_valid[rows] = (
+            ages[offset : offset + len(rows)] >= FALL_SEQUENCE_LENGTH
+        )
+        offset += len(rows)
+
+
+def run_pose_estimator(
+    name: str,
+    pose_queue: mp.Queue,
+    out_events: dict[str, mp.Event],
+    avg_speed,
+    start,
+    avg_batch_size,
+    config: PoseEstimatorConfig,
+    device: str,
+):
+    threading.current_thread().name = f"pose_estimator:{name}"
+    logger = logging.getLogger(f"pose_estimator.{name}")
+    logger.info(f"Starting pose estimation process: {os.getpid()}")
+    setproctitle(f"vigision.pose_estimator.{name}")
+    listen()
+
+    stop_event = mp.Event()
+
+    def receiveSignal(signalNumber, frame):
+        logger.info("Signal to exit pose estimation process...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, receiveSignal)
+    signal.signal(signal.SIGINT, receiveSignal)
+
+    pose_model = SPPE_FastPose(
+        "resnet50", POSE_INPUT_HEIGHT, POSE_INPUT_WIDTH, device=device
+    )
+    fall_model = TSSTG(weight_file=FALL_MODEL_PATH, device=device)
+    fall_streams = FallStreams(fall_model, FALL_SEQUENCE_LENGTH)
+
+    buffers = {}
+    for camera in out_events.keys():
+        in_shm = mp.shared_memory.SharedMemory(name=f"pose-{camera}", create=False)
+        out_shm = mp.shared_memory.SharedMemory(
+            name=f"pose-out-{camera}", create=False
+        )
+        buffers[camera] = {
+            "shm": (in_shm, out_shm),
+            "inputs": PoseInputBuffers(in_shm.buf, config.max_persons),
+            "outputs": PoseOutputBuffers(out_shm.buf, config.max_persons),
+        }
+
+    while not stop_event.is_set():
+        batch = get_detection_batch(
+            pose_queue, config.batch_size, config.batch_timeout / 1000
+        )
+
+        # inputs of requests a camera gave up on are overwritten by a newer
+        # one, which also carries their dropped and moved streams
+        batch = [
+            request
+            for request in batch
+            if buffers[request[0]]["inputs"].request[0] == request[1]
+        ]
+
+        if not batch:
+            continue
+
+        start.value = datetime.datetime.now().timestamp()
+
+        # a single forward pass for the persons of every camera in the batch
+        crops = torch.from_numpy(
+            np.concatenate(
+                [
+                    buffers[camera]["inputs"].crops[:person_count]
+                    for camera, _, person_count, *_ in batch
+                ]
+            )
+        )
+        pose_hm = pose_model.estimate(crops)
+
+        offset = 0
+        for camera, _, person_count, *_ in batch:
+            write_pose_results(
+                pose_model,
+                pose_hm[offset : offset + person_count],
+                buffers[camera]["inputs"],
+                buffers[camera]["outputs"],
+                person_count,
+                config.track_aware,
+            )
+            offset += person_count
+
+        if config.streaming_fall:
+            write_fall_stream_results(
+                fall_streams,
+                [
+                    (
+                        camera,
+                        ids,
+                        dropped_ids,
+                        moved_ids,
+                        buffers[camera]["outputs"],
+                        fall_count,
+                        image_size,
+                    )
+                    for (
+                        camera,
+                        _,
+                        _,
+                        fall_count,
+                        image_size,
+                        ids,
+                        dropped_ids,
+                        moved_ids,
+                    ) in batch
+                ],
+            )
+        else:
+            # a single fall model forward pass for the full windows of every camera
+            write_fall_results(
+                fall_model,
+                [
+                    (
+                        buffers[camera]["inputs"],
+                        buffers[camera]["outputs"],
+                        fall_count,
+                        image_size,
+                    )
+                    for camera, _, _, fall_count, image_size, *_ in batch
+                ],
+            )
+
+        for camera, request_time, *_ in batch:
+            buffers[camera]["outputs"].request[0] = request_time
+            out_events[camera].set()
+
+        duration = datetime.datetime.now().timestamp() - start.value
+        start.value = 0.0
+
+        avg_speed.value = (avg_speed.value * 9 + duration) / 10
+        avg_batch_size.value = (avg_batch_size.value * 9 + len(crops)) / 10
+
+    logger.info("Exited pose estimation process...")
+
+
+class PoseEstimateProcess:
+    def __init__(
+        self,
+        name,
+        pose_queue,
+        out_events,
+        config: PoseEstimatorConfig,
+        device,
+    ):
+        self.name = name
+        self.out_events = out_events
+        self.pose_queue = pose_queue
+        self.avg_inference_speed = mp.Value("d", 0.01)
+        self.estimation_start = mp.Value("d", 0.0)
+        self.avg_batch_size = mp.Value("d", 1.0)
+        self.pose_process = None
+        self.config = config
+        self.device = device
+        self.start_or_restart()
+
+    def stop(self):
+        # if the process has already exited on its own, just return
+        if self.pose_process and self.pose_process.exitcode:
+            return
+        self.pose_process.terminate()
+        logging.info("Waiting for pose estimation process to exit gracefully...")
+        self.pose_process.join(timeout=30)
+        if self.pose_process.exitcode is None:
+            logging.info("Pose estimation process didn't exit. Force killing...")
+            self.pose_process.kill()
+            self.pose_process.join()
+        logging.info("Pose estimation process has exited...")
+
+    def start_or_restart(self):
+        self.estimation_start.value = 0.0
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            self.stop()
+        self.pose_process = mp.Process(
+            target=run_pose_estimator,
+            name=f"pose_estimator:{self.name}",
+            args=(
+                self.name,
+                self.pose_queue,
+                self.out_events,
+                self.avg_inference_speed,
+                self.estimation_start,
+                self.avg_batch_size,
+                self.config,
+                self.device,
+            ),
+        )
+        self.pose_process.daemon = True
+        self.pose_process.start()
+
+
+class RemotePoseEstimator:
+    """Submits person crops of a camera to the shared pose estimators without waiting."""
+
+    def __init__(
+        self, name, pose_queue, event, max_persons, stop_event, streaming_fall=False
+    ):
+        self.name = name
+        self.streaming_fall = streaming_fall
+        self.fps = EventsPerSecond()
+        self.pose_queue = pose_queue
+        self.event = event
+        self.max_persons = max_persons
+        self.stop_event = stop_event
+        self.in_shm = mp.shared_memory.SharedMemory(name=f"pose-{name}", create=False)
+        self.out_shm = mp.shared_memory.SharedMemory(
+            name=f"pose-out-{name}", create=False
+        )
+        self.inputs = PoseInputBuffers(self.in_shm.buf, max_persons)
+        self.outputs = PoseOutputBuffers(self.out_shm.buf, max_persons)
+        # (person ids, fall ids, request time, dropped ids, moved ids) of the
+        # request in flight
+        self.pending = None
+        # persons sent before and the ones whose fall stream is dropped or
+        # moved to another id with the next request
+        self.sent_ids: set[str] = set()
+        self.dropped_ids: list[str] = []
+        self.moved_ids: list[tuple[str, str]] = []
+
+    def is_ready(self) -> bool:
+        return self.pending is None
+
+    def submit(
+        self,
+        frame,
+        persons,
+        key_points: KeyPointStore,
+        image_size,
+        classify_ids=None,
+        sparse_ids=frozenset(),
+    ):
+        """Send the persons of a frame for pose estimation.
+
+        @param frame: bgr frame or YuvFrameView, which only converts the crops
+        @param persons: list of (id, box, score)
+        @param key_points: KeyPointStore with the keypoint history of each tracked id
+        @param image_size: frame size passed to the fall model
+        @param classify_ids: ids whose full keypoint window gets a fall
+        prediction, all of them when None
+        @param sparse_ids: ids with keep warm poses, which are not streamed
+        through the fall model
+        @return: ids whose keypoint window was sent
+        """
+        if self.stop_event.is_set() or not self.is_ready() or not persons:
+            return []
+
+        def classify(id):
+            return key_points.count(id) == FALL_SEQUENCE_LENGTH and (
+                classify_ids is None or id in classify_ids
+            )
+
+        # persons to classify or stream go first to fill the fall slots
+        if self.streaming_fall:
+            persons = sorted(persons, key=lambda p: p[0] in sparse_ids)
+        else:
+            persons = sorted(persons, key=lambda p: not classify(p[0]))
+        persons = persons[: self.max_persons]
+        boxes = torch.tensor(
+            [list(box) + [score] for _, box, score in persons], dtype=torch.float32
+        )
+        # crops are written straight into the shared memory slots
+        _, pt1, pt2 = crop_dets(
+            frame,
+            boxes[:, :4],
+            POSE_INPUT_HEIGHT,
+            POSE_INPUT_WIDTH,
+            out=self.inputs.crops,
+        )
+
+        person_count = len(persons)
+        self.inputs.boxes[:person_count] = boxes.numpy()
+        self.inputs.crop_boxes[:person_count, :2] = pt1.numpy()
+        self.inputs.crop_boxes[:person_count, 2:] = pt2.numpy()
+
+        # streamed fall predictions don't need the keypoint windows
+        if self.streaming_fall:
+            fall_ids = [id for id, _, _ in persons if id not in sparse_ids]
+        else:
+            fall_ids = [id for id, _, _ in persons if classify(id)]
+            if fall_ids:
+                self.inputs.key_points[: len(fall_ids)] = key_points.gather(fall_ids)
+
+        request_time = datetime.datetime.now().timestamp()
+        self.inputs.request[0] = request_time
+        self.event.clear()
+        ids = [p[0] for p in persons]
+        self.pose_queue.put(
+            (
+                self.name,
+                request_time,
+                person_count,
+                len(fall_ids),
+                image_size,
+                ids,
+                self.dropped_ids,
+                self.moved_ids,
+            )
+        )
+        self.sent_ids.update(ids)
+        self.pending = (ids, fall_ids, request_time, self.dropped_ids, self.moved_ids)
+        self.dropped_ids = []
+        self.moved_ids = []
+        return [] if self.streaming_fall else fall_ids
+
+    def get_results(self):
+        """Get the results of the request in flight.
+
+        @return: (keypoints by id, fall scores by id) or None while it is running
+        """
+        if self.pending is None:
+            return None
+
+        ids, fall_ids, request_time, dropped_ids, moved_ids = self.pending
+        finished = self.event.is_set()
+
+        if finished and self.outputs.request[0] != request_time:
+            # set for a request that was given up on, this one is still running
+            self.event.clear()
+            finished = self.outputs.request[0] == request_time
+
+        if not finished:
+            # give up on requests the pose estimator never finished, a
+            # superseded request never reaches the fall streams so its
+            # dropped and moved streams go with the next one
+            if datetime.datetime.now().timestamp() - request_time > 5.0:
+                self.dropped_ids = dropped_ids + self.dropped_ids
+                self.moved_ids = moved_ids + self.moved_ids
+                self.pending = None
+
+            return None
+
+        self.pending = None
+        key_points = {
+            id: self.outputs.key_points[i].copy()
+            for i, id in enumerate(ids)
+            if self.outputs.valid[i]
+        }
+        if self.streaming_fall:
+            falls = {
+                id: self.outputs.fall[i].copy()
+                for i, id in enumerate(fall_ids)
+                if self.outputs.fall_valid[i]
+            }
+        else:
+            falls = {id: self.outputs.fall[i].copy() for i, id in enumerate(fall_ids)}
+        self.fps.update()
+        return key_points, falls
+
+    def move(self, moved_ids):
+        """Continue fall streams under the ids of the tracks the poses were
+        carried over to.
+
+        @param moved_ids: list of (source id, id)
+        """
+        for source_id, id in moved_ids:
+            if source_id in self.sent_ids:
+                self.moved_ids.append((source_id, id))
+                self.sent_ids.add(id)
+
+    def reset(self, ids):
+        """Restart the fall streams of persons with the next request."""
+        self.dropped_ids.extend(id for id in ids if id in self.sent_ids)
+
+    def retain(self, ids):
+        """Drop the fall streams of the persons sent before that are not in ids."""
+        self.dropped_ids.extend(id for id in self.sent_ids if id not in ids)
+        self.sent_ids = {id for id in self.sent_ids if id in ids}
+
+    def cleanup(self):
+        self.in_shm.unlink()
+        self.out_shm.unlink()
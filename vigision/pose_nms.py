@@ -1,10 +1,5 @@
 # -*- coding: utf-8 -*-
 import torch
-import json
-import os
-import zipfile
-import time
-from multiprocessing.dummy import Pool as ThreadPool
 import numpy as np
 
 ''' Constant Configuration '''
@@ -16,7 +11,6 @@ scoreThreds = 0.3
 matchThreds = 5
 areaThres = 0  # 40 * 40.5
 alpha = 0.1
-#pool = ThreadPool(4)
 
 
 def pose_nms(bboxes, bbox_scores, pose_preds, pose_scores):
@@ -26,260 +20,123 @@ def pose_nms(bboxes, bbox_scores, pose_preds, pose_scores):
     bbox_scores:    bbox scores list (n,)
     pose_preds:     pose locations list (n, 17, 2)
     pose_scores:    pose scores list    (n, 17, 1)
-    """
-    global ori_pose_preds, ori_pose_scores, ref_dists
 
+    The pairwise distances between all poses are computed once, so the
+    greedy suppression and the merging only index into them. There is no
+    module state and the function can be called from several threads.
+    """
     pose_scores[pose_scores == 0] = 1e-5
 
     final_result = []
 
-    ori_bboxes = bboxes.clone()
-    ori_bbox_scores = bbox_scores.clone()
-    ori_pose_preds = pose_preds.clone()
-    ori_pose_scores = pose_scores.clone()
-
-    xmax = bboxes[:, 2]
-    xmin = bboxes[:, 0]
-    ymax = bboxes[:, 3]
-    ymin = bboxes[:, 1]
-
-    widths = xmax - xmin
-    heights = ymax - ymin
-    ref_dists = alpha * np.maximum(widths, heights)
-
-    nsamples = bboxes.shape[0]
-    human_scores = pose_scores.mean(dim=1)
-
-    human_ids = np.arange(nsamples)
-    # Do pPose-NMS
-    pick = []
-    merge_ids = []
-    while human_scores.shape[0] != 0:
-        # Pick the one with highest score
-        pick_id = torch.argmax(human_scores)
-        pick.append(human_ids[pick_id])
-        # num_visPart = torch.sum(pose_scores[pick_id] > 0.2)
+    if bboxes.shape[0] == 0:
+        return final_result
 
-        # Get numbers of match keypoints by calling PCK_match
-        ref_dist = ref_dists[human_ids[pick_id]]
-        simi = get_parametric_distance(pick_id, pose_preds, pose_scores, ref_dist)
-        num_match_keypoints = PCK_match(pose_preds[pick_id], pose_preds, ref_dist)
+    scores = pose_scores[..., 0]
 
-        # Delete humans who have more than matchThreds keypoints overlap and high similarity
-        delete_ids = torch.from_numpy(np.arange(human_scores.shape[0]))[
-            (simi > gamma) | (num_match_keypoints >= matchThreds)]
+    widths = bboxes[:, 2] - bboxes[:, 0]
+    heights = bboxes[:, 3] - bboxes[:, 1]
+    ref_dists = alpha * torch.maximum(widths, heights)
 
-        if delete_ids.shape[0] == 0:
-            delete_ids = pick_id
-        #else:
-        #    delete_ids = torch.from_numpy(delete_ids)
-
-        merge_ids.append(human_ids[delete_ids])
-        pose_preds = np.delete(pose_preds, delete_ids, axis=0)
-        pose_scores = np.delete(pose_scores, delete_ids, axis=0)
-        human_ids = np.delete(human_ids, delete_ids)
-        human_scores = np.delete(human_scores, delete_ids, axis=0)
-        bbox_scores = np.delete(bbox_scores, delete_ids, axis=0)
-
-    assert len(merge_ids) == len(pick)
-    bboxs_pick = ori_bboxes[pick]
-    preds_pick = ori_pose_preds[pick]
-    scores_pick = ori_pose_scores[pick]
-    bbox_scores_pick = ori_bbox_scores[pick]
-    #final_result = pool.map(filter_result, zip(scores_pick, merge_ids, preds_pick, pick, bbox_scores_pick))
-    #final_result = [item for item in final_result if item is not None]
+    # keypoint distances between every pair of poses [n, n, 17]
+    dists = torch.sqrt(torch.sum(
+        torch.pow(pose_preds[:, np.newaxis] - pose_preds[np.newaxis, :], 2),
+        dim=3
+    ))
 
-    for j in range(len(pick)):
-        ids = np.arange(pose_preds.shape[1])
-        max_score = torch.max(scores_pick[j, ids, 0])
+    simi = get_parametric_distances(dists, scores)
+    num_match_keypoints = PCK_match(dists, ref_dists)
 
-        if max_score < scoreThreds:
-            continue
+    # row i holds the poses the pick i suppresses
+    suppress = (simi > gamma) | (num_match_keypoints >= matchThreds)
+    suppress.fill_diagonal_(True)
 
-        # Merge poses
-        merge_id = merge_ids[j]
-        merge_pose, merge_score = p_merge_fast(
-            preds_pick[j], ori_pose_preds[merge_id], ori_pose_scores[merge_id], ref_dists[pick[j]])
+    # Do pPose-NMS, highest human score first and the lowest index on ties
+    human_scores = scores.mean(dim=1).numpy()
+    order = np.lexsort((np.arange(len(human_scores)), -human_scores))
+    suppress = suppress.numpy()
 
-        max_score = torch.max(merge_score[ids])
-        if max_score < scoreThreds:
+    remaining = np.ones(len(human_scores), dtype=bool)
+    pick = []
+    merge_masks = []
+    for pick_id in order:
+        if not remaining[pick_id]:
             continue
 
-        xmax = max(merge_pose[:, 0])
-        xmin = min(merge_pose[:, 0])
-        ymax = max(merge_pose[:, 1])
-        ymin = min(merge_pose[:, 1])
-
-        if 1.5 ** 2 * (xmax - xmin) * (ymax - ymin) < areaThres:
-            continue
+        merge_mask = suppress[pick_id] & remaining
+        remaining &= ~merge_mask
+        pick.append(pick_id)
+        merge_masks.append(merge_mask)
+
+    pick = torch.from_numpy(np.array(pick))
+    merge_poses, merge_scores = p_merge_batch(
+        dists[pick], torch.from_numpy(np.stack(merge_masks)), pose_preds, scores,
+        ref_dists[pick])
+
+    merge_max_scores = torch.max(merge_scores, dim=1).values
+    xmax, ymax = torch.max(merge_poses, dim=1).values.unbind(-1)
+    xmin, ymin = torch.min(merge_poses, dim=1).values.unbind(-1)
+    keep = (
+        (torch.max(scores[pick], dim=1).values >= scoreThreds)
+        & (merge_max_scores >= scoreThreds)
+        & ~(1.5 ** 2 * (xmax - xmin) * (ymax - ymin) < areaThres)
+    )
+    proposal_scores = (
+        torch.mean(merge_scores, dim=1) + bbox_scores[pick] + 1.25 * merge_max_scores
+    )
 
+    for j in torch.nonzero(keep).flatten().tolist():
+        pick_id = pick[j]
         final_result.append({
-            'ori_bbox': ori_bboxes,
-            'bbox': bboxs_pick[j],
-            'bbox_score': bbox_scores_pick[j],
-            'keypoints': merge_pose - 0.3,
-            'kp_score': merge_score,
-            'proposal_score': torch.mean(merge_score) + bbox_scores_pick[j] + 1.25 * max(merge_score)
+            'ori_bbox': bboxes,
+            'bbox': bboxes[pick_id],
+            'bbox_score': bbox_scores[pick_id],
+            'keypoints': merge_poses[j] - 0.3,
+            'kp_score': merge_scores[j].unsqueeze(-1),
+            'proposal_score': proposal_scores[j:j + 1]
         })
 
     return final_result
 
 
-def filter_result(args):
-    score_pick, merge_id, pred_pick, pick, bbox_score_pick = args
-    global ori_pose_preds, ori_pose_scores, ref_dists
-    ids = np.arange(17)
-    max_score = torch.max(score_pick[ids, 0])
-
-    if max_score < scoreThreds:
-        return None
-
-    # Merge poses
-    merge_pose, merge_score = p_merge_fast(
-        pred_pick, ori_pose_preds[merge_id], ori_pose_scores[merge_id], ref_dists[pick])
-
-    max_score = torch.max(merge_score[ids])
-    if max_score < scoreThreds:
-        return None
-
-    xmax = max(merge_pose[:, 0])
-    xmin = min(merge_pose[:, 0])
-    ymax = max(merge_pose[:, 1])
-    ymin = min(merge_pose[:, 1])
-
-    if 1.5 ** 2 * (xmax - xmin) * (ymax - ymin) < 40 * 40.5:
-        return None
-
-    return {
-        'keypoints': merge_pose - 0.3,
-        'kp_score': merge_score,
-        'proposal_score': torch.mean(merge_score) + bbox_score_pick + 1.25 * max(merge_score)
-    }
-
-
-def p_merge(ref_pose, cluster_preds, cluster_scores, ref_dist):
+def p_merge_batch(pick_dists, merge_masks, pose_preds, pose_scores, ref_dists):
     """
-    Score-weighted pose merging
+    Score-weighted pose merging of every picked pose at once
     INPUT:
-        ref_pose:       reference pose          -- [17, 2]
-        cluster_preds:  redundant poses         -- [n, 17, 2]
-        cluster_scores: redundant poses score   -- [n, 17, 1]
-        ref_dist:       reference scale         -- Constant
+        pick_dists:     distances from the picked poses     -- [p, n, 17]
+        merge_masks:    poses merged into each pick         -- [p, n]
+        pose_preds:     all poses                           -- [n, 17, 2]
+        pose_scores:    all poses score                     -- [n, 17]
+        ref_dists:      reference scale of each pick        -- [p]
     OUTPUT:
-        final_pose:     merged pose             -- [17, 2]
-        final_score:    merged score            -- [17]
+        final_pose:     merged poses          -- [p, 17, 2]
+        final_score:    merged scores         -- [p, 17]
     """
-    dist = torch.sqrt(torch.sum(
-        torch.pow(ref_pose[np.newaxis, :] - cluster_preds, 2),
-        dim=2
-    ))  # [n, 17]
-
-    kp_num = 17
-    ref_dist = min(ref_dist, 15)
-
-    mask = (dist <= ref_dist)
-    final_pose = torch.zeros(kp_num, 2)
-    final_score = torch.zeros(kp_num)
-
-    if cluster_preds.dim() == 2:
-        cluster_preds.unsqueeze_(0)
-        cluster_scores.unsqueeze_(0)
-    if mask.dim() == 1:
-        mask.unsqueeze_(0)
-
-    for i in range(kp_num):
-        cluster_joint_scores = cluster_scores[:, i][mask[:, i]]  # [k, 1]
-        cluster_joint_location = cluster_preds[:, i, :][mask[:, i].unsqueeze(
-            -1).repeat(1, 2)].view((torch.sum(mask[:, i]), -1))
-
-        # Get an normalized score
-        normed_scores = cluster_joint_scores / torch.sum(cluster_joint_scores)
-
-        # Merge poses by a weighted sum
-        final_pose[i, 0] = torch.dot(cluster_joint_location[:, 0], normed_scores.squeeze(-1))
-        final_pose[i, 1] = torch.dot(cluster_joint_location[:, 1], normed_scores.squeeze(-1))
-
-        final_score[i] = torch.dot(cluster_joint_scores.transpose(0, 1).squeeze(0), normed_scores.squeeze(-1))
-
-    return final_pose, final_score
-
-
-def p_merge_fast(ref_pose, cluster_preds, cluster_scores, ref_dist):
-    """
-    Score-weighted pose merging
-    INPUT:
-        ref_pose:       reference pose          -- [17, 2]
-        cluster_preds:  redundant poses         -- [n, 17, 2]
-        cluster_scores: redundant poses score   -- [n, 17, 1]
-        ref_dist:       reference scale         -- Constant
-    OUTPUT:
-        final_pose:     merged pose             -- [17, 2]
-        final_score:    merged score            -- [17]
-    """
-    dist = torch.sqrt(torch.sum(
-        torch.pow(ref_pose[np.newaxis, :] - cluster_preds, 2),
-        dim=2
-    ))
-
-    kp_num = 17
-    ref_dist = min(ref_dist, 15)
-
-    mask = (dist <= ref_dist)
-    final_pose = torch.zeros(kp_num, 2)
-    final_score = torch.zeros(kp_num)
-
-    if cluster_preds.dim() == 2:
-        cluster_preds.unsqueeze_(0)
-        cluster_scores.unsqueeze_(0)
-    if mask.dim() == 1:
-        mask.unsqueeze_(0)
+    ref_dists = torch.clamp(ref_dists, max=15)
+    mask = merge_masks.unsqueeze(-1) & (pick_dists <= ref_dists[:, None, None])
 
     # Weighted Merge
-    masked_scores = cluster_scores.mul(mask.float().unsqueeze(-1))
-    normed_scores = masked_scores / torch.sum(masked_scores, dim=0)
+    masked_scores = pose_scores[np.newaxis] * mask.float()
+    normed_scores = masked_scores / torch.sum(masked_scores, dim=1, keepdim=True)
 
-    final_pose = torch.mul(cluster_preds, normed_scores.repeat(1, 1, 2)).sum(dim=0)
-    final_score = torch.mul(masked_scores, normed_scores).sum(dim=0)
+    final_pose = torch.einsum('pnk,nkc->pkc', normed_scores, pose_preds)
+    final_score = torch.sum(masked_scores * normed_scores, dim=1)
     return final_pose, final_score
 
 
-def get_parametric_distance(i, all_preds, keypoint_scores, ref_dist):
-    pick_preds = all_preds[i]
-    pred_scores = keypoint_scores[i]
-    dist = torch.sqrt(torch.sum(
-        torch.pow(pick_preds[np.newaxis, :] - all_preds, 2),
-        dim=2
-    ))
-    mask = (dist <= 1)
+def get_parametric_distances(dists, keypoint_scores):
+    """Parametric distance between every pair of poses [n, n]."""
+    mask = dists <= 1
+    tanh_scores = torch.tanh(keypoint_scores / delta1)
 
     # Define a keypoints distance
-    score_dists = torch.zeros(all_preds.shape[0], all_preds.shape[1])
-    keypoint_scores.squeeze_()
-    if keypoint_scores.dim() == 1:
-        keypoint_scores.unsqueeze_(0)
-    if pred_scores.dim() == 1:
-        pred_scores.unsqueeze_(1)
-    # The predicted scores are repeated up to do broadcast
-    pred_scores = pred_scores.repeat(1, all_preds.shape[0]).transpose(0, 1)
-
-    score_dists[mask] = torch.tanh(pred_scores[mask] / delta1) *\
-                        torch.tanh(keypoint_scores[mask] / delta1)
-
-    point_dist = torch.exp((-1) * dist / delta2)
-    final_dist = torch.sum(score_dists, dim=1) + mu * torch.sum(point_dist, dim=1)
+    score_dists = (tanh_scores[:, np.newaxis] * tanh_scores[np.newaxis, :]) * mask
 
-    return final_dist
+    point_dist = torch.exp((-1) * dists / delta2)
+    return torch.sum(score_dists, dim=2) + mu * torch.sum(point_dist, dim=2)
 
 
-def PCK_match(pick_pred, all_preds, ref_dist):
-    dist = torch.sqrt(torch.sum(
-        torch.pow(pick_pred[np.newaxis, :] - all_preds, 2),
-        dim=2
-    ))
-    ref_dist = min(ref_dist, 7)
-    num_match_keypoints = torch.sum(
-        dist / ref_dist <= 1,
-        dim=1
-    )
-
-    return num_match_keypoints
+def PCK_match(dists, ref_dists):
+    """Number of matching keypoints between every pair of poses [n, n]."""
+    ref_dists = torch.clamp(ref_dists, max=7)
+    return torch.sum(dists / ref_dists[:, None, None] <= 1, dim=2)
@@ -20,8 +20,14 @@ def scale_pose(xy):
     """
     if xy.ndim == 2:
         xy = np.expand_dims(xy, 0)
-    xy_min = np.nanmin(xy, axis=1)
-    xy_max = np.nanmax(xy, axis=1)
-    for i in range(xy.shape[0]):
-        xy[i] = ((xy[i] - xy_min[i]) / (xy_max[i] - xy_min[i])) * 2 - 1
-    return xy.squeeze()
+    return scale_poses(xy).squeeze()
+
+
+def scale_poses(xy):
+    """Normalize pose points in place by scale with max/min value of each pose.
+    xy : (..., parts, xy), any number of leading sequence or batch dimensions
+    """
+    xy_min = np.nanmin(xy, axis=-2, keepdims=True)
+    xy_max = np.nanmax(xy, axis=-2, keepdims=True)
+    xy[:] = ((xy - xy_min) / (xy_max - xy_min)) * 2 - 1
+    return xy
@@ -94,9 +94,8 @@ class PtzMotionEstimator:
                 f"{camera}: Motion estimator running - frame time: {frame_time}"
             )
 
-            frame_id = f"{camera}{frame_time}"
-            yuv_frame = self.frame_manager.get(
-                frame_id, self.camera_config.frame_shape_yuv
+            yuv_frame = self.frame_manager.get_frame(
+                camera, frame_time, self.camera_config.frame_shape_yuv
             )
 
             frame = cv2.cvtColor(yuv_frame, cv2.COLOR_YUV2GRAY_I420)
@@ -134,7 +133,7 @@ class PtzMotionEstimator:
             except Exception:
                 pass
 
-            self.frame_manager.close(frame_id)
+            self.frame_manager.close_frame(camera, frame_time)
 
         return self.coord_transformations
 
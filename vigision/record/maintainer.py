@@ -17,6 +17,7 @@ import numpy as np
 import psutil
 
 from vigision.comms.config_updater import ConfigSubscriber
+from vigision.comms.detection_payloads import count_active_objects
 from vigision.comms.detections_updater import DetectionSubscriber, DetectionTypeEnum
 from vigision.comms.inter_process import InterProcessRequestor
 from vigision.config import VigisionConfig, RetainModeEnum
@@ -309,13 +310,7 @@ class RecordingMaintainer(threading.Thread):
                 continue
 
             video_frame_count += 1
-            active_count += len(
-                [
-                    o
-                    for o in frame[1]
-                    if not o["false_positive"] and o["motionless_count"] == 0
-                ]
-            )
+            active_count += count_active_objects(frame[1])
             motion_count += len(frame[2])
             region_count += len(frame[3])
 
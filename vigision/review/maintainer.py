@@ -364,25 +364,23 @@ class ReviewSegmentMaintainer(threading.Thread):
 
             if should_update:
                 try:
-                    frame_id = f"{camera_config.name}{frame_time}"
-                    yuv_frame = self.frame_manager.get(
-                        frame_id, camera_config.frame_shape_yuv
+                    yuv_frame = self.frame_manager.get_frame(
+                        camera_config.name, frame_time, camera_config.frame_shape_yuv
                     )
                     self.update_segment(
                         segment, camera_config, yuv_frame, active_objects, prev_data, fall_update
                     )
-                    self.frame_manager.close(frame_id)
+                    self.frame_manager.close_frame(camera_config.name, frame_time)
                 except FileNotFoundError:
                     return
         else:
             if not segment.has_frame:
                 try:
-                    frame_id = f"{camera_config.name}{frame_time}"
-                    yuv_frame = self.frame_manager.get(
-                        frame_id, camera_config.frame_shape_yuv
+                    yuv_frame = self.frame_manager.get_frame(
+                        camera_config.name, frame_time, camera_config.frame_shape_yuv
                     )
                     segment.save_full_frame(camera_config, yuv_frame)
-                    self.frame_manager.close(frame_id)
+                    self.frame_manager.close_frame(camera_config.name, frame_time)
                     self.update_segment(segment, camera_config, None, [], prev_data)
                 except FileNotFoundError:
                     return
@@ -487,14 +485,13 @@ class ReviewSegmentMaintainer(threading.Thread):
                 )
 
                 try:
-                    frame_id = f"{camera_config.name}{frame_time}"
-                    yuv_frame = self.frame_manager.get(
-                        frame_id, camera_config.frame_shape_yuv
+                    yuv_frame = self.frame_manager.get_frame(
+                        camera_config.name, frame_time, camera_config.frame_shape_yuv
                     )
                     self.active_review_segments[camera].update_frame(
                         camera_config, yuv_frame, active_objects, 
                     )
-                    self.frame_manager.close(frame_id)
+                    self.frame_manager.close_frame(camera_config.name, frame_time)
                     self.new_segment(self.active_review_segments[camera], fall_update)
                 except FileNotFoundError:
                     return
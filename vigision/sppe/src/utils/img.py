@@ -499,36 +499,87 @@ def processPeaks(candidate_points, hm, pt1, pt2, inpH, inpW, resH, resW):
     return res_pts
 
 
-def crop_dets(img, boxes, height, width):
-    img = im_to_torch(img)
-    img_h = img.size(1)
-    img_w = img.size(2)
-    img[0].add_(-0.406)
-    img[1].add_(-0.457)
-    img[2].add_(-0.480)
-
-    inps = torch.zeros(len(boxes), 3, height, width)
-    pt1 = torch.zeros(len(boxes), 2)
-    pt2 = torch.zeros(len(boxes), 2)
-    for i, box in enumerate(boxes):
-        upLeft = torch.Tensor((float(box[0]), float(box[1])))
-        bottomRight = torch.Tensor((float(box[2]), float(box[3])))
-
-        h = bottomRight[1] - upLeft[1]
-        w = bottomRight[0] - upLeft[0]
-        if w > 100:
-            scaleRate = 0.2
-        else:
-            scaleRate = 0.3
+# mean subtracted from each channel of the normalized crops
+CROP_MEAN = np.array([0.406, 0.457, 0.480], dtype=np.float32)
+
+
+def crop_dets(img, boxes, height, width, out=None):
+    """Crop and resize the boxes of a uint8 image for the pose model.
+
+    Only the area around each box is warped and normalized, so the cost
+    scales with the number of boxes instead of the image size.
+    img:    uint8 image (h, w, 3)
+    boxes:  (n, 4) x1, y1, x2, y2
+    out:    optional preallocated float32 array (>= n, 3, height, width)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    img_h, img_w = img.shape[:2]
+    n = len(boxes)
+
+    if out is None:
+        out = np.zeros((n, 3, height, width), dtype=np.float32)
+
+    upLeft = boxes[:, :2].copy()
+    bottomRight = boxes[:, 2:].copy()
+    w = bottomRight[:, 0] - upLeft[:, 0]
+    h = bottomRight[:, 1] - upLeft[:, 1]
+    scaleRate = np.where(w > 100, 0.2, 0.3).astype(np.float32)
+
+    upLeft[:, 0] = np.maximum(0, upLeft[:, 0] - w * scaleRate / 2)
+    upLeft[:, 1] = np.maximum(0, upLeft[:, 1] - h * scaleRate / 2)
+    bottomRight[:, 0] = np.maximum(
+        np.minimum(img_w - 1, bottomRight[:, 0] + w * scaleRate / 2), upLeft[:, 0] + 5)
+    bottomRight[:, 1] = np.maximum(
+        np.minimum(img_h - 1, bottomRight[:, 1] + h * scaleRate / 2), upLeft[:, 1] + 5)
+
+    # pixels outside the crop box are the channel mean, which normalizes to 0
+    border = tuple(float(v) for v in CROP_MEAN * 255)
+    crops = np.empty((n, height, width, 3), dtype=np.uint8)
+    for i in range(n):
+        trans = get_crop_transform(upLeft[i], bottomRight[i], height, width)
+        ul = upLeft[i].astype(int)
+        br = (bottomRight[i] - 1).astype(int)
+
+        # warp only the crop box, shifting the transform to its origin
+        roi = img[ul[1]:br[1] + 1, ul[0]:br[0] + 1]
+
+        if roi.size == 0:
+            crops[i] = border
+            continue
+
+        trans[:, 2] += trans[:, :2] @ ul.astype(np.float64)
+        cv2.warpAffine(roi, trans, (width, height), dst=crops[i],
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT,
+                       borderValue=border)
+
+    inps = out[:n]
+    np.multiply(crops.transpose(0, 3, 1, 2), np.float32(1 / 255), out=inps)
+    inps -= CROP_MEAN[None, :, None, None]
+
+    return torch.from_numpy(inps), torch.from_numpy(upLeft), torch.from_numpy(bottomRight)
+
+
+def get_crop_transform(upLeft, bottomRight, resH, resW):
+    """Affine transform used by cropBox to map the box to a resH x resW crop."""
+    ul = upLeft.astype(int)
+    br = (bottomRight - 1).astype(int)
+    lenH = max(br[1] - ul[1], (br[0] - ul[0]) * resH / resW)
+    lenW = lenH * resW / resH
 
-        upLeft[0] = max(0, upLeft[0] - w * scaleRate / 2)
-        upLeft[1] = max(0, upLeft[1] - h * scaleRate / 2)
-        bottomRight[0] = max(min(img_w - 1, bottomRight[0] + w * scaleRate / 2), upLeft[0] + 5)
-        bottomRight[1] = max(min(img_h - 1, bottomRight[1] + h * scaleRate / 2), upLeft[1] + 5)
+    box_shape = [br[1] - ul[1], br[0] - ul[0]]
+    pad_size = [(lenH - box_shape[0]) // 2, (lenW - box_shape[1]) // 2]
+
+    src = np.zeros((3, 2), dtype=np.float32)
+    dst = np.zeros((3, 2), dtype=np.float32)
 
-        inps[i] = cropBox(img.clone(), upLeft, bottomRight, height, width)
-        pt1[i] = upLeft
-        pt2[i] = bottomRight
+    src[0, :] = np.array(
+        [ul[0] - pad_size[1], ul[1] - pad_size[0]], np.float32)
+    src[1, :] = np.array(
+        [br[0] + pad_size[1], br[1] + pad_size[0]], np.float32)
+    dst[0, :] = 0
+    dst[1, :] = np.array([resW - 1, resH - 1], np.float32)
 
-    return inps, pt1, pt2
+    src[2:, :] = get_3rd_point(src[0, :], src[1, :])
+    dst[2:, :] = get_3rd_point(dst[0, :], dst[1, :])
 
+    return cv2.getAffineTransform(np.float32(src), np.float32(dst))
@@ -13,6 +13,7 @@ from requests.exceptions import RequestException
 from vigision.config import VigisionConfig
 from vigision.const import CACHE_DIR, CLIPS_DIR, RECORD_DIR
 from vigision.object_detection import ObjectDetectProcess
+from vigision.pose_estimation import PoseEstimateProcess
 from vigision.types import CameraMetricsTypes, StatsTrackingTypes
 from vigision.util.services import (
     get_amd_gpu_stats,
@@ -44,11 +45,13 @@ def stats_init(
     config: VigisionConfig,
     camera_metrics: dict[str, CameraMetricsTypes],
     detectors: dict[str, ObjectDetectProcess],
+    pose_estimators: dict[str, PoseEstimateProcess],
     processes: dict[str, int],
 ) -> StatsTrackingTypes:
     stats_tracking: StatsTrackingTypes = {
         "camera_metrics": camera_metrics,
         "detectors": detectors,
+        "pose_estimators": pose_estimators,
         "started": int(time.time()),
         "latest_vigision_version": get_latest_version(config),
         "last_updated": int(time.time()),
@@ -253,7 +256,13 @@ def stats_snapshot(
             "camera_fps": round(camera_stats["camera_fps"].value, 2),
             "process_fps": round(camera_stats["process_fps"].value, 2),
             "skipped_fps": round(camera_stats["skipped_fps"].value, 2),
+            "short_reads": camera_stats["short_reads"].value,
+            "corrupt_reads": camera_stats["corrupt_reads"].value,
             "detection_fps": round(camera_stats["detection_fps"].value, 2),
+            "detect_rate": round(camera_stats["detect_rate"].value, 2),
+            "detection_dropped": camera_stats["detection_dropped"].value,
+            "mosaic_fill": round(camera_stats["mosaic_fill"].value, 2),
+            "fall_filtered": round(camera_stats["fall_filtered"].value, 2),
             "detection_enabled": config.cameras[name].detect.enabled,
             "pid": pid,
             "capture_pid": cpid,
@@ -272,6 +281,20 @@ def stats_snapshot(
             "detection_start": detector.detection_start.value,  # type: ignore[attr-defined]
             # issue https://github.com/python/typeshed/issues/8799
             # from mypy 0.981 onwards
+            "batch_size": round(detector.avg_batch_size.value, 2),  # type: ignore[attr-defined]
+            "queue_wait": round(detector.avg_queue_wait.value * 1000, 2),  # type: ignore[attr-defined]
+            "pid": pid,
+        }
+
+    stats["pose_estimators"] = {}
+    for name, pose_estimator in stats_tracking["pose_estimators"].items():
+        pid = (
+            pose_estimator.pose_process.pid if pose_estimator.pose_process else None
+        )
+        stats["pose_estimators"][name] = {
+            "inference_speed": round(pose_estimator.avg_inference_speed.value * 1000, 2),  # type: ignore[attr-defined]
+            "estimation_start": pose_estimator.estimation_start.value,  # type: ignore[attr-defined]
+            "batch_size": round(pose_estimator.avg_batch_size.value, 2),  # type: ignore[attr-defined]
             "pid": pid,
         }
     stats["detection_fps"] = round(total_detection_fps, 2)
@@ -0,0 +1,96 @@
+import unittest
+
+import cv2
+import numpy as np
+import torch
+
+from vigision.sppe.src.utils.img import cropBox, crop_dets, im_to_torch
+from vigision.util.image import YuvFrameView
+
+
+def reference_crop_dets(img, boxes, height, width):
+    """Full frame implementation crop_dets has to match."""
+    img = im_to_torch(img)
+    img_h = img.size(1)
+    img_w = img.size(2)
+    img[0].add_(-0.406)
+    img[1].add_(-0.457)
+    img[2].add_(-0.480)
+
+    inps = torch.zeros(len(boxes), 3, height, width)
+    pt1 = torch.zeros(len(boxes), 2)
+    pt2 = torch.zeros(len(boxes), 2)
+    for i, box in enumerate(boxes):
+        upLeft = torch.Tensor((float(box[0]), float(box[1])))
+        bottomRight = torch.Tensor((float(box[2]), float(box[3])))
+
+        h = bottomRight[1] - upLeft[1]
+        w = bottomRight[0] - upLeft[0]
+        scaleRate = 0.2 if w > 100 else 0.3
+
+        upLeft[0] = max(0, upLeft[0] - w * scaleRate / 2)
+        upLeft[1] = max(0, upLeft[1] - h * scaleRate / 2)
+        bottomRight[0] = max(
+            min(img_w - 1, bottomRight[0] + w * scaleRate / 2), upLeft[0] + 5
+        )
+        bottomRight[1] = max(
+            min(img_h - 1, bottomRight[1] + h * scaleRate / 2), upLeft[1] + 5
+        )
+
+        inps[i] = cropBox(img.clone(), upLeft, bottomRight, height, width)
+        pt1[i] = upLeft
+        pt2[i] = bottomRight
+
+    return inps, pt1, pt2
+
+
+class TestCropDets(unittest.TestCase):
+    def setUp(self):
+        self.img = np.random.default_rng(0).integers(
+            0, 255, (360, 640, 3), dtype=np.uint8
+        )
+        self.boxes = torch.tensor(
+            [
+                [10, 10, 110, 310],
+                [300, 100, 450, 340],
+                # at the edge of the frame
+                [600, 300, 639, 359],
+                [0, 0, 30, 25],
+            ],
+            dtype=torch.float32,
+        )
+
+    def test_crops_match_full_frame_crop(self):
+        inps, pt1, pt2 = crop_dets(self.img, self.boxes, 320, 256)
+        ref_inps, ref_pt1, ref_pt2 = reference_crop_dets(
+            self.img, self.boxes, 320, 256
+        )
+
+        np.testing.assert_array_equal(pt1.numpy(), ref_pt1.numpy())
+        np.testing.assert_array_equal(pt2.numpy(), ref_pt2.numpy())
+        # crops are warped as uint8, so allow for rounding
+        np.testing.assert_allclose(inps.numpy(), ref_inps.numpy(), atol=1 / 255)
+
+    def test_crops_written_to_preallocated_buffer(self):
+        out = np.zeros((6, 3, 320, 256), np.float32)
+
+        inps, _, _ = crop_dets(self.img, self.boxes, 320, 256, out=out)
+
+        assert inps.shape == (4, 3, 320, 256)
+        assert np.shares_memory(inps.numpy(), out)
+        assert not out[4:].any()
+
+    def test_crops_from_yuv_frame_view(self):
+        yuv_frame = cv2.cvtColor(self.img, cv2.COLOR_BGR2YUV_I420)
+        view = YuvFrameView(yuv_frame)
+
+        inps, pt1, pt2 = crop_dets(view, self.boxes, 320, 256)
+        ref_inps, ref_pt1, ref_pt2 = crop_dets(
+            cv2.cvtColor(yuv_frame, cv2.COLOR_YUV2BGR_I420), self.boxes, 320, 256
+        )
+
+        np.testing.assert_array_equal(pt1.numpy(), ref_pt1.numpy())
+        np.testing.assert_array_equal(pt2.numpy(), ref_pt2.numpy())
+        np.testing.assert_array_equal(inps.numpy(), ref_inps.numpy())
+        # only the crops were converted
+        assert view._bgr is None
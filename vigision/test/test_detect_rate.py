@@ -0,0 +1,123 @@
+import multiprocessing as mp
+import unittest
+
+from vigision.config import DetectRateConfig, VigisionConfig
+from vigision.detect_rate import (
+    DetectRateController,
+    allocate_detect_rates,
+    next_detect_budget,
+)
+
+
+class TestAllocateDetectRates(unittest.TestCase):
+    def test_full_rates_when_budget_allows(self):
+        rates = allocate_detect_rates({"a": 5.0, "b": 10.0}, set(), 15.0, 1.0)
+
+        assert rates == {"a": 5.0, "b": 10.0}
+
+    def test_active_cameras_keep_full_rate(self):
+        rates = allocate_detect_rates(
+            {"a": 10.0, "b": 10.0, "c": 10.0}, {"b"}, 16.0, 1.0
+        )
+
+        assert rates == {"a": 3.0, "b": 10.0, "c": 3.0}
+
+    def test_idle_cameras_keep_min_rate(self):
+        rates = allocate_detect_rates({"a": 10.0, "b": 10.0}, {"a", "b"}, 5.0, 1.0)
+        assert rates == {"a": 10.0, "b": 10.0}
+
+        rates = allocate_detect_rates({"a": 10.0, "b": 10.0}, {"a"}, 5.0, 1.0)
+        assert rates == {"a": 10.0, "b": 1.0}
+
+    def test_share_of_slow_cameras_goes_to_the_others(self):
+        rates = allocate_detect_rates(
+            {"a": 2.0, "b": 10.0, "c": 10.0}, set(), 14.0, 1.0
+        )
+
+        assert rates == {"a": 2.0, "b": 6.0, "c": 6.0}
+
+
+class TestNextDetectBudget(unittest.TestCase):
+    def setUp(self):
+        self.config = DetectRateConfig()
+
+    def test_back_off_below_achieved_rate(self):
+        assert next_detect_budget(self.config, 20.0, 20.0, 15.0, True) == 12.0
+        # never raised while overloaded
+        assert next_detect_budget(self.config, 10.0, 20.0, 15.0, True) == 10.0
+
+    def test_recover_to_full_rate(self):
+        assert next_detect_budget(self.config, 12.0, 20.0, 12.0, False) == 14.0
+        assert next_detect_budget(self.config, 19.0, 20.0, 12.0, False) == 20.0
+
+
+class FakeQueue:
+    def __init__(self, size: int):
+        self.size = size
+
+    def qsize(self):
+        return self.size
+
+
+class TestDetectRateController(unittest.TestCase):
+    def setUp(self):
+        config = {
+            "mqtt": {"host": "mqtt"},
+            "cameras": {
+                name: {
+                    "ffmpeg": {
+                        "inputs": [
+                            {"path": f"rtsp://10.0.0.1:554/{name}", "roles": ["detect"]}
+                        ]
+                    },
+                    "detect": {"height": 1080, "width": 1920, "fps": 10},
+                }
+                for name in ["front", "back"]
+            },
+        }
+        self.config = VigisionConfig(**config).runtime_config()
+        self.camera_metrics = {
+            name: {
+                "camera_fps": mp.Value("d", 10.0),
+                "process_fps": mp.Value("d", 10.0),
+                "detection_fps": mp.Value("d", 10.0),
+                "detect_rate": mp.Value("d", 10.0),
+                "detect_priority": mp.Value("i", 0),
+            }
+            for name in ["front", "back"]
+        }
+        self.queue = FakeQueue(0)
+        self.controller = DetectRateController(
+            self.config, self.camera_metrics, {}, self.queue, mp.Event()
+        )
+
+    def rates(self):
+        return {
+            name: round(metrics["detect_rate"].value, 2)
+            for name, metrics in self.camera_metrics.items()
+        }
+
+    def test_idle_camera_throttled_when_queue_backs_up(self):
+        self.camera_metrics["front"]["detect_priority"].value = 1
+        self.queue.size = 10
+
+        self.controller.update()
+
+        assert self.rates() == {"front": 10.0, "back": 6.0}
+
+    def test_camera_falling_behind_is_overload(self):
+        self.camera_metrics["back"]["process_fps"].value = 6.0
+
+        self.controller.update()
+
+        assert self.rates() == {"front": 8.0, "back": 8.0}
+
+    def test_rates_recover_without_load(self):
+        self.queue.size = 10
+        self.controller.update()
+        self.queue.size = 0
+
+        for _ in range(5):
+            self.controller.update()
+
+        assert self.rates() == {"front": 10.0, "back": 10.0}
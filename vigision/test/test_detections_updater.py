@@ -0,0 +1,232 @@
+import json
+import unittest
+
+from vigision.comms.detection_payloads import (
+    VideoDetections,
+    count_active_objects,
+    decode_audio_detections,
+    decode_video_detections,
+    encode_audio_detections,
+    encode_video_detections,
+)
+from vigision.comms.detections_updater import (
+    DETECTION_KEYFRAME_INTERVAL,
+    DetectionDeltaDecoder,
+    DetectionDeltaEncoder,
+)
+
+
+def tracked_object(id, x, frame_time, zones=None):
+    return {
+        "id": id,
+        "label": "person",
+        "frame_time": frame_time,
+        "box": (x, 10, x + 50, 110),
+        "stationary": False,
+        "current_zones": zones or [],
+        "fall_data": None,
+    }
+
+
+def frame(frame_time, objects):
+    return ("front", frame_time, objects, [(0, 0, 10, 10)], [(0, 0, 320, 320)])
+
+
+def over_the_wire(data):
+    return json.loads(json.dumps(data))
+
+
+class TestDetectionDelta(unittest.TestCase):
+    def setUp(self):
+        self.encoder = DetectionDeltaEncoder(keyframe_interval=3)
+        self.decoder = DetectionDeltaDecoder()
+
+    def send(self, payload):
+        return self.decoder.decode(over_the_wire(self.encoder.encode(payload)))
+
+    def test_decoded_state_matches_published_state(self):
+        zones = []
+        frames = [
+            frame(1.0, [tracked_object("a", 0, 1.0)]),
+            frame(2.0, [tracked_object("a", 5, 2.0), tracked_object("b", 200, 2.0)]),
+            frame(3.0, [tracked_object("b", 200, 2.0, zones)]),
+            frame(4.0, [tracked_object("b", 210, 4.0, zones)]),
+        ]
+
+        for payload in frames:
+            # zones changed in place between frames are still sent
+            zones.append("door")
+            assert list(self.send(payload)) == over_the_wire(payload)
+
+    def test_delta_only_has_changed_fields(self):
+        self.encoder.encode(frame(1.0, [tracked_object("a", 0, 1.0)]))
+
+        message = self.encoder.encode(
+            frame(2.0, [tracked_object("a", 0, 2.0), tracked_object("b", 100, 2.0)])
+        )
+
+        assert not message["keyframe"]
+        assert message["objects"]["a"] == {"frame_time": 2.0}
+        assert message["objects"]["b"] == tracked_object("b", 100, 2.0)
+
+        message = self.encoder.encode(frame(3.0, [tracked_object("b", 100, 2.0)]))
+
+        assert message["objects"] == {}
+        assert message["removed"] == ["a"]
+
+    def test_late_subscriber_synced_by_keyframe(self):
+        self.encoder.encode(frame(1.0, [tracked_object("a", 0, 1.0)]))
+
+        _, _, objects, _, _ = self.send(
+            frame(2.0, [tracked_object("a", 5, 2.0), tracked_object("b", 100, 2.0)])
+        )
+        # only the new object is known without the keyframe
+        assert [o["id"] for o in objects] == ["b"]
+
+        self.send(frame(3.0, [tracked_object("a", 5, 3.0)]))
+        _, _, objects, _, _ = self.send(frame(4.0, [tracked_object("a", 5, 4.0)]))
+
+        assert objects == over_the_wire([tracked_object("a", 5, 4.0)])
+
+    def test_missed_delta_keeps_stale_state_until_keyframe(self):
+        self.send(
+            frame(1.0, [tracked_object("a", 0, 1.0), tracked_object("b", 9, 1.0)])
+        )
+        # dropped on the way, a moved and b is gone
+        self.encoder.encode(frame(2.0, [tracked_object("a", 5, 2.0)]))
+
+        _, _, objects, _, _ = self.send(
+            frame(3.0, [tracked_object("a", 5, 3.0), tracked_object("c", 100, 3.0)])
+        )
+
+        # a keeps its old box, b stays until the keyframe
+        assert objects == over_the_wire(
+            [
+                {**tracked_object("a", 0, 3.0), "stale": True},
+                {**tracked_object("b", 9, 1.0), "stale": True},
+                tracked_object("c", 100, 3.0),
+            ]
+        )
+
+        _, _, objects, _, _ = self.send(
+            frame(4.0, [tracked_object("a", 5, 4.0), tracked_object("c", 110, 4.0)])
+        )
+
+        assert objects == over_the_wire(
+            [tracked_object("a", 5, 4.0), tracked_object("c", 110, 4.0)]
+        )
+
+    def test_single_gap_keeps_stationary_objects(self):
+        self.encoder = DetectionDeltaEncoder()
+        stationary = [tracked_object("a", 0, 1.0), tracked_object("b", 9, 1.0)]
+        self.send(frame(1.0, stationary))
+        # dropped on the way
+        self.encoder.encode(frame(1.0, stationary))
+
+        for _ in range(DETECTION_KEYFRAME_INTERVAL - 2):
+            _, _, objects, _, _ = self.send(frame(1.0, stationary))
+
+            assert objects == [{**o, "stale": True} for o in over_the_wire(stationary)]
+
+        _, _, objects, _, _ = self.send(frame(1.0, stationary))
+
+        assert objects == over_the_wire(stationary)
+
+
+def full_object(id, x, frame_time, fall_data=None):
+    return {
+        "id": id,
+        "camera": "front",
+        "frame_time": frame_time,
+        "snapshot": None,
+        "label": "person",
+        "sub_label": None,
+        "top_score": 0.85,
+        "false_positive": False,
+        "start_time": 1.0,
+        "end_time": None,
+        "score": 0.8125,
+        "box": (x, 10, x + 50, 110),
+        "area": 5000,
+        "ratio": 0.5,
+        "region": (0, 0, 320, 320),
+        "stationary": False,
+        "motionless_count": 0,
+        "position_changes": 1,
+        "current_zones": ["door"],
+        "entered_zones": ["door"],
+        "has_clip": True,
+        "has_snapshot": False,
+        "estimated_box": (x, 10, x + 50, 110),
+        "attributes": {},
+        "current_attributes": [],
+        "fall_data": fall_data,
+    }
+
+
+class TestBinaryDetections(unittest.TestCase):
+    def setUp(self):
+        self.encoder = DetectionDeltaEncoder(keyframe_interval=3)
+        self.decoder = DetectionDeltaDecoder()
+
+    def send(self, payload):
+        return decode_video_detections(
+            self.decoder, encode_video_detections(self.encoder, payload)
+        )
+
+    def test_video_objects_rebuilt_from_columns(self):
+        fall_data = {
+            "label": "fall",
+            "score": 0.75,
+            "box": (0, 10, 50, 110),
+            "pose": [[1.5, 2.5, 0.5]] * 13,
+        }
+        frames = [
+            frame(1.0, [full_object("a", 0, 1.0, fall_data)]),
+            frame(2.0, [full_object("a", 5, 2.0), full_object("b", 200, 2.0)]),
+            frame(3.0, []),
+        ]
+
+        for payload in frames:
+            camera, frame_time, objects, motion_boxes, regions = self.send(payload)
+
+            assert isinstance(objects, VideoDetections)
+            assert [camera, frame_time, list(objects), motion_boxes, regions] == (
+                over_the_wire(payload)
+            )
+
+    def test_columns_read_without_objects(self):
+        stationary = {**full_object("b", 200, 2.0), "motionless_count": 5}
+        _, _, objects, _, _ = self.send(
+            frame(2.0, [full_object("a", 5, 2.0), stationary])
+        )
+
+        assert objects.labels == ["person", "person"]
+        assert objects.boxes.tolist() == [[5, 10, 55, 110], [200, 10, 250, 110]]
+        assert count_active_objects(objects) == 1
+        assert objects.objects is None
+        assert count_active_objects(list(objects)) == 1
+
+    def test_columns_of_objects_with_missed_changes_are_current(self):
+        self.send(frame(1.0, [full_object("a", 0, 1.0)]))
+        encode_video_detections(self.encoder, frame(2.0, [full_object("a", 5, 2.0)]))
+
+        _, _, objects, _, _ = self.send(
+            frame(3.0, [full_object("a", 5, 3.0), full_object("b", 200, 3.0)])
+        )
+
+        # the columns of a are current, its other fields may have missed changes
+        assert objects.ids == ["a", "b"]
+        assert list(objects) == [
+            {**over_the_wire(full_object("a", 5, 3.0)), "stale": True},
+            *over_the_wire([full_object("b", 200, 3.0)]),
+        ]
+
+    def test_audio_labels_interned(self):
+        payload = ("front", 1.0, -30.5, ["speech", "bark", "speech"])
+
+        assert decode_audio_detections(encode_audio_detections(payload)) == payload
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
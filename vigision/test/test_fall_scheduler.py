@@ -0,0 +1,189 @@
+import unittest
+
+import numpy as np
+
+from vigision.config import (
+    FallDetectConfig,
+    FallPrefilterConfig,
+    StationaryPoseConfig,
+)
+from vigision.fall_scheduler import (
+    FALL_CLASS,
+    NON_FALL_CLASS,
+    FallCandidateFilter,
+    FallScheduler,
+    StationaryPoseCache,
+)
+
+BOX = (100, 100, 200, 400)
+FALL = np.array([0.1, 0.9])
+NON_FALL = np.array([0.9, 0.1])
+STILL = np.zeros((2, 2))
+
+
+def upright_pose(offset=0.0):
+    """Keypoints of a person standing in BOX, hips half way up the box."""
+    key_points = np.zeros((13, 3), np.float32)
+    key_points[:, 0] = 150 + offset
+    key_points[:, 1] = np.linspace(110, 390, 13)
+    key_points[[7, 8], 1] = 250
+    key_points[:, 2] = 0.9
+    return key_points
+
+
+class TestFallScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FallScheduler(
+            FallDetectConfig(stride=3, confirm_windows=2, confirm_history=3)
+        )
+
+    def test_stable_person_is_classified_every_stride(self):
+        due = []
+        for _ in range(7):
+            self.scheduler.update("a", upright_pose(), BOX)
+            due.append(self.scheduler.is_due("a"))
+            if due[-1]:
+                self.scheduler.submitted(["a"])
+
+        assert due == [True, False, False, True, False, False, True]
+
+    def test_fast_keypoints_switch_to_every_pose(self):
+        self.scheduler.update("a", upright_pose(), BOX)
+        self.scheduler.submitted(["a"])
+
+        assert self.scheduler.update("a", upright_pose(40), BOX)
+        assert self.scheduler.is_due("a")
+
+    def test_box_aspect_ratio_change_switches_to_every_pose(self):
+        self.scheduler.update("a", upright_pose(), BOX)
+        self.scheduler.submitted(["a"])
+
+        assert self.scheduler.update("a", upright_pose(), (100, 100, 300, 400))
+        assert self.scheduler.is_due("a")
+
+    def test_low_hips_switch_to_every_pose(self):
+        key_points = upright_pose()
+        key_points[[7, 8], 1] = 380
+
+        assert self.scheduler.update("a", key_points, BOX)
+
+    def test_alert_ends_after_calm_poses(self):
+        self.scheduler.update("a", upright_pose(), BOX)
+        self.scheduler.update("a", upright_pose(40), BOX)
+
+        due = []
+        for _ in range(4):
+            self.scheduler.submitted(["a"])
+            self.scheduler.update("a", upright_pose(40), BOX)
+            due.append(self.scheduler.is_due("a"))
+
+        assert due == [True, True, False, False]
+
+    def test_fall_needs_m_of_n_positive_windows(self):
+        labels = []
+        for scores in (NON_FALL, FALL, NON_FALL, FALL, NON_FALL, NON_FALL, NON_FALL):
+            self.scheduler.add_prediction("a", scores)
+            labels.append(self.scheduler.label("a"))
+
+        assert labels == [NON_FALL_CLASS] * 3 + [FALL_CLASS] * 3 + [NON_FALL_CLASS]
+
+    def test_retain_forgets_removed_tracks(self):
+        self.scheduler.add_prediction("a", FALL)
+        self.scheduler.add_prediction("b", FALL)
+        self.scheduler.retain({"b"})
+
+        assert self.scheduler.label("a") is None
+        assert self.scheduler.label("b") == NON_FALL_CLASS
+
+
+class TestFallCandidateFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = FallCandidateFilter(
+            FallPrefilterConfig(hold_frames=2, keep_warm_interval=3)
+        )
+
+    def test_wide_boxes_are_candidates(self):
+        assert not self.filter.is_candidate("a", BOX, STILL)
+        assert self.filter.is_candidate("b", (100, 300, 400, 400), STILL)
+
+    def test_falling_box_is_candidate_for_hold_frames(self):
+        falling = np.array([[0, 30], [0, 0]])
+
+        candidates = [
+            self.filter.is_candidate("a", BOX, velocity)
+            for velocity in (falling, STILL, STILL, STILL)
+        ]
+
+        assert candidates == [True, True, True, False]
+
+    def test_select_keeps_non_candidates_warm(self):
+        selected = []
+        filtered = []
+        for _ in range(4):
+            persons, count, _ = self.filter.select(
+                [
+                    ("a", BOX, 0.9, self.filter.is_candidate("a", BOX, STILL)),
+                    ("b", BOX, 0.9, True),
+                ]
+            )
+            selected.append([id for id, _, _ in persons])
+            filtered.append(count)
+
+        assert selected == [["a", "b"], ["b"], ["b"], ["a", "b"]]
+        assert filtered == [0, 1, 1, 0]
+
+    def test_disabled_filter_selects_everyone(self):
+        self.filter = FallCandidateFilter(FallPrefilterConfig(enabled=False))
+        self.filter.is_candidate("a", BOX, STILL)
+
+        persons, count, _ = self.filter.select([("a", BOX, 0.9, False)])
+
+        assert len(persons) == 1 and count == 0
+
+    def test_sparse_history_restarted_once_a_candidate(self):
+        restarted = [
+            self.filter.select([("a", BOX, 0.9, candidate)])[2]
+            for candidate in (False, False, True, True, False, True)
+        ]
+
+        # the first pose and a candidate right after it are consecutive
+        assert restarted == [[], [], ["a"], [], [], ["a"]]
+
+    def test_sparse_ids_only_while_history_has_keep_warm_poses(self):
+        sparse_ids = []
+        for candidate in (False, False, True):
+            self.filter.select([("a", BOX, 0.9, candidate)])
+            sparse_ids.append(self.filter.sparse_ids())
+
+        assert sparse_ids == [set(), {"a"}, set()]
+
+
+class TestStationaryPoseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = StationaryPoseCache(StationaryPoseConfig(refresh_interval=2))
+        self.cache.requested([("a", BOX, 0.9)])
+        self.cache.update("a", upright_pose())
+
+    def test_reuses_shifted_pose_of_stationary_person(self):
+        estimate, reused = self.cache.select([("a", (102, 104, 202, 404), 0.9)], {"a"})
+
+        assert estimate == []
+        np.testing.assert_allclose(reused["a"][:, 0], 152)
+        np.testing.assert_allclose(reused["a"][:, 1], upright_pose()[:, 1] + 4)
+
+    def test_moving_persons_are_estimated(self):
+        estimate, reused = self.cache.select([("a", BOX, 0.9)], set())
+
+        assert estimate == [("a", BOX, 0.9)] and reused == {}
+
+    def test_changed_box_is_estimated(self):
+        estimate, _ = self.cache.select([("a", (100, 200, 250, 400), 0.9)], {"a"})
+
+        assert len(estimate) == 1
+
+    def test_pose_is_refreshed_after_interval(self):
+        reused = [
+            "a" in self.cache.select([("a", BOX, 0.9)], {"a"})[1] for _ in range(3)
+        ]
+
+        assert reused == [True, True, False]
@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+
+from vigision.const import FRAME_RING_MAX_AGE
+from vigision.util.image import SharedFrameRing, SharedMemoryFrameManager
+
+
+class TestSharedFrameRing(unittest.TestCase):
+    def setUp(self):
+        self.shape = (6, 4)
+        self.ring = SharedFrameRing("test_ring", 24, 3, create=True)
+        self.capture = SharedMemoryFrameManager()
+        self.consumer = SharedMemoryFrameManager()
+
+    def tearDown(self):
+        for manager in (self.capture, self.consumer):
+            for ring in manager.rings.values():
+                ring.close()
+
+        self.ring.unlink()
+
+    def create(self, frame_time, value):
+        buffer = self.capture.create_frame("test_ring", frame_time, 24)
+        buffer[:] = value
+        return buffer
+
+    def test_frames_are_shared_between_managers(self):
+        self.create(1.0, 7)
+
+        frame = self.consumer.get_frame("test_ring", 1.0, self.shape)
+
+        assert frame.shape == self.shape
+        assert np.all(frame == 7)
+        assert self.ring.refs.tolist() == [2, 0, 0]
+
+    def test_slot_is_reused_once_released(self):
+        self.create(1.0, 1)
+        self.create(2.0, 2)
+        self.create(3.0, 3)
+
+        assert self.capture.create_frame("test_ring", 4.0, 24) is None
+
+        self.consumer.get_frame("test_ring", 1.0, self.shape)
+        self.capture.delete_frame("test_ring", 1.0)
+        # still referenced by the consumer
+        assert self.capture.create_frame("test_ring", 4.0, 24) is None
+
+        self.consumer.close_frame("test_ring", 1.0)
+        self.create(4.0, 4)
+
+        assert self.ring.frame_times.tolist() == [4.0, 2.0, 3.0]
+        with self.assertRaises(FileNotFoundError):
+            self.consumer.get_frame("test_ring", 1.0, self.shape)
+
+    def test_slot_of_oldest_frame_is_reused_first(self):
+        self.create(1.0, 1)
+        self.create(2.0, 2)
+        self.create(3.0, 3)
+        self.capture.delete_frame("test_ring", 2.0)
+        self.capture.delete_frame("test_ring", 1.0)
+
+        self.create(4.0, 4)
+
+        assert self.ring.frame_times.tolist() == [4.0, 2.0, 3.0]
+
+    def test_get_holds_a_single_reference(self):
+        self.create(1.0, 1)
+
+        self.consumer.get_frame("test_ring", 1.0, self.shape)
+        self.consumer.get_frame("test_ring", 1.0, self.shape)
+        assert self.ring.refs[0] == 2
+
+        self.consumer.delete_frame("test_ring", 1.0)
+        assert self.ring.refs[0] == 0
+
+    def test_unreleased_frames_are_reclaimed_once_stale(self):
+        self.create(1.0, 1)
+        self.create(2.0, 2)
+        self.create(3.0, 3)
+        self.consumer.get_frame("test_ring", 1.0, self.shape)
+
+        assert self.capture.create_frame("test_ring", 4.0, 24) is None
+
+        with self.assertLogs("vigision.util.image", "WARNING"):
+            self.create(1.0 + FRAME_RING_MAX_AGE + 1, 4)
+
+        assert self.ring.refs.tolist() == [1, 1, 1]
+        # late releases of the reclaimed frame leave the new frame alone
+        self.consumer.close_frame("test_ring", 1.0)
+        self.capture.delete_frame("test_ring", 1.0)
+        assert self.ring.refs.tolist() == [1, 1, 1]
+
+    def test_stale_ring_is_replaced(self):
+        self.create(1.0, 1)
+        self.capture.rings.pop("test_ring").close()
+        self.ring.close()
+
+        self.ring = SharedFrameRing("test_ring", 48, 2, create=True)
+
+        ring = self.consumer._ring("test_ring")
+        assert (ring.slots, ring.frame_size) == (2, 48)
+        assert ring.refs.tolist() == [0, 0]
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from vigision.track.key_points import KeyPointStore
+
+
+def pose(value):
+    return np.full((13, 3), value, np.float32)
+
+
+class TestKeyPointStore(unittest.TestCase):
+    def setUp(self):
+        self.store = KeyPointStore(length=4, capacity=2)
+        self.store.add("a")
+
+    def test_window_is_ordered_view_of_the_last_poses(self):
+        for i in range(6):
+            self.store.append("a", pose(i))
+
+        window = self.store.window("a")
+        assert self.store.count("a") == 4
+        np.testing.assert_array_equal(window[:, 0, 0], [2, 3, 4, 5])
+        np.testing.assert_array_equal(self.store.last("a"), pose(5))
+        assert np.shares_memory(window, self.store.data)
+
+    def test_partial_window(self):
+        self.store.append("a", pose(1))
+        self.store.append("a", pose(2))
+
+        np.testing.assert_array_equal(self.store["a"][:, 0, 0], [1, 2])
+
+    def test_gather_full_windows(self):
+        self.store.add("b")
+        for i in range(5):
+            self.store.append("a", pose(i))
+            self.store.append("b", pose(10 + i))
+
+        windows = self.store.gather(["b", "a"])
+        np.testing.assert_array_equal(
+            windows[:, :, 0, 0], [[11, 12, 13, 14], [1, 2, 3, 4]]
+        )
+
+    def test_removed_slots_are_reused_empty(self):
+        self.store.append("a", pose(1))
+        self.store.remove("a")
+        self.store.add("b")
+
+        assert "a" not in self.store
+        assert self.store.count("b") == 0
+        assert len(self.store["b"]) == 0
+
+    def test_cleared_track_starts_a_new_history(self):
+        for i in range(5):
+            self.store.append("a", pose(i))
+
+        self.store.clear("a")
+        self.store.append("a", pose(9))
+
+        np.testing.assert_array_equal(self.store["a"][:, 0, 0], [9])
+
+    def test_copy_continues_the_poses_of_another_track(self):
+        self.store.add("b")
+        for i in range(5):
+            self.store.append("a", pose(i))
+
+        self.store.copy("a", "b")
+        self.store.append("b", pose(5))
+
+        np.testing.assert_array_equal(self.store["b"][:, 0, 0], [2, 3, 4, 5])
+        np.testing.assert_array_equal(self.store["a"][:, 0, 0], [1, 2, 3, 4])
+
+    def test_grows_past_capacity(self):
+        for id in "bcde":
+            self.store.add(id)
+            self.store.append(id, pose(ord(id)))
+
+        assert len(self.store) == 5
+        assert len(self.store.data) == 8
+        np.testing.assert_array_equal(self.store.last("e"), pose(ord("e")))
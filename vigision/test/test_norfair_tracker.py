@@ -0,0 +1,223 @@
+import multiprocessing as mp
+import unittest
+
+import numpy as np
+from norfair import Detection, OptimizedKalmanFilterFactory, Tracker
+from norfair.distances import ScalarDistance, VectorizedDistance
+
+from vigision.config import VigisionConfig
+from vigision.track.norfair_tracker import (
+    NorfairTracker,
+    distance,
+    distance_matrix,
+    vigision_distance,
+)
+
+
+def create_scene(objects: int, frames: int, seed: int = 0) -> list[list[Detection]]:
+    """Detections of objects moving through a 1920x1080 frame."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.uniform(20, 200, (objects, 2))
+    starts = rng.uniform(0, 1700, (objects, 2))
+    velocities = rng.uniform(-8, 8, (objects, 2))
+    labels = rng.choice(["person", "car"], objects)
+
+    scene = []
+    for frame in range(frames):
+        detections = []
+        for i in range(objects):
+            # some objects are missed now and then
+            if rng.random() < 0.1:
+                continue
+
+            top_left = starts[i] + velocities[i] * frame + rng.normal(0, 2, 2)
+            bottom_right = top_left + sizes[i] * rng.uniform(0.95, 1.05, 2)
+            detections.append(
+                Detection(
+                    points=np.array([top_left, bottom_right]).astype(int),
+                    label=labels[i],
+                )
+            )
+        scene.append(detections)
+    return scene
+
+
+def track_scene(scene: list[list[Detection]], distance_function) -> list[list]:
+    """Ids of the objects the tracker matched on each frame."""
+    tracker = Tracker(
+        distance_function="euclidean",
+        distance_threshold=2.5,
+        initialization_delay=2,
+        hit_counter_max=5,
+        filter_factory=OptimizedKalmanFilterFactory(R=3.4),
+    )
+    tracker.distance_function = distance_function
+
+    matches = []
+    for detections in scene:
+        tracked_objects = tracker.update(detections=detections)
+        matches.append(
+            sorted(
+                (o.id, tuple(o.last_detection.points.ravel()))
+                for o in tracked_objects
+                if o.last_detection in detections
+            )
+        )
+    return matches
+
+
+class TestDistanceMatrix(unittest.TestCase):
+    def test_matrix_matches_pairwise_distance(self):
+        rng = np.random.default_rng(1)
+        top_left = rng.uniform(0, 1000, (12, 2))
+        boxes = np.concatenate([top_left, top_left + rng.uniform(10, 300, (12, 2))], 1)
+        detections, estimates = boxes[:7].astype(int), boxes[7:]
+
+        matrix = distance_matrix(detections, estimates)
+
+        assert matrix.shape == (7, 5)
+        for d, detection in enumerate(detections):
+            for e, estimate in enumerate(estimates):
+                assert np.isclose(
+                    matrix[d, e],
+                    distance(detection.reshape(2, 2), estimate.reshape(2, 2)),
+                )
+
+    def test_same_matches_as_scalar_distance(self):
+        for objects in [5, 20]:
+            scene = create_scene(objects, 30)
+
+            assert track_scene(
+                scene, VectorizedDistance(distance_matrix)
+            ) == track_scene(scene, ScalarDistance(vigision_distance))
+
+
+class TestNorfairTrackerBookkeeping(unittest.TestCase):
+    def setUp(self):
+        config = {
+            "mqtt": {"host": "mqtt"},
+            "cameras": {
+                "front": {
+                    "ffmpeg": {
+                        "inputs": [
+                            {"path": "rtsp://10.0.0.1:554/video", "roles": ["detect"]}
+                        ]
+                    },
+                    "detect": {"height": 1080, "width": 1920, "fps": 5},
+                }
+            },
+        }
+        camera_config = VigisionConfig(**config).runtime_config().cameras["front"]
+        self.tracker = NorfairTracker(
+            camera_config, {"ptz_autotracker_enabled": mp.Value("i", 0)}
+        )
+
+    def detection(self, x):
+        box = (x, 100, x + 50, 200)
+        return ("person", 0.8, box, 5000, 0.5, (0, 0, 320, 320))
+
+    def assert_indexes_match(self):
+        tracker = self.tracker
+        assert set(tracker.id_track_map) == set(tracker.tracked_objects)
+        assert set(tracker.track_objects) == set(tracker.track_id_map)
+        for id in tracker.tracked_objects:
+            track = tracker.track_object(id)
+            assert tracker.track_id_map[track.global_id] == id
+            assert track in tracker.tracker.tracked_objects
+
+    def test_objects_indexed_when_registered(self):
+        for frame in range(6):
+            self.tracker.match_and_update(
+                float(frame), [self.detection(100), self.detection(800)]
+            )
+
+        assert len(self.tracker.tracked_objects) == 2
+        self.assert_indexes_match()
+
+    def test_indexes_cleared_when_expired(self):
+        for frame in range(6):
+            self.tracker.match_and_update(
+                float(frame), [self.detection(100), self.detection(800)]
+            )
+
+        for frame in range(6, 40):
+            self.tracker.match_and_update(float(frame), [self.detection(100)])
+
+        assert len(self.tracker.tracked_objects) == 1
+        assert len(self.tracker.positions) == 1
+        assert len(self.tracker.stationary_box_history) == 1
+        self.assert_indexes_match()
+
+
+    def test_new_track_continues_poses_of_lost_track(self):
+        pose = np.ones((13, 3), dtype=np.float32)
+        frame_time = 0.0
+        for _ in range(6):
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [self.detection(100)])
+
+        (lost_id,) = self.tracker.tracked_objects
+        for _ in range(30):
+            self.tracker.update_pose_data(lost_id, pose)
+
+        # hidden until the track is lost
+        while lost_id in self.tracker.tracked_objects:
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [])
+
+        assert lost_id in self.tracker.lost_tracks
+
+        for _ in range(6):
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [self.detection(110)])
+
+        (id,) = self.tracker.tracked_objects
+        assert id != lost_id
+        assert self.tracker.key_points.count(id) == 30
+        assert self.tracker.pose_carry_overs == [(lost_id, id)]
+        assert lost_id not in self.tracker.lost_tracks
+        assert lost_id not in self.tracker.key_points
+
+    def test_person_next_to_lost_track_starts_own_poses(self):
+        frame_time = 0.0
+        for _ in range(6):
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [self.detection(100)])
+
+        (lost_id,) = self.tracker.tracked_objects
+        self.tracker.update_pose_data(lost_id, np.ones((13, 3), dtype=np.float32))
+
+        while lost_id in self.tracker.tracked_objects:
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [])
+
+        # close enough to be matched by distance but hardly overlapping
+        for _ in range(6):
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [self.detection(140)])
+
+        (id,) = self.tracker.tracked_objects
+        assert self.tracker.key_points.count(id) == 0
+        assert self.tracker.pose_carry_overs == []
+        assert lost_id in self.tracker.lost_tracks
+
+    def test_lost_poses_expire(self):
+        self.tracker.match_and_update(0.1, [self.detection(100)])
+        self.tracker.match_and_update(0.2, [self.detection(100)])
+        self.tracker.match_and_update(0.3, [self.detection(100)])
+        (lost_id,) = self.tracker.tracked_objects
+        self.tracker.update_pose_data(lost_id, np.ones((13, 3), dtype=np.float32))
+
+        frame_time = 0.3
+        while lost_id in self.tracker.tracked_objects:
+            frame_time += 0.1
+            self.tracker.match_and_update(frame_time, [])
+
+        self.tracker.match_and_update(frame_time + 3.1, [self.detection(1000)])
+
+        assert self.tracker.lost_tracks == {}
+        assert lost_id not in self.tracker.key_points
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
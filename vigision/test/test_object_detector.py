@@ -1,3 +1,6 @@
+import datetime
+import multiprocessing as mp
+import queue
 import unittest
 from unittest.mock import Mock, patch
 
@@ -136,3 +139,236 @@ class TestLocalObjectDetector(unittest.TestCase):
             == np.zeros((1, 32, 32, 3)).shape
         )
         assert test_result == TEST_DETECT_RESULT
+
+    @patch.dict(
+        "vigision.detectors.api_types",
+        {det_type: Mock() for det_type in DetectorTypeEnum},
+    )
+    def test_detect_raw_batch_given_tensor_inputs_should_call_api_with_transposed_batch(
+        self,
+    ):
+        mock_cputfl = detectors.api_types[DetectorTypeEnum.cpu]
+
+        TEST_DATA = np.zeros((4, 32, 32, 3), np.uint8)
+        TEST_DETECT_RESULT = np.zeros((4, 20, 6), np.float32)
+
+        test_cfg = parse_obj_as(DetectorConfig, {"type": "cpu", "model": {}})
+        test_cfg.model.input_tensor = InputTensorEnum.nchw
+
+        test_obj_detect = vigision.object_detection.LocalObjectDetector(
+            detector_config=test_cfg
+        )
+
+        mock_det_api = mock_cputfl.return_value
+        mock_det_api.detect_raw_batch.return_value = TEST_DETECT_RESULT
+
+        test_result = test_obj_detect.detect_raw_batch(TEST_DATA)
+
+        mock_det_api.detect_raw_batch.assert_called_once()
+        assert (
+            mock_det_api.detect_raw_batch.call_args.kwargs["tensor_inputs"].shape
+            == (4, 3, 32, 32)
+        )
+        assert test_result is TEST_DETECT_RESULT
+
+
+class TestDetectionBatch(unittest.TestCase):
+    def test_get_detection_batch_should_drain_up_to_batch_size(self):
+        detection_queue = queue.Queue()
+        for camera in ["front", "back", "side"]:
+            detection_queue.put((camera, 1.0, 1))
+
+        batch = vigision.object_detection.get_detection_batch(detection_queue, 2, 0)
+
+        assert batch == [("front", 1.0, 1), ("back", 1.0, 1)]
+        assert detection_queue.qsize() == 1
+
+    def test_get_detection_batch_should_keep_newest_request_of_a_camera(self):
+        detection_queue = queue.Queue()
+        for camera, request_time in [("front", 1.0), ("front", 2.0), ("back", 1.0)]:
+            detection_queue.put((camera, request_time, 1))
+
+        batch = vigision.object_detection.get_detection_batch(detection_queue, 4, 0)
+
+        assert batch == [("front", 2.0, 1), ("back", 1.0, 1)]
+
+    def test_get_detection_batch_should_count_regions_toward_batch_size(self):
+        detection_queue = queue.Queue()
+        detection_queue.put(("front", 1.0, 3))
+        detection_queue.put(("back", 1.0, 2))
+
+        batch = vigision.object_detection.get_detection_batch(detection_queue, 3, 0)
+
+        assert batch == [("front", 1.0, 3)]
+        assert detection_queue.qsize() == 1
+
+    def test_get_detection_batch_should_return_empty_on_timeout(self):
+        assert vigision.object_detection.get_detection_batch(queue.Queue(), 4, 0) == []
+
+
+class TestDetectionScheduler(unittest.TestCase):
+    def request(self, camera, regions=1, deadline=None, slot=0):
+        now = datetime.datetime.now().timestamp()
+        return (camera, now, regions, now, deadline or now + 5, slot)
+
+    def test_cameras_served_round_robin(self):
+        scheduler = vigision.object_detection.DetectionScheduler()
+        detection_queue = queue.Queue()
+        for camera, regions in [("front", 1), ("back", 1), ("side", 3)]:
+            detection_queue.put(self.request(camera, regions))
+
+        batch = scheduler.get_batch(detection_queue, 4, 0)
+        assert [r[0] for r in batch] == ["front", "back"]
+
+        # side waited longest, front was served before back
+        for camera in ["back", "front"]:
+            detection_queue.put(self.request(camera))
+
+        batch = scheduler.get_batch(detection_queue, 5, 0)
+        assert [r[0] for r in batch] == ["side", "front", "back"]
+
+    def test_expired_and_superseded_requests_dropped(self):
+        dropped = {"front": mp.Value("i", 0), "back": mp.Value("i", 0)}
+        scheduler = vigision.object_detection.DetectionScheduler(dropped)
+        detection_queue = queue.Queue()
+        detection_queue.put(self.request("front"))
+        detection_queue.put(self.request("front"))
+        detection_queue.put(self.request("back", deadline=1.0))
+
+        batch = scheduler.get_batch(detection_queue, 4, 0)
+
+        assert [r[0] for r in batch] == ["front"]
+        assert dropped["front"].value == 1
+        assert dropped["back"].value == 1
+
+    def test_requests_over_batch_size_stay_pending(self):
+        scheduler = vigision.object_detection.DetectionScheduler()
+        detection_queue = queue.Queue()
+        detection_queue.put(self.request("front", 3))
+        detection_queue.put(self.request("back", 2))
+
+        assert [r[0] for r in scheduler.get_batch(detection_queue, 3, 0)] == ["front"]
+        assert [r[0] for r in scheduler.get_batch(detection_queue, 3, 0)] == ["back"]
+        assert scheduler.get_batch(queue.Queue(), 3, 0) == []
+
+    def test_full_batch_leaves_requests_for_other_detectors(self):
+        scheduler = vigision.object_detection.DetectionScheduler()
+        detection_queue = queue.Queue()
+        for camera in ["front", "back", "side"]:
+            detection_queue.put(self.request(camera, 2))
+
+        batch = scheduler.get_batch(detection_queue, 4, 0)
+
+        assert [r[0] for r in batch] == ["front", "back"]
+        assert scheduler.pending == {}
+        assert detection_queue.qsize() == 1
+
+    def test_requests_of_each_slot_served_in_order(self):
+        scheduler = vigision.object_detection.DetectionScheduler()
+        detection_queue = queue.Queue()
+        detection_queue.put(self.request("front", slot=0))
+        detection_queue.put(self.request("front", slot=1))
+        detection_queue.put(self.request("back", slot=0))
+
+        batch = scheduler.get_batch(detection_queue, 4, 0)
+
+        assert [(r[0], r[5]) for r in batch] == [
+            ("front", 0),
+            ("front", 1),
+            ("back", 0),
+        ]
+
+
+class TestRemoteObjectDetector(unittest.TestCase):
+    def setUp(self):
+        slots = vigision.object_detection.DETECTION_SLOTS
+        self.shm = mp.shared_memory.SharedMemory(
+            name="test_detect", create=True, size=4 * 4 * 3 * 2 * slots
+        )
+        self.out_shm = mp.shared_memory.SharedMemory(
+            name="out-test_detect",
+            create=True,
+            size=vigision.object_detection.detection_output_size(2),
+        )
+        self.events = [mp.Event() for _ in range(slots)]
+        self.detection_queue = queue.Queue()
+        self.detector = vigision.object_detection.RemoteObjectDetector(
+            "test_detect",
+            {0: "person"},
+            self.detection_queue,
+            self.events,
+            Mock(width=4, height=4),
+            mp.Event(),
+            max_regions=2,
+        )
+
+    def tearDown(self):
+        del self.detector
+        self.shm.close()
+        self.out_shm.close()
+        self.shm.unlink()
+        self.out_shm.unlink()
+
+    def tensor(self, value):
+        return np.full((1, 4, 4, 3), value, dtype=np.uint8)
+
+    def test_requests_submitted_to_separate_slots(self):
+        first = self.detector.submit([self.tensor(1)], frame_time=1.0)
+        second = self.detector.submit([self.tensor(2), self.tensor(3)], frame_time=2.0)
+
+        assert (first, second) == (0, 1)
+        # every slot has a request in flight
+        assert self.detector.submit([self.tensor(4)]) is None
+
+        requests = [self.detection_queue.get(False) for _ in range(2)]
+        assert [(r[0], r[2], r[3], r[5]) for r in requests] == [
+            ("test_detect", 1, 1.0, 0),
+            ("test_detect", 2, 2.0, 1),
+        ]
+
+        inputs = np.ndarray((4, 4, 4, 3), dtype=np.uint8, buffer=self.shm.buf)
+        assert [int(inputs[i, 0, 0, 0]) for i in [0, 2, 3]] == [1, 2, 3]
+        del inputs
+
+    def finish(self, slot, request_time):
+        """Write a detection the detector would for a request."""
+        tag, outputs = vigision.object_detection.get_output_arrays(
+            self.out_shm, slot, 1
+        )
+        outputs[0, 0] = [0, 0.9, 0.1, 0.2, 0.3, 0.4]
+        tag[0] = request_time
+        del tag, outputs
+        self.events[slot].set()
+
+    def test_collect_reads_the_output_slot(self):
+        self.detector.submit([self.tensor(1)])
+        slot = self.detector.submit([self.tensor(2)])
+        self.detection_queue.get(False)
+        self.finish(slot, self.detection_queue.get(False)[1])
+
+        detections = self.detector.collect(slot)
+
+        assert len(detections) == 1
+        assert detections[0][0][:2] == ("person", np.float32(0.9).item())
+        # the slot can take a new request once collected
+        assert self.detector.submit([self.tensor(3)]) == slot
+
+    def test_collect_ignores_detections_of_a_timed_out_request(self):
+        self.detector.timeout = 0.0
+        slot = self.detector.submit([self.tensor(1)])
+        timed_out = self.detection_queue.get(False)[1]
+        self.detector.collect(slot)
+
+        self.detector.timeout = 0.2
+        assert self.detector.submit([self.tensor(2)], frame_time=2.0) == 1
+        assert self.detector.submit([self.tensor(3)], frame_time=3.0) == slot
+        self.finish(slot, timed_out)
+
+        assert self.detector.collect(slot) == [[]]
+        assert not self.events[slot].is_set()
+
+    def test_collect_gives_up_at_the_deadline(self):
+        self.detector.timeout = 0.0
+        slot = self.detector.submit([self.tensor(1)])
+
+        assert self.detector.collect(slot) == [[]]
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from vigision.detectors.plugins.onnx_cpu import OnnxCpuDetector
+
+
+class TestOnnxCpuPostProcess(unittest.TestCase):
+    def setUp(self):
+        # skip the onnxruntime session, only the decoding is under test
+        self.detector = OnnxCpuDetector.__new__(OnnxCpuDetector)
+        self.detector.width = 640
+        self.detector.height = 640
+        self.detector.score_threshold = 0.25
+        self.detector.iou_threshold = 0.7
+        self.detector.detections = np.zeros((20, 6), np.float32)
+
+    def create_output(self, boxes):
+        """boxes are (class_id, score, cx, cy, w, h)"""
+        output = np.zeros((84, 8400), np.float32)
+        for i, (class_id, score, cx, cy, w, h) in enumerate(boxes):
+            output[:4, i] = (cx, cy, w, h)
+            output[4 + class_id, i] = score
+        return output
+
+    def test_overlapping_boxes_of_same_class_are_suppressed(self):
+        output = self.create_output(
+            [
+                (0, 0.8, 320, 320, 100, 200),
+                (0, 0.9, 322, 318, 100, 200),
+                (2, 0.6, 320, 320, 100, 200),
+                (0, 0.1, 100, 100, 50, 50),
+            ]
+        )
+
+        detections = self.detector.post_process_yolov8(output)
+
+        assert np.count_nonzero(detections[:, 1]) == 2
+        # sorted by score with the person first
+        assert detections[0][0] == 0
+        assert detections[0][1] == np.float32(0.9)
+        assert detections[1][0] == 2
+        # (y1, x1, y2, x2) relative to the model size
+        np.testing.assert_allclose(
+            detections[1][2:], [220 / 640, 270 / 640, 420 / 640, 370 / 640], rtol=1e-5
+        )
+
+    def test_no_boxes_above_threshold(self):
+        output = self.create_output([(0, 0.1, 320, 320, 100, 200)])
+
+        detections = self.detector.post_process_yolov8(output)
+
+        assert not detections.any()
+
+    def test_at_most_20_detections(self):
+        output = self.create_output(
+            [(0, 0.5 + i / 100, 15 + i * 30, 300, 20, 20) for i in range(30)]
+        )
+
+        detections = self.detector.post_process_yolov8(output)
+
+        assert np.count_nonzero(detections[:, 1]) == 20
+        assert detections[0][1] == np.float32(0.79)
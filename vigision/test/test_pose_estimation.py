@@ -0,0 +1,467 @@
+import multiprocessing as mp
+import queue
+import unittest
+from collections import Counter
+from multiprocessing import shared_memory
+from unittest.mock import MagicMock
+
+import numpy as np
+import torch
+
+from vigision.config import FallPrefilterConfig
+from vigision.fall_detector_loader import TSSTG, FallStreams
+from vigision.fall_scheduler import FallCandidateFilter
+from vigision.networks.oneshot_stgcn_nano import OSA_STGCN_nano_1S
+from vigision.pose_estimate_loader import SPPE_FastPose
+from vigision.pose_estimation import (
+    FALL_SEQUENCE_LENGTH,
+    POSE_KEYPOINTS,
+    PoseInputBuffers,
+    PoseOutputBuffers,
+    RemotePoseEstimator,
+    write_fall_results,
+    write_fall_stream_results,
+    write_pose_results,
+)
+from vigision.track.key_points import KeyPointStore
+
+
+def reference_predict(model, pts, image_size):
+    """Single person fall prediction as it was done before batching."""
+    pts = pts.copy()
+    pts[:, :, 0] /= image_size[0]
+    pts[:, :, 1] /= image_size[1]
+    xy_min = np.nanmin(pts[:, :, :2], axis=1)
+    xy_max = np.nanmax(pts[:, :, :2], axis=1)
+    for i in range(pts.shape[0]):
+        pts[i, :, :2] = (pts[i, :, :2] - xy_min[i]) / (xy_max[i] - xy_min[i]) * 2 - 1
+    neck = np.expand_dims((pts[:, 1, :] + pts[:, 2, :]) / 2, 1)
+    pts = np.concatenate((pts, neck), axis=1)
+
+    pts = torch.tensor(pts, dtype=torch.float32).permute(2, 0, 1)[None, :]
+    return model(pts).detach().numpy()
+
+
+class TestRemotePoseEstimator(unittest.TestCase):
+    def setUp(self):
+        self.max_persons = 4
+        self.in_shm = shared_memory.SharedMemory(
+            name="pose-test_camera",
+            create=True,
+            size=PoseInputBuffers.size(self.max_persons),
+        )
+        self.out_shm = shared_memory.SharedMemory(
+            name="pose-out-test_camera",
+            create=True,
+            size=PoseOutputBuffers.size(self.max_persons),
+        )
+        self.pose_queue = queue.Queue()
+        self.event = mp.Event()
+        self.estimator = RemotePoseEstimator(
+            "test_camera", self.pose_queue, self.event, self.max_persons, mp.Event()
+        )
+        self.frame = np.zeros((720, 1280, 3), np.uint8)
+        self.key_points = KeyPointStore(FALL_SEQUENCE_LENGTH, POSE_KEYPOINTS)
+        self.key_points.add("a")
+        self.key_points.add("b")
+        for i in range(FALL_SEQUENCE_LENGTH):
+            self.key_points.append("b", np.full((13, 3), i, np.float32))
+
+    def tearDown(self):
+        self.estimator.in_shm.close()
+        self.estimator.out_shm.close()
+        self.in_shm.close()
+        self.in_shm.unlink()
+        self.out_shm.close()
+        self.out_shm.unlink()
+
+    def test_submit_puts_full_history_persons_first(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+
+        assert self.pose_queue.get(False)[2:] == (
+            2,
+            1,
+            (1080, 1280),
+            ["b", "a"],
+            [],
+            [],
+        )
+        inputs = PoseInputBuffers(self.in_shm.buf, self.max_persons)
+        np.testing.assert_allclose(inputs.boxes[0], [500, 100, 600, 400, 0.9])
+        np.testing.assert_allclose(inputs.boxes[1], [10, 10, 110, 310, 0.8])
+        assert inputs.key_points[0][-1][0][0] == FALL_SEQUENCE_LENGTH - 1
+        assert not self.estimator.is_ready()
+
+    def test_submit_only_sends_windows_to_classify(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+
+        fall_ids = self.estimator.submit(
+            self.frame, persons, self.key_points, (1080, 1280), set()
+        )
+
+        assert fall_ids == []
+        assert self.pose_queue.get(False)[3] == 0
+
+    def test_submit_keeps_persons_to_classify_over_max_persons(self):
+        persons = [(id, (10, 10, 110, 310), 0.8) for id in "cdefg"]
+        for id, *_ in persons:
+            self.key_points.add(id)
+        persons.append(("b", (500, 100, 600, 400), 0.9))
+
+        fall_ids = self.estimator.submit(
+            self.frame, persons, self.key_points, (1080, 1280)
+        )
+
+        assert fall_ids == ["b"]
+        assert self.pose_queue.get(False)[5] == ["b", "c", "d", "e"]
+
+    def test_keep_warm_only_persons_are_never_classified(self):
+        streaming_estimator = RemotePoseEstimator(
+            "test_camera",
+            self.pose_queue,
+            self.event,
+            self.max_persons,
+            mp.Event(),
+            streaming_fall=True,
+        )
+        fall_filter = FallCandidateFilter(FallPrefilterConfig(keep_warm_interval=3))
+        self.key_points.add("c")
+        classified = set()
+        streamed = Counter()
+        for _ in range(FALL_SEQUENCE_LENGTH * 3):
+            persons, *_ = fall_filter.select(
+                [
+                    ("a", (10, 10, 110, 310), 0.8, False),
+                    ("c", (500, 100, 600, 400), 0.9, True),
+                ]
+            )
+            for id, *_ in persons:
+                self.key_points.append(id, np.zeros((13, 3), np.float32))
+
+            sparse_ids = fall_filter.sparse_ids()
+            classify_ids = {id for id, *_ in persons if id not in sparse_ids}
+            for estimator in (self.estimator, streaming_estimator):
+                classified.update(
+                    estimator.submit(
+                        self.frame,
+                        persons,
+                        self.key_points,
+                        (1080, 1280),
+                        classify_ids,
+                        sparse_ids,
+                    )
+                )
+                estimator.pending = None
+
+            self.pose_queue.get(False)
+            # streamed persons go first in the request
+            _, _, _, fall_count, _, ids, *_ = self.pose_queue.get(False)
+            streamed.update(ids[:fall_count])
+
+        # a has a full window of keep warm poses
+        assert self.key_points.count("a") == FALL_SEQUENCE_LENGTH
+        assert classified == {"c"}
+        # only the first pose of a is streamed, before its history got sparse
+        assert streamed == {"a": 1, "c": FALL_SEQUENCE_LENGTH * 3}
+        streaming_estimator.in_shm.close()
+        streaming_estimator.out_shm.close()
+
+    def finish(self, request_time):
+        """Write the results the pose estimator would for a request."""
+        outputs = PoseOutputBuffers(self.out_shm.buf, self.max_persons)
+        outputs.key_points[0] = 1.0
+        outputs.valid[0] = 1
+        outputs.valid[1] = 0
+        outputs.fall[0] = [0.2, 0.8]
+        outputs.request[0] = request_time
+        self.event.set()
+
+    def test_get_results_only_once_the_request_finished(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+
+        assert self.estimator.get_results() is None
+
+        self.finish(self.pose_queue.get(False)[1])
+
+        key_points, falls = self.estimator.get_results()
+
+        assert list(key_points.keys()) == ["b"]
+        np.testing.assert_array_equal(key_points["b"], np.ones((13, 3)))
+        np.testing.assert_allclose(falls["b"], [0.2, 0.8])
+        assert self.estimator.is_ready()
+        assert self.estimator.get_results() is None
+
+    def test_results_of_a_request_given_up_on_are_ignored(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+        given_up = self.pose_queue.get(False)[1]
+        self.estimator.pending = None
+
+        self.estimator.submit(self.frame, persons[:1], self.key_points, (1080, 1280))
+        request_time = self.pose_queue.get(False)[1]
+        inputs = PoseInputBuffers(self.in_shm.buf, self.max_persons)
+        assert inputs.request[0] == request_time
+
+        self.finish(given_up)
+
+        assert self.estimator.get_results() is None
+        assert not self.event.is_set()
+        assert not self.estimator.is_ready()
+
+        self.finish(request_time)
+
+        assert self.estimator.get_results() is not None
+
+    def test_moved_streams_sent_with_next_request(self):
+        persons = [("a", (10, 10, 110, 310), 0.8)]
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+        self.pose_queue.get(False)
+        self.estimator.pending = None
+
+        # only streams the pose estimator has are moved
+        self.estimator.move([("a", "c"), ("b", "d")])
+        self.estimator.retain({"c"})
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+
+        assert self.pose_queue.get(False)[6:] == (["a"], [("a", "c")])
+        assert self.estimator.sent_ids == {"a", "c"}
+
+    def test_streams_dropped_with_next_request_once_tracks_are_gone(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+        self.pose_queue.get(False)
+        self.estimator.pending = None
+
+        # b is only left out of the request, a is no longer tracked
+        self.estimator.retain({"b"})
+        self.estimator.submit(self.frame, [], self.key_points, (1080, 1280))
+        self.estimator.submit(self.frame, persons[1:], self.key_points, (1080, 1280))
+
+        assert self.pose_queue.get(False)[6] == ["a"]
+        assert self.estimator.dropped_ids == []
+
+    def test_streams_of_a_superseded_request_dropped_with_next_request(self):
+        persons = [("a", (10, 10, 110, 310), 0.8), ("b", (500, 100, 600, 400), 0.9)]
+        self.estimator.submit(self.frame, persons, self.key_points, (1080, 1280))
+        self.finish(self.pose_queue.get(False)[1])
+        self.estimator.get_results()
+
+        self.estimator.retain({"b"})
+        self.estimator.move([("b", "c")])
+        self.estimator.submit(self.frame, persons[1:], self.key_points, (1080, 1280))
+        # the pose estimator skips the request for the newer one of the camera
+        self.pose_queue.get(False)
+        ids, fall_ids, _, *changes = self.estimator.pending
+        self.estimator.pending = (ids, fall_ids, 0.0, *changes)
+        assert self.estimator.get_results() is None
+
+        self.estimator.submit(self.frame, persons[1:], self.key_points, (1080, 1280))
+        request = self.pose_queue.get(False)
+        fall_streams = MagicMock()
+        outputs = PoseOutputBuffers(self.out_shm.buf, self.max_persons)
+        outputs.valid[:] = 0
+        write_fall_stream_results(
+            fall_streams,
+            [("test_camera", request[5], request[6], request[7], outputs, 1, None)],
+        )
+
+        fall_streams.move.assert_called_once_with(
+            ("test_camera", "b"), ("test_camera", "c")
+        )
+        fall_streams.remove.assert_called_once_with([("test_camera", "a")])
+
+
+class TestWritePoseResults(unittest.TestCase):
+    def setUp(self):
+        # only the heatmap decoding is under test, the model isn't needed
+        self.pose_model = SPPE_FastPose.__new__(SPPE_FastPose)
+        self.pose_model.inp_h = 320
+        self.pose_model.inp_w = 256
+        self.inputs = PoseInputBuffers(bytearray(PoseInputBuffers.size(4)), 4)
+        self.inputs.boxes[:3] = [
+            [10, 10, 110, 310, 0.8],
+            [500, 100, 600, 400, 0.9],
+            [900, 100, 1000, 400, 0.7],
+        ]
+        self.inputs.crop_boxes[:3] = [
+            [0, 0, 120, 340],
+            [490, 70, 610, 430],
+            [890, 70, 1010, 430],
+        ]
+        self.pose_hm = torch.rand(
+            (3, 13, 80, 64), generator=torch.Generator().manual_seed(0)
+        )
+
+    def write_results(self, track_aware):
+        outputs = PoseOutputBuffers(bytearray(PoseOutputBuffers.size(4)), 4)
+        write_pose_results(
+            self.pose_model,
+            self.pose_hm.clone(),
+            self.inputs,
+            outputs,
+            3,
+            track_aware,
+        )
+        return outputs
+
+    def test_track_aware_poses_match_nms_for_separate_persons(self):
+        outputs = self.write_results(True)
+        nms_outputs = self.write_results(False)
+
+        np.testing.assert_array_equal(outputs.valid, [1, 1, 1, 0])
+        np.testing.assert_array_equal(outputs.valid, nms_outputs.valid)
+        np.testing.assert_allclose(
+            outputs.key_points[:3], nms_outputs.key_points[:3], rtol=1e-6
+        )
+
+
+class TestWriteFallResults(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        # random weights are enough to compare batched and single predictions
+        self.fall_model = TSSTG.__new__(TSSTG)
+        self.fall_model.device = "cpu"
+        self.fall_model.model = OSA_STGCN_nano_1S(
+            num_class=2, graph_args={"strategy": "spatial"}
+        ).eval()
+
+        rng = np.random.default_rng(0)
+        self.requests = []
+        for fall_count, image_size in (
+            (3, (1080, 1920)),
+            (0, (720, 1280)),
+            (2, (480, 640)),
+        ):
+            inputs = PoseInputBuffers(bytearray(PoseInputBuffers.size(4)), 4)
+            inputs.key_points[:] = rng.uniform(
+                0, 400, (4, FALL_SEQUENCE_LENGTH, POSE_KEYPOINTS, 3)
+            )
+            outputs = PoseOutputBuffers(bytearray(PoseOutputBuffers.size(4)), 4)
+            self.requests.append((inputs, outputs, fall_count, image_size))
+
+    def test_batched_predictions_match_single_predictions(self):
+        write_fall_results(self.fall_model, self.requests)
+
+        with torch.no_grad():
+            for inputs, outputs, fall_count, image_size in self.requests:
+                for i in range(fall_count):
+                    np.testing.assert_allclose(
+                        outputs.fall[i],
+                        reference_predict(
+                            self.fall_model.model, inputs.key_points[i], image_size
+                        )[0],
+                        rtol=1e-5,
+                        atol=1e-6,
+                    )
+
+    def test_predict_does_not_modify_the_window(self):
+        window = self.requests[0][0].key_points[0].copy()
+        self.fall_model.predict(window, (1080, 1920))
+        np.testing.assert_array_equal(window, self.requests[0][0].key_points[0])
+
+
+class TestWriteFallStreamResults(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        fall_model = TSSTG.__new__(TSSTG)
+        fall_model.device = "cpu"
+        fall_model.model = OSA_STGCN_nano_1S(
+            num_class=2, graph_args={"strategy": "spatial"}
+        ).eval()
+        self.fall_model = fall_model
+        self.fall_streams = FallStreams(fall_model, FALL_SEQUENCE_LENGTH)
+        self.outputs = PoseOutputBuffers(bytearray(PoseOutputBuffers.size(4)), 4)
+        self.poses = np.random.default_rng(0).uniform(
+            0, 400, (FALL_SEQUENCE_LENGTH, 3, POSE_KEYPOINTS, 3)
+        )
+
+    def write_results(self, step, ids, dropped_ids=(), moved_ids=()):
+        self.outputs.key_points[:3] = self.poses[step]
+        self.outputs.valid[:3] = [1, 1, 0]
+        write_fall_stream_results(
+            self.fall_streams,
+            [
+                (
+                    "test_camera",
+                    ids,
+                    dropped_ids,
+                    moved_ids,
+                    self.outputs,
+                    3,
+                    (1080, 1920),
+                )
+            ],
+        )
+
+    def test_full_histories_match_window_predictions(self):
+        for step in range(FALL_SEQUENCE_LENGTH):
+            self.write_results(step, ["a", "b", "c"])
+
+            if step < FALL_SEQUENCE_LENGTH - 1:
+                np.testing.assert_array_equal(self.outputs.fall_valid[:3], 0)
+
+        np.testing.assert_array_equal(self.outputs.fall_valid[:3], [1, 1, 0])
+        np.testing.assert_allclose(
+            self.outputs.fall[:2],
+            self.fall_model.predict_batch(
+                self.poses[:, :2].transpose(1, 0, 2, 3), (1080, 1920)
+            ),
+            rtol=1e-5,
+            atol=1e-6,
+        )
+        # only valid poses start a stream
+        assert ("test_camera", "c") not in self.fall_streams
+
+    def test_only_streams_of_dropped_tracks_are_removed(self):
+        self.write_results(0, ["a", "b", "c"])
+        self.write_results(1, ["d", "e", "f"], ["b"])
+
+        assert set(self.fall_streams.keys()) == {
+            ("test_camera", "a"),
+            ("test_camera", "d"),
+            ("test_camera", "e"),
+        }
+
+    def test_moved_stream_continues_under_new_id(self):
+        for step in range(FALL_SEQUENCE_LENGTH - 1):
+            self.write_results(step, ["a", "b", "c"])
+
+        self.write_results(
+            FALL_SEQUENCE_LENGTH - 1, ["d", "b", "c"], ["a"], [("a", "d")]
+        )
+
+        np.testing.assert_array_equal(self.outputs.fall_valid[:3], [1, 1, 0])
+        assert ("test_camera", "a") not in self.fall_streams
+
+    def test_keep_warm_poses_are_not_streamed(self):
+        fall_filter = FallCandidateFilter(FallPrefilterConfig(keep_warm_interval=3))
+        ready = set()
+        for step in range(FALL_SEQUENCE_LENGTH * 3):
+            persons, *_ = fall_filter.select(
+                [
+                    ("a", (0, 0, 100, 300), 0.9, False),
+                    ("b", (0, 0, 300, 100), 0.9, True),
+                ]
+            )
+            # persons with keep warm poses are sent last and not streamed
+            sparse_ids = fall_filter.sparse_ids()
+            ids = sorted((id for id, _, _ in persons), key=lambda id: id in sparse_ids)
+            fall_count = len([id for id in ids if id not in sparse_ids])
+            self.outputs.key_points[: len(ids)] = self.poses[
+                step % FALL_SEQUENCE_LENGTH, : len(ids)
+            ]
+            self.outputs.valid[: len(ids)] = 1
+            write_fall_stream_results(
+                self.fall_streams,
+                [("test_camera", ids, [], [], self.outputs, fall_count, (1080, 1920))],
+            )
+            ready.update(
+                id
+                for i, id in enumerate(ids[:fall_count])
+                if self.outputs.fall_valid[i]
+            )
+
+        assert ready == {"b"}
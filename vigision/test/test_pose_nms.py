@@ -0,0 +1,278 @@
+import unittest
+
+import numpy as np
+import torch
+
+from vigision.pose_nms import (
+    alpha,
+    areaThres,
+    delta1,
+    delta2,
+    gamma,
+    matchThreds,
+    mu,
+    pose_nms,
+    scoreThreds,
+)
+
+
+# the original loop based implementation, kept to check parity
+
+
+def reference_pose_nms(bboxes, bbox_scores, pose_preds, pose_scores):
+    """
+    Parametric Pose NMS algorithm
+    bboxes:         bbox locations list (n, 4)
+    bbox_scores:    bbox scores list (n,)
+    pose_preds:     pose locations list (n, 17, 2)
+    pose_scores:    pose scores list    (n, 17, 1)
+    """
+    pose_scores[pose_scores == 0] = 1e-5
+
+    final_result = []
+
+    ori_bboxes = bboxes.clone()
+    ori_bbox_scores = bbox_scores.clone()
+    ori_pose_preds = pose_preds.clone()
+    ori_pose_scores = pose_scores.clone()
+
+    xmax = bboxes[:, 2]
+    xmin = bboxes[:, 0]
+    ymax = bboxes[:, 3]
+    ymin = bboxes[:, 1]
+
+    widths = xmax - xmin
+    heights = ymax - ymin
+    ref_dists = alpha * np.maximum(widths, heights)
+
+    nsamples = bboxes.shape[0]
+    human_scores = pose_scores.mean(dim=1)
+
+    human_ids = np.arange(nsamples)
+    # Do pPose-NMS
+    pick = []
+    merge_ids = []
+    while human_scores.shape[0] != 0:
+        # Pick the one with highest score
+        pick_id = torch.argmax(human_scores)
+        pick.append(human_ids[pick_id])
+        # num_visPart = torch.sum(pose_scores[pick_id] > 0.2)
+
+        # Get numbers of match keypoints by calling PCK_match
+        ref_dist = ref_dists[human_ids[pick_id]]
+        simi = get_parametric_distance(pick_id, pose_preds, pose_scores, ref_dist)
+        num_match_keypoints = PCK_match(pose_preds[pick_id], pose_preds, ref_dist)
+
+        # Delete humans who have more than matchThreds keypoints overlap and high similarity
+        delete_ids = torch.from_numpy(np.arange(human_scores.shape[0]))[
+            (simi > gamma) | (num_match_keypoints >= matchThreds)]
+
+        if delete_ids.shape[0] == 0:
+            delete_ids = pick_id
+        #else:
+        #    delete_ids = torch.from_numpy(delete_ids)
+
+        merge_ids.append(human_ids[delete_ids])
+        pose_preds = np.delete(pose_preds, delete_ids, axis=0)
+        pose_scores = np.delete(pose_scores, delete_ids, axis=0)
+        human_ids = np.delete(human_ids, delete_ids)
+        human_scores = np.delete(human_scores, delete_ids, axis=0)
+        bbox_scores = np.delete(bbox_scores, delete_ids, axis=0)
+
+    assert len(merge_ids) == len(pick)
+    bboxs_pick = ori_bboxes[pick]
+    preds_pick = ori_pose_preds[pick]
+    scores_pick = ori_pose_scores[pick]
+    bbox_scores_pick = ori_bbox_scores[pick]
+
+    for j in range(len(pick)):
+        ids = np.arange(pose_preds.shape[1])
+        max_score = torch.max(scores_pick[j, ids, 0])
+
+        if max_score < scoreThreds:
+            continue
+
+        # Merge poses
+        merge_id = merge_ids[j]
+        merge_pose, merge_score = p_merge_fast(
+            preds_pick[j], ori_pose_preds[merge_id], ori_pose_scores[merge_id], ref_dists[pick[j]])
+
+        max_score = torch.max(merge_score[ids])
+        if max_score < scoreThreds:
+            continue
+
+        xmax = max(merge_pose[:, 0])
+        xmin = min(merge_pose[:, 0])
+        ymax = max(merge_pose[:, 1])
+        ymin = min(merge_pose[:, 1])
+
+        if 1.5 ** 2 * (xmax - xmin) * (ymax - ymin) < areaThres:
+            continue
+
+        final_result.append({
+            'ori_bbox': ori_bboxes,
+            'bbox': bboxs_pick[j],
+            'bbox_score': bbox_scores_pick[j],
+            'keypoints': merge_pose - 0.3,
+            'kp_score': merge_score,
+            'proposal_score': torch.mean(merge_score) + bbox_scores_pick[j] + 1.25 * max(merge_score)
+        })
+
+    return final_result
+
+
+def p_merge_fast(ref_pose, cluster_preds, cluster_scores, ref_dist):
+    """
+    Score-weighted pose merging
+    INPUT:
+        ref_pose:       reference pose          -- [17, 2]
+        cluster_preds:  redundant poses         -- [n, 17, 2]
+        cluster_scores: redundant poses score   -- [n, 17, 1]
+        ref_dist:       reference scale         -- Constant
+    OUTPUT:
+        final_pose:     merged pose             -- [17, 2]
+        final_score:    merged score            -- [17]
+    """
+    dist = torch.sqrt(torch.sum(
+        torch.pow(ref_pose[np.newaxis, :] - cluster_preds, 2),
+        dim=2
+    ))
+
+    kp_num = 17
+    ref_dist = min(ref_dist, 15)
+
+    mask = (dist <= ref_dist)
+    final_pose = torch.zeros(kp_num, 2)
+    final_score = torch.zeros(kp_num)
+
+    if cluster_preds.dim() == 2:
+        cluster_preds.unsqueeze_(0)
+        cluster_scores.unsqueeze_(0)
+    if mask.dim() == 1:
+        mask.unsqueeze_(0)
+
+    # Weighted Merge
+    masked_scores = cluster_scores.mul(mask.float().unsqueeze(-1))
+    normed_scores = masked_scores / torch.sum(masked_scores, dim=0)
+
+    final_pose = torch.mul(cluster_preds, normed_scores.repeat(1, 1, 2)).sum(dim=0)
+    final_score = torch.mul(masked_scores, normed_scores).sum(dim=0)
+    return final_pose, final_score
+
+
+def get_parametric_distance(i, all_preds, keypoint_scores, ref_dist):
+    pick_preds = all_preds[i]
+    pred_scores = keypoint_scores[i]
+    dist = torch.sqrt(torch.sum(
+        torch.pow(pick_preds[np.newaxis, :] - all_preds, 2),
+        dim=2
+    ))
+    mask = (dist <= 1)
+
+    # Define a keypoints distance
+    score_dists = torch.zeros(all_preds.shape[0], all_preds.shape[1])
+    keypoint_scores.squeeze_()
+    if keypoint_scores.dim() == 1:
+        keypoint_scores.unsqueeze_(0)
+    if pred_scores.dim() == 1:
+        pred_scores.unsqueeze_(1)
+    # The predicted scores are repeated up to do broadcast
+    pred_scores = pred_scores.repeat(1, all_preds.shape[0]).transpose(0, 1)
+
+    score_dists[mask] = torch.tanh(pred_scores[mask] / delta1) *\
+                        torch.tanh(keypoint_scores[mask] / delta1)
+
+    point_dist = torch.exp((-1) * dist / delta2)
+    final_dist = torch.sum(score_dists, dim=1) + mu * torch.sum(point_dist, dim=1)
+
+    return final_dist
+
+
+def PCK_match(pick_pred, all_preds, ref_dist):
+    dist = torch.sqrt(torch.sum(
+        torch.pow(pick_pred[np.newaxis, :] - all_preds, 2),
+        dim=2
+    ))
+    ref_dist = min(ref_dist, 7)
+    num_match_keypoints = torch.sum(
+        dist / ref_dist <= 1,
+        dim=1
+    )
+
+    return num_match_keypoints
+
+
+def create_poses(persons, duplicates, seed=0):
+    """Random poses where every person is detected several times with some jitter."""
+    rng = np.random.default_rng(seed)
+    boxes = []
+    preds = []
+    for _ in range(persons):
+        x, y = rng.uniform(0, 1500), rng.uniform(0, 800)
+        w, h = rng.uniform(40, 200), rng.uniform(100, 300)
+        pose = np.stack(
+            (rng.uniform(x, x + w, 13), rng.uniform(y, y + h, 13)), axis=1
+        )
+        for _ in range(rng.integers(1, duplicates + 1)):
+            jitter = rng.uniform(-8, 8, 4)
+            boxes.append((x + jitter[0], y + jitter[1], x + w + jitter[2], y + h + jitter[3]))
+            preds.append(pose + rng.normal(0, 1.5, pose.shape))
+
+    n = len(boxes)
+    scores = rng.uniform(0, 1, (n, 13, 1))
+    scores[rng.uniform(0, 1, (n, 13, 1)) < 0.05] = 0
+    return (
+        torch.tensor(np.array(boxes), dtype=torch.float32),
+        torch.tensor(rng.uniform(0.4, 1, n), dtype=torch.float32),
+        torch.tensor(np.array(preds), dtype=torch.float32),
+        torch.tensor(scores, dtype=torch.float32),
+    )
+
+
+def run_pose_nms(nms, poses):
+    return nms(*[p.clone() for p in poses])
+
+
+class TestPoseNms(unittest.TestCase):
+    def assert_same_result(self, result, expected):
+        assert len(result) == len(expected)
+        for pose, expected_pose in zip(result, expected):
+            assert torch.equal(pose["bbox"], expected_pose["bbox"])
+            torch.testing.assert_close(pose["keypoints"], expected_pose["keypoints"])
+            torch.testing.assert_close(pose["kp_score"], expected_pose["kp_score"])
+            torch.testing.assert_close(
+                pose["proposal_score"], expected_pose["proposal_score"]
+            )
+
+    def test_matches_reference_for_single_person(self):
+        poses = create_poses(1, 1)
+
+        self.assert_same_result(
+            run_pose_nms(pose_nms, poses), run_pose_nms(reference_pose_nms, poses)
+        )
+
+    def test_matches_reference_for_crowds(self):
+        for seed in range(20):
+            poses = create_poses(12, 3, seed)
+
+            self.assert_same_result(
+                run_pose_nms(pose_nms, poses),
+                run_pose_nms(reference_pose_nms, poses),
+            )
+
+    def test_duplicate_detections_are_merged(self):
+        poses = create_poses(4, 3, seed=1)
+
+        result = run_pose_nms(pose_nms, poses)
+
+        assert len(result) <= 4 < len(poses[0])
+
+    def test_no_poses(self):
+        poses = (
+            torch.zeros((0, 4)),
+            torch.zeros((0,)),
+            torch.zeros((0, 13, 2)),
+            torch.zeros((0, 13, 1)),
+        )
+
+        assert pose_nms(*poses) == []
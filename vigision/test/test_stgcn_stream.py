@@ -0,0 +1,68 @@
+import unittest
+
+import torch
+
+from vigision.networks.oneshot_stgcn_nano import OSA_STGCN_nano_1S
+
+
+class TestStreamingSTGCN(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = OSA_STGCN_nano_1S(num_class=2, graph_args={"strategy": "spatial"})
+        # random normalization statistics so every layer matters for the parity
+        for module in self.model.modules():
+            if isinstance(module, (torch.nn.BatchNorm1d, torch.nn.BatchNorm2d)):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.5, 0.5)
+        self.model.eval()
+        self.inputs = torch.randn(3, 3, 40, 14)
+
+    def full_history(self, steps, window):
+        """Batch model over the whole history, pooled over the last window steps."""
+        gcn = self.model.st_gcn
+        x = gcn.normalize(self.inputs[:, :, :steps])
+        x = gcn.gcn_0(x, gcn.A * gcn.edge_importance[0])
+        x = gcn.osa_block_0(x, gcn.A, gcn.edge_importance[1:3])
+        x = gcn.osa_block_1(x, gcn.A, gcn.edge_importance[3:7])
+        return torch.sigmoid(self.model.fcn(x[:, :, -window:].mean(dim=(2, 3))))
+
+    @torch.inference_mode()
+    def test_stream_matches_batch_model_within_window(self):
+        state = self.model.init_stream(3, 30)
+
+        for step in range(30):
+            out = self.model.stream(self.inputs[:, :, step : step + 1], state)
+            torch.testing.assert_close(
+                out, self.model(self.inputs[:, :, : step + 1]), rtol=1e-5, atol=1e-6
+            )
+
+    @torch.inference_mode()
+    def test_stream_keeps_history_past_the_window(self):
+        state = self.model.init_stream(3, 30)
+
+        for step in range(40):
+            out = self.model.stream(self.inputs[:, :, step : step + 1], state)
+
+        torch.testing.assert_close(out, self.full_history(40, 30), rtol=1e-5, atol=1e-6)
+
+    @torch.inference_mode()
+    def test_sequences_of_different_ages_in_one_batch(self):
+        state = self.model.init_stream(1, 30)
+        for step in range(5):
+            self.model.stream(self.inputs[:1, :, step : step + 1], state)
+
+        # a new sequence joins the stream of an older one
+        new_state = self.model.init_stream(1, 30)
+        state = {key: torch.cat((state[key], new_state[key])) for key in state}
+        inputs = torch.stack((self.inputs[0, :, 5:25], self.inputs[1, :, :20]))
+        for step in range(20):
+            out = self.model.stream(inputs[:, :, step : step + 1], state)
+
+        torch.testing.assert_close(
+            out[0], self.model(self.inputs[:1, :, :25])[0], rtol=1e-5, atol=1e-6
+        )
+        torch.testing.assert_close(
+            out[1], self.model(self.inputs[1:2, :, :20])[0], rtol=1e-5, atol=1e-6
+        )
@@ -1,3 +1,6 @@
+import io
+import multiprocessing as mp
+import queue
 import unittest
 
 import cv2
@@ -5,14 +8,21 @@ import numpy as np
 from norfair.drawing.color import Palette
 from norfair.drawing.drawer import Drawer
 
-from vigision.util.image import intersection, transliterate_to_latin
+from vigision.util.image import (
+    DictFrameManager,
+    intersection,
+    transliterate_to_latin,
+)
 from vigision.util.object import (
+    MosaicCanvas,
+    ShelfRegionPacker,
     get_cluster_boundary,
     get_cluster_candidates,
     get_cluster_region,
     get_region_from_grid,
     reduce_detections,
 )
+from vigision.video import capture_frames, get_detection_regions, read_frame
 
 
 def draw_box(frame, box, color=(255, 0, 0), thickness=2):
@@ -352,3 +362,133 @@ class TestRegionGrid(unittest.TestCase):
 
         region = get_region_from_grid(frame_shape, box, 320, region_grid)
         assert region[2] - region[0] > 320
+
+
+class TestDetectionRegions(unittest.TestCase):
+    def setUp(self):
+        self.regions = [(0, 0, 320, 320), (1000, 600, 1320, 920), (500, 0, 820, 320)]
+
+    def test_single_slot_merges_regions(self):
+        assert get_detection_regions(self.regions, 1) == [(0, 0, 1320, 1320)]
+
+    def test_regions_kept_when_slots_available(self):
+        assert get_detection_regions(self.regions, 4) == self.regions
+
+    def test_overflow_regions_merged_into_last_slot(self):
+        assert get_detection_regions(self.regions, 2) == [
+            (0, 0, 320, 320),
+            (500, 0, 1420, 920),
+        ]
+
+
+class TestRegionMosaic(unittest.TestCase):
+    def setUp(self):
+        self.packer = ShelfRegionPacker()
+
+    def test_small_regions_packed_into_one_canvas(self):
+        regions = [
+            (0, 0, 320, 320),
+            (1000, 0, 1320, 320),
+            (0, 700, 320, 1020),
+            (1500, 700, 1820, 1020),
+        ]
+
+        canvases, unpacked = self.packer.pack(regions, 640, 640, 2)
+
+        assert len(canvases) == 1
+        assert unpacked == []
+        assert sorted(canvases[0].regions) == sorted(regions)
+        assert canvases[0].fill == 1.0
+        assert sorted((x, y) for _, x, y in canvases[0].tiles) == [
+            (0, 0),
+            (0, 320),
+            (320, 0),
+            (320, 320),
+        ]
+
+    def test_regions_not_packed_when_too_large_or_out_of_canvases(self):
+        regions = [(0, 0, 800, 800), (0, 0, 400, 400), (500, 0, 900, 400)]
+
+        canvases, unpacked = self.packer.pack(regions, 640, 640, 1)
+
+        assert len(canvases) == 1
+        assert canvases[0].regions == [(0, 0, 400, 400)]
+        assert canvases[0].fill == 0.390625
+        assert unpacked == [(0, 0, 800, 800), (500, 0, 900, 400)]
+
+    def test_canvas_detections_mapped_to_regions(self):
+        canvas = MosaicCanvas(640, 640)
+        canvas.add((1000, 500, 1320, 820), 0, 0)
+        canvas.add((0, 0, 320, 320), 320, 0)
+
+        region_detections = canvas.map_detections(
+            [
+                ("person", 0.9, (0.25, 0.5, 0.5, 0.75)),
+                # spills over the edge of the first tile
+                ("car", 0.8, (0.0, 0.25, 0.25, 0.625)),
+            ]
+        )
+
+        assert region_detections[0][0] == (1000, 500, 1320, 820)
+        assert region_detections[0][1] == [("car", 0.8, (0.0, 0.5, 0.5, 1.0))]
+        assert region_detections[1][0] == (0, 0, 320, 320)
+        assert region_detections[1][1] == [("person", 0.9, (0.5, 0.0, 1.0, 0.5))]
+
+
+class ChunkedStream(io.RawIOBase):
+    """Stream that returns at most `chunk` bytes per read like a pipe."""
+
+    def __init__(self, data: bytes, chunk: int):
+        self.data = io.BytesIO(data)
+        self.chunk = chunk
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.data.read(min(len(buffer), self.chunk))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class TestCaptureFrames(unittest.TestCase):
+    def test_partial_reads_fill_the_buffer(self):
+        buffer = np.zeros(10, np.uint8)
+
+        assert read_frame(ChunkedStream(bytes(range(10)), 3), buffer) == 10
+        assert buffer.tolist() == list(range(10))
+
+        assert read_frame(ChunkedStream(bytes(4), 3), buffer) == 4
+
+    def test_frames_read_into_frame_buffers(self):
+        class FfmpegProcess:
+            stdout = ChunkedStream(bytes(range(6)) * 2 + bytes(4), 4)
+
+            def poll(self):
+                return 0
+
+        frame_manager = DictFrameManager()
+        frame_queue = queue.Queue()
+        short_reads = mp.Value("i", 0)
+        corrupt_reads = mp.Value("i", 0)
+
+        capture_frames(
+            FfmpegProcess(),
+            "front",
+            (3, 2),
+            frame_manager,
+            frame_queue,
+            mp.Value("d", 0.0),
+            mp.Value("d", 0.0),
+            short_reads,
+            corrupt_reads,
+            mp.Value("d", 0.0),
+            mp.Event(),
+        )
+
+        assert frame_queue.qsize() == 2
+        assert [list(frame) for frame in frame_manager.frames.values()] == [
+            list(range(6))
+        ] * 2
+        assert short_reads.value == 1
+        assert corrupt_reads.value == 0
@@ -3,7 +3,7 @@ from unittest import TestCase, main
 import cv2
 import numpy as np
 
-from vigision.util.image import yuv_region_2_rgb
+from vigision.util.image import YuvFrameView, yuv_region_2_rgb
 
 
 class TestYuvRegion2RGB(TestCase):
@@ -39,5 +39,47 @@ class TestYuvRegion2RGB(TestCase):
         # cv2.imwrite(f"cropped.jpg", cv2.cvtColor(cropped, cv2.COLOR_RGB2BGR))
 
 
+class TestYuvFrameView(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        bgr_frame = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        self.yuv_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2YUV_I420)
+        self.bgr_frame = cv2.cvtColor(self.yuv_frame, cv2.COLOR_YUV2BGR_I420)
+
+    def test_crops_match_full_frame_conversion(self):
+        view = YuvFrameView(self.yuv_frame)
+        assert view.shape == self.bgr_frame.shape
+
+        for rows, cols in [
+            (slice(0, 120), slice(0, 160)),
+            (slice(10, 50), slice(20, 60)),
+            (slice(11, 52), slice(23, 90)),
+            (slice(99, 130), slice(141, 170)),
+        ]:
+            np.testing.assert_array_equal(
+                view[rows, cols], self.bgr_frame[rows, cols]
+            )
+
+        assert view._bgr is None
+
+    def test_region_is_cached(self):
+        view = YuvFrameView(self.yuv_frame)
+        region = view.region((0, 0, 80, 80), "rgb")
+
+        np.testing.assert_array_equal(
+            region, yuv_region_2_rgb(self.yuv_frame, (0, 0, 80, 80))
+        )
+        assert view.region((0, 0, 80, 80), "rgb") is region
+        assert view[5:21, 7:30] is not view[5:21, 7:30]
+        assert view[5:21, 7:30].base is view[5:21, 7:30].base
+
+    def test_full_frame(self):
+        view = YuvFrameView(self.yuv_frame)
+
+        np.testing.assert_array_equal(view.bgr(), self.bgr_frame)
+        assert view.bgr() is view.bgr()
+        np.testing.assert_array_equal(view[3:9, 5:7], self.bgr_frame[3:9, 5:7])
+
+
 if __name__ == "__main__":
     main(verbosity=2)
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class KeyPointStore:
+    """Keypoint history of every tracked object in a single preallocated array.
+
+    Each track owns a slot with a ring of twice the history length. Every pose
+    is written at its ring position and again one history length further, so
+    the last `length` poses are always a contiguous, ordered view.
+    """
+
+    def __init__(self, length: int = 30, key_points: int = 13, capacity: int = 16):
+        self.length = length
+        self.data = np.zeros((capacity, 2 * length, key_points, 3), dtype=np.float32)
+        # position the next pose is written to and number of poses of each slot
+        self.heads = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.slots: dict[str, int] = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.slots
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __getitem__(self, id: str) -> np.ndarray:
+        return self.window(id)
+
+    def add(self, id: str):
+        if not self.free_slots:
+            self._grow()
+
+        slot = self.free_slots.pop()
+        self.heads[slot] = 0
+        self.counts[slot] = 0
+        self.slots[id] = slot
+
+    def remove(self, id: str):
+        self.free_slots.append(self.slots.pop(id))
+
+    def clear(self, id: str):
+        slot = self.slots[id]
+        self.heads[slot] = 0
+        self.counts[slot] = 0
+
+    def copy(self, source_id: str, id: str):
+        """Replace the poses of a track with the poses of another track."""
+        source, slot = self.slots[source_id], self.slots[id]
+        self.data[slot] = self.data[source]
+        self.heads[slot] = self.heads[source]
+        self.counts[slot] = self.counts[source]
+
+    def append(self, id: str, key_points: np.ndarray):
+        slot = self.slots[id]
+        head = self.heads[slot]
+        self.data[slot, head] = key_points
+        self.data[slot, head + self.length] = key_points
+        self.heads[slot] = (head + 1) % self.length
+        self.counts[slot] = min(self.counts[slot] + 1, self.length)
+
+    def count(self, id: str) -> int:
+        return int(self.counts[self.slots[id]])
+
+    def window(self, id: str) -> np.ndarray:
+        """Ordered view of the poses of a track, oldest first."""
+        slot = self.slots[id]
+        end = self.heads[slot] + self.length
+        return self.data[slot, end - self.counts[slot] : end]
+
+    def last(self, id: str) -> np.ndarray:
+        slot = self.slots[id]
+        return self.data[slot, self.heads[slot] + self.length - 1]
+
+    def gather(self, ids: list[str]) -> np.ndarray:
+        """Full windows of several tracks, shape (len(ids), length, key points, 3)."""
+        slots = np.array([self.slots[id] for id in ids], dtype=np.int64)
+        positions = self.heads[slots, None] + np.arange(self.length)
+        return self.data[slots[:, None], positions]
+
+    def _grow(self):
+        capacity = len(self.data)
+        self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        self.heads = np.concatenate((self.heads, np.zeros_like(self.heads)))
+        self.counts = np.concatenate((self.counts, np.zeros_like(self.counts)))
+        self.free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
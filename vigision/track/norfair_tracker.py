@@ -1,7 +1,7 @@
 import logging
 import random
 import string
-from collections import deque
+from typing import Optional
 
 import numpy as np
 from norfair import (
@@ -11,11 +11,13 @@ from norfair import (
     Tracker,
     draw_boxes,
 )
+from norfair.distances import VectorizedDistance
 from norfair.drawing.drawer import Drawer
 
 from vigision.config import CameraConfig
 from vigision.ptz.autotrack import PtzMotionEstimator
 from vigision.track import ObjectTracker
+from vigision.track.key_points import KeyPointStore
 from vigision.types import PTZMetricsTypes
 from vigision.util.image import intersection_over_union
 from vigision.util.object import average_boxes, median_of_boxes
@@ -72,6 +74,53 @@ def vigision_distance(detection: Detection, tracked_object) -> float:
     return distance(detection.points, tracked_object.estimate)
 
 
+def distance_matrix(detections: np.ndarray, estimates: np.ndarray) -> np.ndarray:
+    """Same as distance() for every detection and estimate pair at once.
+
+    Both are given as rows of flattened boxes [x_min, y_min, x_max, y_max],
+    the result has a row per detection and a column per estimate.
+    """
+    detections = detections.astype(float)
+    estimates = estimates.astype(float)
+    detection_dim = detections[:, 2:] - detections[:, :2]
+    estimate_dim = estimates[:, 2:] - estimates[:, :2]
+
+    # get bottom center positions
+    detection_position = np.stack(
+        [
+            (detections[:, 0] + detections[:, 2]) / 2,
+            np.maximum(detections[:, 1], detections[:, 3]),
+        ],
+        axis=1,
+    )
+    estimate_position = np.stack(
+        [
+            (estimates[:, 0] + estimates[:, 2]) / 2,
+            np.maximum(estimates[:, 1], estimates[:, 3]),
+        ],
+        axis=1,
+    )
+
+    # change in x and y relative to w and h
+    position_change = (
+        detection_position[:, np.newaxis] - estimate_position[np.newaxis]
+    ) / estimate_dim[np.newaxis]
+
+    # get ratio of widths and heights
+    # normalize to 1
+    detection_dim = detection_dim[:, np.newaxis]
+    estimate_dim = estimate_dim[np.newaxis]
+    size_change = (
+        np.maximum(detection_dim, estimate_dim) / np.minimum(detection_dim, estimate_dim)
+        - 1.0
+    )
+
+    # calculate euclidean distance of the change vectors
+    return np.sqrt(
+        np.sum(position_change**2, axis=2) + np.sum(size_change**2, axis=2)
+    )
+
+
 class NorfairTracker(ObjectTracker):
     def __init__(
         self,
@@ -89,8 +138,16 @@ class NorfairTracker(ObjectTracker):
         self.ptz_autotracker_enabled = ptz_metrics["ptz_autotracker_enabled"]
         self.ptz_motion_estimator = {}
         self.camera_name = config.name
-        self.track_id_map = {}
-        self.key_points = {}  # Dictionary to hold queues for each human pose keypoints
+        self.track_id_map = {}  # vigision id of every norfair global id
+        self.id_track_map = {}  # norfair global id of every vigision id
+        self.track_objects = {}  # norfair object of every registered global id
+        self.deregistered_tracks = set()
+        self.key_points = KeyPointStore()  # human pose keypoint history of each object
+        self.pose_carry_over = config.fall_detect.pose_carry_over
+        # last frame time, label and box of lost tracks keeping their poses
+        self.lost_tracks: dict[str, tuple[float, str, tuple]] = {}
+        # (lost id, new id) of the poses carried over since they were last taken
+        self.pose_carry_overs: list[tuple[str, str]] = []
 
         # TODO: could also initialize a tracker per object class if there
         #       was a good reason to have different distance calculations
@@ -107,25 +164,26 @@ class NorfairTracker(ObjectTracker):
             #       the different tracker per object class
             filter_factory=OptimizedKalmanFilterFactory(R=3.4),
         )
+        # norfair only takes vectorized distances by name, so swap in the
+        # matrix form of vigision_distance once the tracker is created
+        self.tracker.distance_function = VectorizedDistance(distance_matrix)
         if self.ptz_autotracker_enabled.value:
             self.ptz_motion_estimator = PtzMotionEstimator(
                 self.camera_config, self.ptz_metrics
             )
 
-    def register(self, track_id, obj):
+    def register(self, track, obj):
         rand_id = "".join(random.choices(string.ascii_lowercase + string.digits, k=6))
         id = f"{obj['frame_time']}-{rand_id}"
-        self.track_id_map[track_id] = id
+        self.track_id_map[track.global_id] = id
+        self.id_track_map[id] = track.global_id
+        self.track_objects[track.global_id] = track
         obj["id"] = id
         obj["start_time"] = obj["frame_time"]
         obj["motionless_count"] = 0
         obj["position_changes"] = 0
-        obj["score_history"] = [
-            p.data["score"]
-            for p in next(
-                (o for o in self.tracker.tracked_objects if o.global_id == track_id)
-            ).past_detections
-        ]
+        obj["score_history"] = [p.data["score"] for p in track.past_detections]
+        pose_source = self.find_pose_source(obj)
         self.tracked_objects[id] = obj
         self.disappeared[id] = 0
         self.positions[id] = {
@@ -139,17 +197,80 @@ class NorfairTracker(ObjectTracker):
             "ymax": self.detect_config.height,
         }
         self.stationary_box_history[id] = []
-        self.key_points[id] = deque(maxlen=30)  # Initialize queue for the object
+        self.key_points.add(id)
+
+        # continue the poses of the track this one most likely replaces
+        if pose_source is not None:
+            self.key_points.copy(pose_source, id)
+            self.pose_carry_overs.append((pose_source, id))
+
+            if pose_source in self.lost_tracks:
+                del self.lost_tracks[pose_source]
+                self.key_points.remove(pose_source)
 
     def deregister(self, id, track_id):
+        obj = self.tracked_objects[id]
+
+        # keep the poses for a while in case the object shows up as a new track
+        if self.pose_carry_over.enabled and self.key_points.count(id) > 0:
+            self.lost_tracks[id] = (obj["frame_time"], obj["label"], obj["box"])
+        else:
+            self.key_points.remove(id)
+
         del self.tracked_objects[id]
         del self.disappeared[id]
-        del self.key_points[id]  # Remove the queue for the object
-        self.tracker.tracked_objects = [
-            o for o in self.tracker.tracked_objects if o.global_id != track_id
-        ]
+        del self.positions[id]
+        del self.stationary_box_history[id]
         del self.track_id_map[track_id]
-        
+        del self.id_track_map[id]
+        del self.track_objects[track_id]
+        # removed from the norfair tracker at the end of match_and_update
+        self.deregistered_tracks.add(track_id)
+
+    def find_pose_source(self, obj) -> Optional[str]:
+        """Lost or disappeared track with poses that a new object continues.
+
+        An object hidden for a moment usually comes back as a new track, the
+        closest track of the same label last seen within max_age whose last
+        box overlaps the new box by at least min_iou is taken.
+        """
+        if not self.pose_carry_over.enabled:
+            return None
+
+        candidates = list(self.lost_tracks.items()) + [
+            (id, (o["frame_time"], o["label"], o["box"]))
+            for id, o in self.tracked_objects.items()
+            if self.disappeared[id] > 0 and self.key_points.count(id) > 0
+        ]
+        box = np.array(obj["box"]).reshape(2, 2)
+        closest = None
+        closest_distance = self.pose_carry_over.max_distance
+
+        for id, (frame_time, label, last_box) in candidates:
+            if (
+                label != obj["label"]
+                or obj["frame_time"] - frame_time > self.pose_carry_over.max_age
+                or intersection_over_union(obj["box"], last_box)
+                < self.pose_carry_over.min_iou
+            ):
+                continue
+
+            change = distance(box, np.array(last_box).reshape(2, 2))
+
+            if change <= closest_distance:
+                closest, closest_distance = id, change
+
+        return closest
+
+    def expire_lost_tracks(self, frame_time):
+        for id, (lost_time, _, _) in list(self.lost_tracks.items()):
+            if frame_time - lost_time > self.pose_carry_over.max_age:
+                del self.lost_tracks[id]
+                self.key_points.remove(id)
+
+    def track_object(self, id):
+        """The norfair object tracking a registered object."""
+        return self.track_objects[self.id_track_map[id]]
 
     # tracks the current position of the object based on the last N bounding boxes
     # returns False if the object has moved outside its previous position
@@ -276,7 +397,7 @@ class NorfairTracker(ObjectTracker):
         self.tracked_objects[id].update(obj)
 
     def update_pose_data(self, id, key_points):
-        self.key_points[id].append(key_points)
+        self.key_points.append(id, key_points)
 
     def update_frame_times(self, frame_time):
         # if the object was there in the last frame, assume it's still there
@@ -295,6 +416,7 @@ class NorfairTracker(ObjectTracker):
         self.match_and_update(frame_time, detections=detections)
 
     def match_and_update(self, frame_time, detections):
+        self.expire_lost_tracks(frame_time)
         norfair_detections = []
 
         for obj in detections:
@@ -340,7 +462,7 @@ class NorfairTracker(ObjectTracker):
         )
 
         # update or create new tracks
-        active_ids = []
+        active_ids = set()
         for t in tracked_objects:
             estimate = tuple(t.estimate.flatten().astype(int))
             # keep the estimate within the bounds of the image
@@ -355,9 +477,9 @@ class NorfairTracker(ObjectTracker):
                 "estimate": estimate,
                 "estimate_velocity": t.estimate_velocity,
             }
-            active_ids.append(t.global_id)
+            active_ids.add(t.global_id)
             if t.global_id not in self.track_id_map:
-                self.register(t.global_id, obj)
+                self.register(t, obj)
             # if there wasn't a detection in this frame, increment disappeared
             elif t.last_detection.data["frame_time"] != frame_time:
                 id = self.track_id_map[t.global_id]
@@ -378,10 +500,20 @@ class NorfairTracker(ObjectTracker):
         for e_id in expired_ids:
             self.deregister(self.track_id_map[e_id], e_id)
 
+        if self.deregistered_tracks:
+            self.tracker.tracked_objects = [
+                o
+                for o in self.tracker.tracked_objects
+                if o.global_id not in self.deregistered_tracks
+            ]
+            self.deregistered_tracks.clear()
+
         # update list of object boxes that don't have a tracked object yet
-        tracked_object_boxes = [obj["box"] for obj in self.tracked_objects.values()]
+        tracked_object_boxes = {
+            tuple(obj["box"]) for obj in self.tracked_objects.values()
+        }
         self.untracked_object_boxes = [
-            o[2] for o in detections if o[2] not in tracked_object_boxes
+            o[2] for o in detections if tuple(o[2]) not in tracked_object_boxes
         ]
 
     def debug_draw(self, frame, frame_time):
@@ -5,18 +5,26 @@ from multiprocessing.synchronize import Event
 from typing import Optional, TypedDict
 
 from vigision.object_detection import ObjectDetectProcess
+from vigision.pose_estimation import PoseEstimateProcess
 
 
 class CameraMetricsTypes(TypedDict):
     camera_fps: Synchronized
     capture_process: Optional[Process]
+    corrupt_reads: Synchronized
+    detect_priority: Synchronized
+    detect_rate: Synchronized
+    detection_dropped: Synchronized
     detection_fps: Synchronized
     detection_frame: Synchronized
+    fall_filtered: Synchronized
     ffmpeg_pid: Synchronized
     frame_queue: Queue
+    mosaic_fill: Synchronized
     process: Optional[Process]
     process_fps: Synchronized
     read_start: Synchronized
+    short_reads: Synchronized
     skipped_fps: Synchronized
     audio_rms: Synchronized
     audio_dBFS: Synchronized
@@ -38,6 +46,7 @@ class PTZMetricsTypes(TypedDict):
 class StatsTrackingTypes(TypedDict):
     camera_metrics: dict[str, CameraMetricsTypes]
     detectors: dict[str, ObjectDetectProcess]
+    pose_estimators: dict[str, PoseEstimateProcess]
     started: int
     latest_vigision_version: str
     last_updated: int
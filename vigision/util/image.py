@@ -1,9 +1,14 @@
 """Utilities for creating and manipulating image frames."""
 
 import datetime
+import fcntl
 import logging
+import os
 import subprocess as sp
+import tempfile
+import threading
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from multiprocessing import shared_memory
 from string import printable
 from typing import AnyStr, Optional
@@ -12,6 +17,8 @@ import cv2
 import numpy as np
 from unidecode import unidecode
 
+from vigision.const import FRAME_RING_MAX_AGE
+
 logger = logging.getLogger(__name__)
 
 
@@ -580,6 +587,86 @@ def yuv_region_2_bgr(frame, region):
         raise
 
 
+YUV_REGION_CONVERSIONS = {
+    "rgb": yuv_region_2_rgb,
+    "bgr": yuv_region_2_bgr,
+    "yuv": yuv_region_2_yuv,
+}
+
+
+class YuvFrameView:
+    """Lazy color conversions of a yuv I420 frame.
+
+    Regions and rectangles are only converted when they are requested and
+    each conversion is cached for the life of the view, so detection, pose
+    crops and debug drawing of a frame share them. Indexing the view with
+    (rows, columns) slices returns the bgr pixels of that rectangle, which
+    lets it stand in for a bgr frame when cropping. Returned arrays are
+    shared and must not be modified.
+    """
+
+    def __init__(self, yuv_frame: np.ndarray):
+        self.yuv = yuv_frame
+        self.height = yuv_frame.shape[0] // 3 * 2
+        self.width = yuv_frame.shape[1]
+        self.shape = (self.height, self.width, 3)
+        self._regions: dict[tuple, np.ndarray] = {}
+        self._crops: dict[tuple, np.ndarray] = {}
+        self._bgr: Optional[np.ndarray] = None
+
+    def region(self, region, color: str = "bgr") -> np.ndarray:
+        """Square model region in rgb, bgr or 3 channel yuv, see yuv_region_2_rgb."""
+        key = (color, tuple(region))
+        if key not in self._regions:
+            self._regions[key] = YUV_REGION_CONVERSIONS[color](self.yuv, region)
+
+        return self._regions[key]
+
+    def bgr(self) -> np.ndarray:
+        """The full frame in bgr."""
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.yuv, cv2.COLOR_YUV2BGR_I420)
+
+        return self._bgr
+
+    def __getitem__(self, index) -> np.ndarray:
+        rows, cols = index
+        y1, y2, _ = rows.indices(self.height)
+        x1, x2, _ = cols.indices(self.width)
+
+        if self._bgr is not None:
+            return self._bgr[y1:y2, x1:x2]
+
+        if y2 <= y1 or x2 <= x1:
+            return np.empty((0, 0, 3), np.uint8)
+
+        # the chroma planes are subsampled by 2, so convert an aligned rectangle
+        crop = (x1 // 2 * 2, y1 // 2 * 2, x2 + x2 % 2, y2 + y2 % 2)
+        if crop not in self._crops:
+            self._crops[crop] = self._convert_crop(crop)
+
+        return self._crops[crop][
+            y1 - crop[1] : y2 - crop[1], x1 - crop[0] : x2 - crop[0]
+        ]
+
+    def _convert_crop(self, crop) -> np.ndarray:
+        x1, y1, x2, y2 = crop
+        width = x2 - x1
+        height = y2 - y1
+        chroma_size = self.height * self.width // 4
+        u = self.yuv[self.height :].reshape(-1)[:chroma_size]
+        v = self.yuv[self.height :].reshape(-1)[chroma_size:]
+        chroma_shape = (self.height // 2, self.width // 2)
+        chroma_crop = (slice(y1 // 2, y2 // 2), slice(x1 // 2, x2 // 2))
+
+        yuv_crop = np.empty((height * 3 // 2, width), np.uint8)
+        yuv_crop[:height] = self.yuv[y1:y2, x1:x2]
+        planes = yuv_crop[height:].reshape(2, -1)
+        planes[0] = u.reshape(chroma_shape)[chroma_crop].ravel()
+        planes[1] = v.reshape(chroma_shape)[chroma_crop].ravel()
+        return cv2.cvtColor(yuv_crop, cv2.COLOR_YUV2BGR_I420)
+
+
 def intersection(box_a, box_b) -> Optional[list[int]]:
     """Return intersection box or None if boxes do not intersect."""
     if (
@@ -664,6 +751,18 @@ class FrameManager(ABC):
     def delete(self, name):
         pass
 
+    def create_frame(self, camera: str, frame_time: float, size: int):
+        return self.create(f"{camera}{frame_time}", size)
+
+    def get_frame(self, camera: str, frame_time: float, shape):
+        return self.get(f"{camera}{frame_time}", shape)
+
+    def close_frame(self, camera: str, frame_time: float):
+        self.close(f"{camera}{frame_time}")
+
+    def delete_frame(self, camera: str, frame_time: float):
+        self.delete(f"{camera}{frame_time}")
+
 
 class DictFrameManager(FrameManager):
     def __init__(self):
@@ -685,9 +784,166 @@ class DictFrameManager(FrameManager):
         del self.frames[name]
 
 
+class SharedFrameRing:
+    """Preallocated frame slots of a camera in a single shared memory segment.
+
+    The header holds the frame time and the reference count of every slot.
+    A slot is reused once its count drops to zero, so a frame is addressed by
+    its slot and verified with the frame time stored in the slot. References
+    of a lost detection message or a crashed consumer are never released, a
+    slot whose frame is older than FRAME_RING_MAX_AGE is reclaimed when the
+    ring is full.
+    """
+
+    def __init__(
+        self, camera: str, frame_size: int = 0, slots: int = 0, create: bool = False
+    ):
+        name = SharedFrameRing.segment_name(camera)
+
+        if create:
+            size = SharedFrameRing.size(frame_size, slots)
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # left behind by a crash, none of its frames are valid
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+            np.ndarray((2,), np.int64, buffer=self.shm.buf)[:] = (slots, frame_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.slots, self.frame_size = (
+            int(v) for v in np.ndarray((2,), np.int64, buffer=self.shm.buf)
+        )
+        self.frame_times = np.ndarray(
+            (self.slots,), np.float64, buffer=self.shm.buf, offset=16
+        )
+        self.refs = np.ndarray(
+            (self.slots,), np.int64, buffer=self.shm.buf, offset=16 + 8 * self.slots
+        )
+        self.data = np.ndarray(
+            (self.slots, self.frame_size),
+            np.uint8,
+            buffer=self.shm.buf,
+            offset=16 + 16 * self.slots,
+        )
+        # a lock of the lock file orders processes and this lock the threads
+        # of a process, which share the file lock
+        self.lock_file = open(SharedFrameRing.lock_path(camera), "a")
+        self.lock = threading.Lock()
+
+        if create:
+            self.frame_times[:] = 0
+            self.refs[:] = 0
+
+    @staticmethod
+    def segment_name(camera: str) -> str:
+        return f"frames-{camera}"
+
+    @staticmethod
+    def lock_path(camera: str) -> str:
+        return os.path.join(
+            tempfile.gettempdir(), f"{SharedFrameRing.segment_name(camera)}.lock"
+        )
+
+    @staticmethod
+    def size(frame_size: int, slots: int) -> int:
+        return 16 + slots * (16 + frame_size)
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _find(self, frame_time: float) -> Optional[int]:
+        slots = np.flatnonzero((self.frame_times == frame_time) & (self.refs > 0))
+        return int(slots[0]) if len(slots) else None
+
+    def acquire(self, frame_time: float) -> Optional[int]:
+        """Take the free slot holding the oldest frame for a new frame with a
+        single reference, None if every slot is in use."""
+        with self.locked():
+            free = np.flatnonzero(self.refs == 0)
+
+            if len(free) == 0:
+                free = np.flatnonzero(
+                    frame_time - self.frame_times > FRAME_RING_MAX_AGE
+                )
+
+                if len(free) == 0:
+                    return None
+
+                slot = int(free[np.argmin(self.frame_times[free])])
+                logger.warning(
+                    f"Reclaiming frame {self.frame_times[slot]} of {self.shm.name} "
+                    f"with {self.refs[slot]} references that were never released."
+                )
+            else:
+                slot = int(free[np.argmin(self.frame_times[free])])
+
+            self.frame_times[slot] = frame_time
+            self.refs[slot] = 1
+            return slot
+
+    def retain(self, frame_time: float) -> Optional[int]:
+        """Add a reference to the slot of a frame, None if it was released."""
+        with self.locked():
+            slot = self._find(frame_time)
+
+            if slot is not None:
+                self.refs[slot] += 1
+
+            return slot
+
+    def release(self, slot: int, frame_time: float):
+        with self.locked():
+            # the slot may have been reclaimed for a newer frame
+            if self.frame_times[slot] == frame_time:
+                self.refs[slot] = max(self.refs[slot] - 1, 0)
+
+    def release_frame(self, frame_time: float):
+        with self.locked():
+            slot = self._find(frame_time)
+
+            if slot is not None:
+                self.refs[slot] -= 1
+
+    def close(self):
+        # views of the buffer have to be gone before it can be closed
+        del self.frame_times, self.refs, self.data
+        self.shm.close()
+        self.lock_file.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+        try:
+            os.remove(self.lock_file.name)
+        except FileNotFoundError:
+            pass
+
+
 class SharedMemoryFrameManager(FrameManager):
+    """Named shared memory buffers and the camera frames of the frame rings.
+
+    Camera frames are created with the reference held by the pipeline, which
+    deleting the frame releases. Getting a frame holds another reference until
+    this manager closes or deletes it.
+    """
+
     def __init__(self):
         self.shm_store = {}
+        self.rings: dict[str, SharedFrameRing] = {}
+        # slot of every frame this manager holds a reference to
+        self.frame_slots: dict[tuple[str, float], int] = {}
 
     def create(self, name, size) -> AnyStr:
         shm = shared_memory.SharedMemory(name=name, create=True, size=size)
@@ -713,6 +969,49 @@ class SharedMemoryFrameManager(FrameManager):
             self.shm_store[name].unlink()
             del self.shm_store[name]
 
+    def _ring(self, camera: str) -> SharedFrameRing:
+        if camera not in self.rings:
+            self.rings[camera] = SharedFrameRing(camera)
+
+        return self.rings[camera]
+
+    def create_frame(self, camera: str, frame_time: float, size: int):
+        """Buffer of a new frame, None when every slot of the ring is in use."""
+        ring = self._ring(camera)
+        slot = ring.acquire(frame_time)
+
+        if slot is None:
+            return None
+
+        return ring.data[slot, :size]
+
+    def get_frame(self, camera: str, frame_time: float, shape):
+        ring = self._ring(camera)
+        key = (camera, frame_time)
+
+        if key not in self.frame_slots:
+            slot = ring.retain(frame_time)
+
+            if slot is None:
+                raise FileNotFoundError(
+                    f"{camera}{frame_time} is not in the frame ring"
+                )
+
+            self.frame_slots[key] = slot
+
+        size = int(np.prod(shape))
+        return ring.data[self.frame_slots[key], :size].reshape(shape)
+
+    def close_frame(self, camera: str, frame_time: float):
+        slot = self.frame_slots.pop((camera, frame_time), None)
+
+        if slot is not None:
+            self._ring(camera).release(slot, frame_time)
+
+    def delete_frame(self, camera: str, frame_time: float):
+        self.close_frame(camera, frame_time)
+        self._ring(camera).release_frame(frame_time)
+
 
 def create_mask(frame_shape, mask):
     mask_img = np.zeros(frame_shape, np.uint8)
@@ -3,13 +3,14 @@
 import datetime
 import logging
 import math
+from abc import ABC, abstractmethod
 from collections import defaultdict
 
 import cv2
 import numpy as np
 from peewee import DoesNotExist
 
-from vigision.config import DetectConfig, ModelConfig
+from vigision.config import DetectConfig, ModelConfig, MosaicConfig, RegionPackerEnum
 from vigision.const import (
     LABEL_CONSOLIDATION_DEFAULT,
     LABEL_CONSOLIDATION_MAP,
@@ -24,9 +25,8 @@ from vigision.util.image import (
     clipped,
     intersection,
     intersection_over_union,
-    yuv_region_2_bgr,
-    yuv_region_2_rgb,
-    yuv_region_2_yuv,
+    YUV_REGION_CONVERSIONS,
+    YuvFrameView,
 )
 
 logger = logging.getLogger(__name__)
@@ -298,13 +298,26 @@ def yuv_to_rgb(frame):
 #     # Expand dimensions since the model expects images to have shape: [1, height, width, 3]
 #     return np.expand_dims(rgb_frame, axis=0)
 
-def create_tensor_input(frame, model_config: ModelConfig, detector_config: BaseDetectorConfig, region):
-    if detector_config["detector_name"].type == "cpu":
-        cropped_frame = yuv_region_2_rgb(frame, region)
+def get_detector_region_frame(frame, detector_config: BaseDetectorConfig, region):
+    """Crop the region from the yuv frame in the format expected by the detector.
+
+    @param frame: yuv frame or YuvFrameView of it, which caches the conversion
+    """
+    if detector_config["detector_name"].type in ["cpu", "onnx_cpu"]:
+        color = "rgb"
     elif detector_config["detector_name"].type == "gpu":
-        cropped_frame = yuv_region_2_bgr(frame, region)
+        color = "bgr"
     else:
-        cropped_frame = yuv_region_2_yuv(frame, region)
+        color = "yuv"
+
+    if isinstance(frame, YuvFrameView):
+        return frame.region(region, color)
+
+    return YUV_REGION_CONVERSIONS[color](frame, region)
+
+
+def create_tensor_input(frame, model_config: ModelConfig, detector_config: BaseDetectorConfig, region):
+    cropped_frame = get_detector_region_frame(frame, detector_config, region)
 
     # Resize if needed
     if cropped_frame.shape != (model_config.height, model_config.width, 3):
@@ -318,6 +331,162 @@ def create_tensor_input(frame, model_config: ModelConfig, detector_config: BaseD
     return np.expand_dims(cropped_frame, axis=0)
 
 
+def get_mosaic_min_region_size(model_config: ModelConfig, mosaic: MosaicConfig) -> int:
+    """Get the min region size when regions are packed into a mosaic."""
+    if mosaic.min_region_size:
+        return min(mosaic.min_region_size, get_min_region_size(model_config))
+
+    return get_min_region_size(model_config) // 2
+
+
+def get_tile_size(region) -> int:
+    # matches the size of the frame cropped by yuv_crop_and_resize
+    return (region[3] - region[1]) // 4 * 4
+
+
+class MosaicCanvas:
+    """A model sized canvas of regions placed at their native scale."""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        # (region, x, y) of each region placed on the canvas
+        self.tiles: list[tuple[tuple[int, int, int, int], int, int]] = []
+
+    @property
+    def regions(self):
+        return [tile[0] for tile in self.tiles]
+
+    @property
+    def fill(self) -> float:
+        """Fraction of the canvas covered by regions."""
+        return sum(get_tile_size(tile[0]) ** 2 for tile in self.tiles) / (
+            self.width * self.height
+        )
+
+    def add(self, region, x: int, y: int):
+        self.tiles.append((region, x, y))
+
+    def create_tensor_input(self, frame, detector_config: BaseDetectorConfig):
+        canvas = np.zeros((1, self.height, self.width, 3), np.uint8)
+
+        for region, x, y in self.tiles:
+            size = get_tile_size(region)
+            canvas[0, y : y + size, x : x + size] = get_detector_region_frame(
+                frame, detector_config, region
+            )
+
+        return canvas
+
+    def map_detections(self, detections):
+        """Split detections on the canvas into detections relative to each region.
+
+        @param detections: (label, score, (y1, x1, y2, x2)) relative to the canvas
+        @return: list of (region, detections) with boxes relative to the region
+        """
+        region_detections = [(region, []) for region in self.regions]
+
+        for label, score, box in detections:
+            center_x = (box[1] + box[3]) / 2 * self.width
+            center_y = (box[0] + box[2]) / 2 * self.height
+
+            for (region, x, y), (_, tile_detections) in zip(
+                self.tiles, region_detections
+            ):
+                size = get_tile_size(region)
+
+                if not (x <= center_x < x + size and y <= center_y < y + size):
+                    continue
+
+                # boxes can't extend past the tile they were detected in
+                tile_detections.append(
+                    (
+                        label,
+                        score,
+                        (
+                            min(max((box[0] * self.height - y) / size, 0.0), 1.0),
+                            min(max((box[1] * self.width - x) / size, 0.0), 1.0),
+                            min(max((box[2] * self.height - y) / size, 0.0), 1.0),
+                            min(max((box[3] * self.width - x) / size, 0.0), 1.0),
+                        ),
+                    )
+                )
+                break
+
+        return region_detections
+
+
+class RegionPacker(ABC):
+    @abstractmethod
+    def pack(
+        self, regions, width: int, height: int, max_canvases: int
+    ) -> tuple[list[MosaicCanvas], list]:
+        """Pack regions into at most max_canvases canvases of width x height.
+
+        Returns the canvases and the regions that were not packed.
+        """
+        pass
+
+
+class ShelfRegionPacker(RegionPacker):
+    """Places regions largest first on rows (shelves) across the canvases."""
+
+    def pack(self, regions, width, height, max_canvases):
+        canvases: list[MosaicCanvas] = []
+        # [y, height, next x] of the shelves in each canvas
+        canvas_shelves: list[list[list[int]]] = []
+        unpacked = []
+
+        for region in sorted(regions, key=get_tile_size, reverse=True):
+            size = get_tile_size(region)
+
+            if size > width or size > height:
+                unpacked.append(region)
+                continue
+
+            for canvas, shelves in zip(canvases, canvas_shelves):
+                position = self.find_position(shelves, size, width, height)
+
+                if position:
+                    canvas.add(region, *position)
+                    break
+            else:
+                if len(canvases) < max_canvases:
+                    canvas = MosaicCanvas(width, height)
+                    shelves = []
+                    canvas.add(region, *self.find_position(shelves, size, width, height))
+                    canvases.append(canvas)
+                    canvas_shelves.append(shelves)
+                else:
+                    unpacked.append(region)
+
+        return canvases, unpacked
+
+    def find_position(self, shelves, size, width, height):
+        for shelf in shelves:
+            if size <= shelf[1] and shelf[2] + size <= width:
+                x = shelf[2]
+                shelf[2] += size
+                return (x, shelf[0])
+
+        y = shelves[-1][0] + shelves[-1][1] if shelves else 0
+
+        if y + size > height:
+            return None
+
+        shelves.append([y, size, size])
+        return (0, y)
+
+
+REGION_PACKERS: dict[RegionPackerEnum, type[RegionPacker]] = {
+    RegionPackerEnum.shelf: ShelfRegionPacker,
+}
+
+
+def create_region_packer(mosaic: MosaicConfig) -> RegionPacker:
+    return REGION_PACKERS[mosaic.packer]()
+
+
 def box_overlaps(b1, b2):
     if b1[2] < b2[0] or b1[0] > b2[2] or b1[1] > b2[3] or b1[3] < b2[1]:
         return False
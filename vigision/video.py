@@ -7,7 +7,8 @@ import signal
 import subprocess as sp
 import threading
 import time
-import torch
+from typing import Optional
+
 import numpy as np
 import cv2
 from setproctitle import setproctitle
@@ -35,6 +36,7 @@ from vigision.util.builtin import EventsPerSecond, get_tomorrow_at_time
 from vigision.util.image import (
     FrameManager,
     SharedMemoryFrameManager,
+    YuvFrameView,
     draw_box_with_label,
     intersection_over_union
 )
@@ -44,7 +46,9 @@ from vigision.util.object import (
     get_cluster_candidates,
     get_cluster_region,
     get_cluster_region_from_grid,
+    create_region_packer,
     get_min_region_size,
+    get_mosaic_min_region_size,
     get_startup_regions,
     inside_any,
     intersects_any,
@@ -52,8 +56,13 @@ from vigision.util.object import (
     reduce_detections,
 )
 from vigision.util.services import listen
-from vigision.pose_estimate_loader import SPPE_FastPose
-from vigision.fall_detector_loader import TSSTG
+from vigision.pose_estimation import FALL_SEQUENCE_LENGTH, RemotePoseEstimator
+from vigision.fall_detector_loader import FALL_CLASS_NAMES
+from vigision.fall_scheduler import (
+    FallCandidateFilter,
+    FallScheduler,
+    StationaryPoseCache,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -98,6 +107,25 @@ def start_or_restart_ffmpeg(
     return process
 
 
+def read_frame(stream, buffer) -> int:
+    """Read a frame from the stream straight into the buffer.
+
+    @return: number of bytes read, less than the buffer size if the stream ended
+    """
+    view = memoryview(buffer).cast("B")
+    read_size = 0
+
+    while read_size < len(view):
+        count = stream.readinto(view[read_size:])
+
+        if not count:
+            break
+
+        read_size += count
+
+    return read_size
+
+
 def capture_frames(
     ffmpeg_process,
     camera_name,
@@ -106,6 +134,8 @@ def capture_frames(
     frame_queue,
     fps: mp.Value,
     skipped_fps: mp.Value,
+    short_reads: mp.Value,
+    corrupt_reads: mp.Value,
     current_frame: mp.Value,
     stop_event: mp.Event,
 ):
@@ -114,41 +144,59 @@ def capture_frames(
     frame_rate.start()
     skipped_eps = EventsPerSecond()
     skipped_eps.start()
+    # frames that don't fit in the frame ring are read into this buffer
+    discard_buffer = np.empty(frame_size, np.uint8)
     while True:
         fps.value = frame_rate.eps()
         skipped_fps.value = skipped_eps.eps()
 
         current_frame.value = datetime.datetime.now().timestamp()
-        frame_name = f"{camera_name}{current_frame.value}"
-        frame_buffer = frame_manager.create(frame_name, frame_size)
+        frame_time = current_frame.value
+        frame_buffer = frame_manager.create_frame(camera_name, frame_time, frame_size)
         try:
-            frame_buffer[:] = ffmpeg_process.stdout.read(frame_size)
+            read_size = read_frame(
+                ffmpeg_process.stdout,
+                discard_buffer if frame_buffer is None else frame_buffer,
+            )
         except Exception:
+            read_size = None
+
+        if read_size != frame_size:
+            # give the slot back to the ring
+            frame_manager.delete_frame(camera_name, frame_time)
+
             # shutdown has been initiated
             if stop_event.is_set():
                 break
+
+            failed_reads = corrupt_reads if read_size is None else short_reads
+            with failed_reads.get_lock():
+                failed_reads.value += 1
+
             logger.error(f"{camera_name}: Unable to read frames from ffmpeg process.")
 
             if ffmpeg_process.poll() is not None:
                 logger.error(
                     f"{camera_name}: ffmpeg process is not running. exiting capture thread..."
                 )
-                frame_manager.delete(frame_name)
                 break
             continue
 
+        if frame_buffer is None:
+            # every slot of the frame ring is still in use, skip this frame
+            skipped_eps.update()
+            continue
+
         frame_rate.update()
 
         # don't lock the queue to check, just try since it should rarely be full
         try:
             # add to the queue
-            frame_queue.put(current_frame.value, False)
-            # close the frame
-            frame_manager.close(frame_name)
+            frame_queue.put(frame_time, False)
         except queue.Full:
             # if the queue is full, skip this frame
             skipped_eps.update()
-            frame_manager.delete(frame_name)
+            frame_manager.delete_frame(camera_name, frame_time)
 
 
 class CameraWatchdog(threading.Thread):
@@ -159,6 +207,8 @@ class CameraWatchdog(threading.Thread):
         frame_queue,
         camera_fps,
         skipped_fps,
+        short_reads,
+        corrupt_reads,
         ffmpeg_pid,
         stop_event,
     ):
@@ -172,6 +222,8 @@ class CameraWatchdog(threading.Thread):
         self.ffmpeg_other_processes: list[dict[str, any]] = []
         self.camera_fps = camera_fps
         self.skipped_fps = skipped_fps
+        self.short_reads = short_reads
+        self.corrupt_reads = corrupt_reads
         self.ffmpeg_pid = ffmpeg_pid
         self.frame_queue = frame_queue
         self.frame_shape = self.config.frame_shape_yuv
@@ -294,6 +346,8 @@ class CameraWatchdog(threading.Thread):
             self.frame_queue,
             self.camera_fps,
             self.skipped_fps,
+            self.short_reads,
+            self.corrupt_reads,
             self.stop_event,
         )
         self.capture_thread.start()
@@ -333,6 +387,8 @@ class CameraCapture(threading.Thread):
         frame_queue,
         fps,
         skipped_fps,
+        short_reads,
+        corrupt_reads,
         stop_event,
     ):
         threading.Thread.__init__(self)
@@ -343,6 +399,8 @@ class CameraCapture(threading.Thread):
         self.fps = fps
         self.stop_event = stop_event
         self.skipped_fps = skipped_fps
+        self.short_reads = short_reads
+        self.corrupt_reads = corrupt_reads
         self.frame_manager = SharedMemoryFrameManager()
         self.ffmpeg_process = ffmpeg_process
         self.current_frame = mp.Value("d", 0.0)
@@ -357,6 +415,8 @@ class CameraCapture(threading.Thread):
             self.frame_queue,
             self.fps,
             self.skipped_fps,
+            self.short_reads,
+            self.corrupt_reads,
             self.current_frame,
             self.stop_event,
         )
@@ -382,6 +442,8 @@ def capture_camera(name, config: CameraConfig, process_info):
         frame_queue,
         process_info["camera_fps"],
         process_info["skipped_fps"],
+        process_info["short_reads"],
+        process_info["corrupt_reads"],
         process_info["ffmpeg_pid"],
         stop_event,
     )
@@ -397,6 +459,9 @@ def track_camera(
     labelmap,
     detection_queue,
     result_connection,
+    pose_queue,
+    pose_result_connection,
+    pose_estimator_config,
     detected_objects_queue,
     process_info,
     ptz_metrics,
@@ -424,7 +489,13 @@ def track_camera(
         frame_shape, config.motion, config.detect.fps, name=config.name
     )
     object_detector = RemoteObjectDetector(
-        name, labelmap, detection_queue, result_connection, model_config, stop_event
+        name,
+        labelmap,
+        detection_queue,
+        result_connection,
+        model_config,
+        stop_event,
+        config.detect.max_regions,
     )
     object_tracker = NorfairTracker(config, ptz_metrics)
 
@@ -433,14 +504,16 @@ def track_camera(
     # create communication for region grid updates
     requestor = InterProcessRequestor()
     fall_detect_config = config.fall_detect
-    pose_model = None
-    fall_model = None
+    pose_estimator = None
     if (fall_detect_config.enabled):
-        t_device = "cpu"
-        if detector_config["detector_name"].type == "gpu":
-            t_device = 'cuda'
-        pose_model = SPPE_FastPose('resnet50', 320, 256, device=t_device)
-        fall_model = TSSTG(weight_file='vigision/models/gcn/hfd_30frames.pth', device=t_device)
+        pose_estimator = RemotePoseEstimator(
+            name,
+            pose_queue,
+            pose_result_connection,
+            pose_estimator_config.max_persons,
+            stop_event,
+            pose_estimator_config.streaming_fall,
+        )
 
     process_frames(
         name,
@@ -454,8 +527,7 @@ def track_camera(
         frame_manager,
         motion_detector,
         object_detector,
-        pose_model,
-        fall_model,
+        pose_estimator,
         object_tracker,
         detected_objects_queue,
         process_info,
@@ -470,7 +542,7 @@ def track_camera(
     logger.info(f"{name}: emptying frame queue")
     while not frame_queue.empty():
         frame_time = frame_queue.get(False)
-        frame_manager.delete(f"{name}{frame_time}")
+        frame_manager.delete_frame(name, frame_time)
 
     logger.info(f"{name}: exiting subprocess")
 
@@ -484,11 +556,123 @@ def detect(
     region,
     objects_to_track,
     object_filters,
-    expand_bb = 0
+    expand_bb = 0,
+    frame_time = None
 ):
     tensor_input = create_tensor_input(frame, model_config, detector_config, region)
+    region_detections = object_detector.detect(tensor_input, frame_time=frame_time)
+    return get_region_detections(
+        detect_config,
+        region,
+        region_detections,
+        objects_to_track,
+        object_filters,
+        expand_bb,
+    )
+
+
+def detect_regions(
+    detect_config: DetectConfig,
+    object_detector,
+    frame,
+    model_config,
+    detector_config,
+    regions,
+    objects_to_track,
+    object_filters,
+    expand_bb = 0,
+    canvases = None,
+    frame_time = None
+):
+    """Detect all regions and mosaic canvases with a single batched request to the detector."""
+    slot = submit_regions(
+        object_detector,
+        frame,
+        model_config,
+        detector_config,
+        regions,
+        canvases,
+        frame_time,
+    )
+    return collect_regions(
+        detect_config,
+        object_detector,
+        slot,
+        regions,
+        objects_to_track,
+        object_filters,
+        expand_bb,
+        canvases,
+    )
+
+
+def submit_regions(
+    object_detector,
+    frame,
+    model_config,
+    detector_config,
+    regions,
+    canvases = None,
+    frame_time = None
+):
+    """Send the regions and mosaic canvases to the detector without waiting for the detections."""
+    canvases = canvases or []
+    tensor_inputs = [
+        canvas.create_tensor_input(frame, detector_config) for canvas in canvases
+    ] + [
+        create_tensor_input(frame, model_config, detector_config, region)
+        for region in regions
+    ]
+    return object_detector.submit(tensor_inputs, frame_time=frame_time)
+
+
+def collect_regions(
+    detect_config: DetectConfig,
+    object_detector,
+    slot,
+    regions,
+    objects_to_track,
+    object_filters,
+    expand_bb = 0,
+    canvases = None,
+):
+    """Wait for the detections of submitted regions and map them to the frame."""
+    canvases = canvases or []
+
+    if slot is None:
+        return []
+
+    batch_detections = object_detector.collect(slot)
+
+    # map the detections of each canvas back to the regions packed in it
+    region_batch = list(zip(regions, batch_detections[len(canvases) :]))
+    for canvas, canvas_detections in zip(canvases, batch_detections):
+        region_batch.extend(canvas.map_detections(canvas_detections))
+
+    detections = []
+    for region, region_detections in region_batch:
+        detections.extend(
+            get_region_detections(
+                detect_config,
+                region,
+                region_detections,
+                objects_to_track,
+                object_filters,
+                expand_bb,
+            )
+        )
+    return detections
+
+
+def get_region_detections(
+    detect_config: DetectConfig,
+    region,
+    region_detections,
+    objects_to_track,
+    object_filters,
+    expand_bb = 0
+):
     detections = []
-    region_detections = object_detector.detect(tensor_input)
     for d in region_detections:
         box = d[2]
         size = region[2] - region[0]
@@ -549,6 +733,19 @@ def get_encompassing_square(regions):
     # Return the encompassing square as (top_left_x, top_left_y, bottom_right_x, bottom_right_y)
     return (min_x, min_y, max_x, max_y)
 
+def get_detection_regions(regions, max_regions):
+    """Limit the regions to the number of detector slots available for the camera."""
+    if max_regions <= 1 or len(regions) <= 1:
+        return [get_encompassing_square(regions)]
+
+    if len(regions) > max_regions:
+        # merge the overflow into the last slot
+        return regions[: max_regions - 1] + [
+            get_encompassing_square(regions[max_regions - 1 :])
+        ]
+
+    return regions
+
 if True:
     
   
@@ -616,8 +813,7 @@ def process_frames(
     frame_manager: FrameManager,
     motion_detector: MotionDetector,
     object_detector: RemoteObjectDetector,
-    pose_model,
-    action_model,
+    pose_estimator: Optional[RemotePoseEstimator],
     object_tracker,
     detected_objects_queue: mp.Queue,
     process_info: dict,
@@ -630,6 +826,10 @@ def process_frames(
 ):
     fps = process_info["process_fps"]
     detection_fps = process_info["detection_fps"]
+    detect_rate = process_info["detect_rate"]
+    detect_priority = process_info["detect_priority"]
+    # frames worth of detection rate saved up, detection runs once it reaches 1
+    detect_credit = 0.0
     current_frame_time = process_info["detection_frame"]
     next_region_update = get_tomorrow_at_time(2)
     config_subscriber = ConfigSubscriber(f"config/detect/{camera_name}")
@@ -637,7 +837,22 @@ def process_frames(
     fps_tracker.start()
     startup_scan = True
     stationary_frame_counter = 0
+    fall_predictions = {}
+    fall_scheduler = FallScheduler(fall_detect_config)
+    fall_filter = FallCandidateFilter(fall_detect_config.prefilter)
+    stationary_poses = StationaryPoseCache(fall_detect_config.stationary_pose)
+    fall_filtered = process_info["fall_filtered"]
     region_min_size = get_min_region_size(model_config)
+    mosaic_fill = process_info["mosaic_fill"]
+    region_packer = None
+    # frame whose detections are still in flight while the next frame is prepared
+    pending = None
+    pipeline = detect_config.pipeline
+
+    if detect_config.mosaic.enabled:
+        # smaller regions leave room to pack several of them in one canvas
+        region_min_size = get_mosaic_min_region_size(model_config, detect_config.mosaic)
+        region_packer = create_region_packer(detect_config.mosaic)
 
     while not stop_event.is_set():
         # check for updated detect config
@@ -659,148 +874,236 @@ def process_frames(
             else:
                 frame_time = frame_queue.get(True, 1)
         except queue.Empty:
-            if exit_on_empty:
-                logger.info("Exiting track_objects...")
-                break
-            continue
+            frame_time = None
 
-        current_frame_time.value = frame_time
-        ptz_metrics["ptz_frame_time"].value = frame_time
+            # without a new frame to overlap with, finish the frame in flight
+            if pending is None:
+                if exit_on_empty:
+                    logger.info("Exiting track_objects...")
+                    break
+                continue
 
-        frame = frame_manager.get(
-            f"{camera_name}{frame_time}", (frame_shape[0] * 3 // 2, frame_shape[1])
-        )
+        submitted = None
+        if frame_time is not None:
+            current_frame_time.value = frame_time
+            ptz_metrics["ptz_frame_time"].value = frame_time
 
-        if frame is None:
-            logger.info(f"{camera_name}: frame {frame_time} is not in memory store.")
-            continue
-        debug_frame = cv2.cvtColor(frame.copy(), cv2.COLOR_YUV2BGR_I420)
-        bgr_frame = cv2.cvtColor(frame.copy(), cv2.COLOR_YUV2BGR_I420)
+            try:
+                frame = frame_manager.get_frame(
+                    camera_name, frame_time, (frame_shape[0] * 3 // 2, frame_shape[1])
+                )
+            except FileNotFoundError:
+                logger.info(f"{camera_name}: frame {frame_time} is not in memory store.")
+                continue
 
-        # look for motion if enabled
-        motion_boxes = motion_detector.detect(frame)
+            # colors are only converted for the regions and crops that need them
+            frame_view = YuvFrameView(frame)
 
-        regions = []
-        consolidated_detections = []
+            # look for motion if enabled
+            motion_boxes = motion_detector.detect(frame)
 
-        # if detection is disabled
-        if not detect_config.enabled:
-            object_tracker.match_and_update(frame_time, [])
-        else:
-            if stationary_frame_counter == detect_config.stationary.interval:
-                stationary_frame_counter = 0
-                stationary_object_ids = []
-            else:
-                stationary_frame_counter += 1
+            regions = []
+            canvases = []
+            detections = []
+            slot = None
 
-                stationary_object_ids = [
-                    obj["id"]
-                    for obj in object_tracker.tracked_objects.values()
-                    # if it has exceeded the stationary threshold
-                    if obj["motionless_count"] >= detect_config.stationary.threshold
-                    # and it hasn't disappeared
-                    and object_tracker.disappeared[obj["id"]] == 0
-                    # and it doesn't overlap with any current motion boxes when not calibrating
-                    and not intersects_any(
-                        obj["box"],
-                        [] if motion_detector.is_calibrating() else motion_boxes,
-                    )
-                ]
-
-            # get tracked object boxes that aren't stationary
-            tracked_object_boxes = [
-                (
-                    # use existing object box for stationary objects
-                    obj["estimate"]
-                    if obj["motionless_count"] < detect_config.stationary.threshold
-                    else obj["box"]
-                )
-                for obj in object_tracker.tracked_objects.values()
-                if obj["id"] not in stationary_object_ids
-            ]
-            object_boxes = tracked_object_boxes + object_tracker.untracked_object_boxes
+            # idle cameras get a lower detection rate while the detectors are overloaded
+            detect_credit = min(detect_credit + detect_rate.value / detect_config.fps, 1.0)
+            run_detection = detect_config.enabled and detect_credit >= 1.0
+            if run_detection:
+                detect_credit -= 1.0
 
-            # get consolidated regions for tracked objects
-            regions = [
-                get_cluster_region(
-                    frame_shape, region_min_size, candidate, object_boxes
-                )
-                for candidate in get_cluster_candidates(
-                    frame_shape, region_min_size, object_boxes
-                )
-            ]
+            if run_detection:
+                if stationary_frame_counter == detect_config.stationary.interval:
+                    stationary_frame_counter = 0
+                    stationary_object_ids = []
+                else:
+                    stationary_frame_counter += 1
+
+                    stationary_object_ids = [
+                        obj["id"]
+                        for obj in object_tracker.tracked_objects.values()
+                        # if it has exceeded the stationary threshold
+                        if obj["motionless_count"] >= detect_config.stationary.threshold
+                        # and it hasn't disappeared
+                        and object_tracker.disappeared[obj["id"]] == 0
+                        # and it doesn't overlap with any current motion boxes when not calibrating
+                        and not intersects_any(
+                            obj["box"],
+                            [] if motion_detector.is_calibrating() else motion_boxes,
+                        )
+                    ]
 
-            # only add in the motion boxes when not calibrating and a ptz is not moving via autotracking
-            # ptz_moving_at_frame_time() always returns False for non-autotracking cameras
-            if not motion_detector.is_calibrating() and not ptz_moving_at_frame_time(
-                frame_time,
-                ptz_metrics["ptz_start_time"].value,
-                ptz_metrics["ptz_stop_time"].value,
-            ):
-                # find motion boxes that are not inside tracked object regions
-                standalone_motion_boxes = [
-                    b for b in motion_boxes if not inside_any(b, regions)
+                # get tracked object boxes that aren't stationary
+                tracked_object_boxes = [
+                    (
+                        # use existing object box for stationary objects
+                        obj["estimate"]
+                        if obj["motionless_count"] < detect_config.stationary.threshold
+                        else obj["box"]
+                    )
+                    for obj in object_tracker.tracked_objects.values()
+                    if obj["id"] not in stationary_object_ids
                 ]
+                object_boxes = tracked_object_boxes + object_tracker.untracked_object_boxes
 
-                if standalone_motion_boxes:
-                    motion_clusters = get_cluster_candidates(
-                        frame_shape,
-                        region_min_size,
-                        standalone_motion_boxes,
+                # get consolidated regions for tracked objects
+                regions = [
+                    get_cluster_region(
+                        frame_shape, region_min_size, candidate, object_boxes
+                    )
+                    for candidate in get_cluster_candidates(
+                        frame_shape, region_min_size, object_boxes
                     )
-                    motion_regions = [
-                        get_cluster_region_from_grid(
+                ]
+
+                # only add in the motion boxes when not calibrating and a ptz is not moving via autotracking
+                # ptz_moving_at_frame_time() always returns False for non-autotracking cameras
+                if not motion_detector.is_calibrating() and not ptz_moving_at_frame_time(
+                    frame_time,
+                    ptz_metrics["ptz_start_time"].value,
+                    ptz_metrics["ptz_stop_time"].value,
+                ):
+                    # find motion boxes that are not inside tracked object regions
+                    standalone_motion_boxes = [
+                        b for b in motion_boxes if not inside_any(b, regions)
+                    ]
+
+                    if standalone_motion_boxes:
+                        motion_clusters = get_cluster_candidates(
                             frame_shape,
                             region_min_size,
-                            candidate,
                             standalone_motion_boxes,
-                            region_grid,
                         )
-                        for candidate in motion_clusters
-                    ]
-                    regions += motion_regions
+                        motion_regions = [
+                            get_cluster_region_from_grid(
+                                frame_shape,
+                                region_min_size,
+                                candidate,
+                                standalone_motion_boxes,
+                                region_grid,
+                            )
+                            for candidate in motion_clusters
+                        ]
+                        regions += motion_regions
+
+                # if starting up, get the next startup scan region
+                if startup_scan:
+                    for region in get_startup_regions(
+                        frame_shape, region_min_size, region_grid
+                    ):
+                        regions.append(region)
+                    startup_scan = False
+
+                # resize regions and detect
+                # seed with stationary objects
+                # regions = [(0, 0, frame_shape[1], frame_shape[1])]
+                if region_packer is not None and regions:
+                    canvases, regions = region_packer.pack(
+                        regions,
+                        model_config.width,
+                        model_config.height,
+                        detect_config.max_regions,
+                    )
 
-            # if starting up, get the next startup scan region
-            if startup_scan:
-                for region in get_startup_regions(
-                    frame_shape, region_min_size, region_grid
-                ):
-                    regions.append(region)
-                startup_scan = False
+                    # keep a detector slot for the regions that could not be packed
+                    if regions and len(canvases) == detect_config.max_regions:
+                        regions += canvases.pop().regions
 
-            # resize regions and detect
-            # seed with stationary objects
-            # regions = [(0, 0, frame_shape[1], frame_shape[1])]
-            regions = [get_encompassing_square(regions)]
+                    if canvases:
+                        mosaic_fill.value = (
+                            mosaic_fill.value * 9
+                            + sum(canvas.fill for canvas in canvases) / len(canvases)
+                        ) / 10
 
-            detections = [
-                (
-                    obj["label"],
-                    obj["score"],
-                    obj["box"],
-                    obj["area"],
-                    obj["ratio"],
-                    obj["region"],
-                )
-                for obj in object_tracker.tracked_objects.values()
-                if obj["id"] in stationary_object_ids
-            ]
+                if regions or not canvases:
+                    regions = get_detection_regions(
+                        regions, detect_config.max_regions - len(canvases)
+                    )
 
-            for region in regions:
-                detections.extend(
-                    detect(
-                        detect_config,
-                        object_detector,
-                        frame,
-                        model_config,
-                        detector_config,
-                        region,
-                        objects_to_track,
-                        object_filters,
-                        expand_bb = 10
+                detections = [
+                    (
+                        obj["label"],
+                        obj["score"],
+                        obj["box"],
+                        obj["area"],
+                        obj["ratio"],
+                        obj["region"],
                     )
+                    for obj in object_tracker.tracked_objects.values()
+                    if obj["id"] in stationary_object_ids
+                ]
+
+                # the detector works on this frame while the previous one is tracked
+                slot = submit_regions(
+                    object_detector,
+                    frame_view,
+                    model_config,
+                    detector_config,
+                    regions,
+                    canvases,
+                    frame_time,
                 )
 
+            submitted = (
+                frame_time,
+                frame,
+                frame_view,
+                motion_boxes,
+                detect_config.enabled,
+                run_detection,
+                regions,
+                canvases,
+                detections,
+                slot,
+            )
+
+        if submitted is None:
+            finished, pending = pending, None
+        elif pipeline:
+            finished, pending = pending, submitted
+        else:
+            finished = submitted
+
+        if finished is None:
+            continue
+
+        (
+            frame_time,
+            frame,
+            frame_view,
+            motion_boxes,
+            detect_enabled,
+            run_detection,
+            regions,
+            canvases,
+            detections,
+            slot,
+        ) = finished
+        consolidated_detections = []
+
+        # if detection is disabled
+        if not detect_enabled:
+            object_tracker.match_and_update(frame_time, [])
+        elif not run_detection:
+            object_tracker.update_frame_times(frame_time)
+        else:
+            detections.extend(
+                collect_regions(
+                    detect_config,
+                    object_detector,
+                    slot,
+                    regions,
+                    objects_to_track,
+                    object_filters,
+                    expand_bb = 10,
+                    canvases = canvases,
+                )
+            )
+            regions = regions + [
+                region for canvas in canvases for region in canvas.regions
+            ]
+
             consolidated_detections = reduce_detections(frame_shape, detections)
 
             # if detection was run on this frame, consolidate
@@ -814,93 +1117,157 @@ def process_frames(
             else:
                 object_tracker.update_frame_times(frame_time)
                 
-        # object_tracker.debug_draw(debug_frame, frame_time)
-        # cv2.imwrite(f"debug/track.jpg", debug_frame)
+        # fall streams follow the poses carried over to a new track
+        if pose_estimator is not None:
+            pose_estimator.move(object_tracker.pose_carry_overs)
+        object_tracker.pose_carry_overs.clear()
+
+        # collect the poses and fall predictions of the last finished request
+        pose_results = pose_estimator.get_results() if pose_estimator else None
+        if pose_results is not None:
+            pose_key_points, fall_scores = pose_results
+            for id, kps in pose_key_points.items():
+                if id in object_tracker.tracked_objects:
+                    object_tracker.update_pose_data(id, kps)
+                    stationary_poses.update(id, kps)
+                    fall_scheduler.update(
+                        id, kps, object_tracker.tracked_objects[id]["box"]
+                    )
+
+            for id, scores in fall_scores.items():
+                fall_scheduler.add_prediction(id, scores)
+
+            fall_predictions = {
+                id: scores
+                for id, scores in {**fall_predictions, **fall_scores}.items()
+                if id in object_tracker.tracked_objects
+            }
+            fall_scheduler.retain(object_tracker.tracked_objects)
+            fall_filter.retain(object_tracker.tracked_objects)
+            stationary_poses.retain(object_tracker.tracked_objects)
+            # lost tracks keep their stream until it is carried over or expires
+            pose_estimator.retain(
+                object_tracker.tracked_objects.keys()
+                | object_tracker.lost_tracks.keys()
+            )
 
         # build detections and add attributes
         detections = {}
-        pose_input = None
-        box_id_map = {}
-        for est_obj in object_tracker.tracker.tracked_objects:
+        fall_persons = []
+        stationary_person_ids = set()
+        moving_person = False
+        for obj in object_tracker.tracked_objects.values():
             fall_data = None
+            est_obj = object_tracker.track_object(obj["id"])
+            stationary = obj["motionless_count"] >= detect_config.stationary.threshold
+
+            if obj["label"] == "person" and not stationary:
+                moving_person = True
+
+            est_box = obj["box"]
+            if obj["frame_time"] != frame_time:
+                pred_box = tuple(map(int, est_obj.estimate.astype(int).ravel()))
+                x_min, y_min = min(est_box[0], pred_box[0]), min(est_box[1], pred_box[1])
+                x_max, y_max = max(est_box[2], pred_box[2]), max(est_box[3], pred_box[3])
+
+                # Adjust the bounding box coordinates with padding and ensure they remain within frame boundaries
+                x_min = max(0, x_min - 20)
+                y_min = max(0, y_min - 20)
+                x_max = min(frame_shape[1], x_max + 20)
+                y_max = min(frame_shape[0], y_max + 20)
+
+                # Update the estimate box
+                est_box = (x_min, y_min, x_max, y_max)
+            
+            if (fall_detect_config.enabled and obj["label"] == "person"):
+                est_score = obj["score"] if obj["frame_time"] == frame_time else 0.5
+                if stationary and not intersects_any(
+                    obj["box"],
+                    [] if motion_detector.is_calibrating() else motion_boxes,
+                ):
+                    stationary_person_ids.add(obj["id"])
+
+                fall_persons.append(
+                    (
+                        obj["id"],
+                        est_box,
+                        est_score,
+                        fall_filter.is_candidate(
+                            obj["id"], est_box, est_obj.estimate_velocity
+                        ),
+                    )
+                )
 
-            if (est_obj.id in object_tracker.track_id_map):
-                obj = object_tracker.tracked_objects[object_tracker.track_id_map[est_obj.id]]
-                est_box = obj["box"]
-                if obj["frame_time"] != frame_time:
-                    pred_box = tuple(map(int, est_obj.estimate.astype(int).ravel()))
-                    x_min, y_min = min(est_box[0], pred_box[0]), min(est_box[1], pred_box[1])
-                    x_max, y_max = max(est_box[2], pred_box[2]), max(est_box[3], pred_box[3])
-
-                    # Adjust the bounding box coordinates with padding and ensure they remain within frame boundaries
-                    x_min = max(0, x_min - 20)
-                    y_min = max(0, y_min - 20)
-                    x_max = min(frame_shape[1], x_max + 20)
-                    y_max = min(frame_shape[0], y_max + 20)
-
-                    # Update the estimate box
-                    est_box = (x_min, y_min, x_max, y_max)
-                
-                if (fall_detect_config.enabled and obj["label"] == "person"):
-                    est_score = obj["score"] if obj["frame_time"] == frame_time else 0.5
-
-                    det = torch.tensor([list(est_box) + [est_score, 1.0, 0.0]], dtype=torch.float32)
-                    box_id_map[tuple(est_box)] = obj["id"]
-                    pose_input = torch.cat([pose_input, det], dim=0) if pose_input is not None else det
-                    # snapshot_filename = None
-
-                    if len(object_tracker.key_points[obj["id"]]) == 30:
-                        pts = np.array(object_tracker.key_points[obj["id"]], dtype=np.float32)
-                        out = action_model.predict(pts, frame.shape[:2])
-                        # if (action_model.class_names[out[0].argmax()] == "Fall"):
-                        #     # save snapshot
-                        #     snapshot_filename = os.path.join(
-                        #         CLIPS_DIR, f"review/thumb-{camera_name}-{frame_time}.webp"
-                        #     )
-                        #     cv2.imwrite(snapshot_filename, bgr_frame)
-                        fall_data = {
-                            "label": action_model.class_names[out[0].argmax()],
-                            "score": out[0].max().item(),
-                            "box": est_box,
-                            "pose": object_tracker.key_points[obj["id"]][-1].tolist(),
-                            # "snapshot": snapshot_filename
-                        }
-                    elif len(object_tracker.key_points[obj["id"]]) > 0:
-                        fall_data = {
-                            "label": "unknown",
-                            "score": 0.0,
-                            "box": est_box,
-                            "pose": object_tracker.key_points[obj["id"]][-1].tolist(),
-                            # "snapshot": snapshot_filename
-                        }
-                detections[obj["id"]] = {**obj, "estimated_box": est_box,
-                                         "attributes": [], "fall_data": fall_data}
-        
-        if (pose_input is not None):
-            poses = pose_model.predict(bgr_frame, pose_input[:, 0:4], pose_input[:, 4])
-            for pose in poses:
-                kps = np.concatenate((pose['keypoints'].numpy(),
-                                                    pose['kp_score'].numpy()), axis=1)
-                object_tracker.update_pose_data(box_id_map[tuple(map(int, pose['bbox'].numpy().tolist()))], kps)
-                
-        # debug object tracking
-        # cv2.imwrite(f"debug/track.jpg", debug_frame)
+                pose_count = object_tracker.key_points.count(obj["id"])
+                if (
+                    pose_count == FALL_SEQUENCE_LENGTH
+                    and obj["id"] in fall_predictions
+                ):
+                    out = fall_predictions[obj["id"]]
+                    # the label only changes after enough agreeing windows
+                    label = fall_scheduler.label(obj["id"])
+                    fall_data = {
+                        "label": FALL_CLASS_NAMES[label],
+                        "score": out[label].item(),
+                        "box": est_box,
+                        "pose": object_tracker.key_points.last(obj["id"]).tolist(),
+                    }
+                elif pose_count > 0:
+                    fall_data = {
+                        "label": "unknown",
+                        "score": 0.0,
+                        "box": est_box,
+                        "pose": object_tracker.key_points.last(obj["id"]).tolist(),
+                    }
+            detections[obj["id"]] = {**obj, "estimated_box": est_box,
+                                     "attributes": [], "fall_data": fall_data}
+
+        # the results are picked up on a later frame
+        if pose_estimator is not None and pose_estimator.is_ready():
+            # cheap tracker based stage before the pose and fall models
+            pose_persons, filtered, restarted = fall_filter.select(fall_persons)
+            fall_filtered.value = (fall_filtered.value * 9 + filtered) / 10
+
+            # keep warm poses are too far apart for the fall model
+            for id in restarted:
+                object_tracker.key_points.clear(id)
+            pose_estimator.reset(restarted)
+
+            # stationary persons keep their last pose
+            pose_persons, reused_poses = stationary_poses.select(
+                pose_persons, stationary_person_ids
+            )
+            for id, kps in reused_poses.items():
+                object_tracker.update_pose_data(id, kps)
+                fall_scheduler.update(
+                    id, kps, object_tracker.tracked_objects[id]["box"]
+                )
 
-        if False:
-            bgr_frame = cv2.cvtColor(
-                frame,
-                cv2.COLOR_YUV2BGR_I420,
+            stationary_poses.requested(pose_persons)
+            sparse_ids = fall_filter.sparse_ids()
+            classified_ids = pose_estimator.submit(
+                frame_view,
+                pose_persons,
+                object_tracker.key_points,
+                frame.shape[:2],
+                {
+                    id
+                    for id, _, _ in pose_persons
+                    if id not in sparse_ids and fall_scheduler.is_due(id)
+                },
+                sparse_ids,
             )
+            fall_scheduler.submitted(classified_ids)
+
+        if False:
+            bgr_frame = frame_view.bgr().copy()
             object_tracker.debug_draw(bgr_frame, frame_time)
             cv2.imwrite(
                 f"debug/frames/track-{'{:.6f}'.format(frame_time)}.jpg", bgr_frame
             )
         # debug
         if False:
-            bgr_frame = cv2.cvtColor(
-                frame,
-                cv2.COLOR_YUV2BGR_I420,
-            )
+            bgr_frame = frame_view.bgr().copy()
 
             for m_box in motion_boxes:
                 cv2.rectangle(
@@ -956,9 +1323,16 @@ def process_frames(
                 f"debug/frames/{camera_name}-{'{:.6f}'.format(frame_time)}.jpg",
                 bgr_frame,
             )
+        # moving persons and possible falls keep the camera at its full detection rate
+        detect_priority.value = int(
+            fall_scheduler.is_alert()
+            or any(candidate for *_, candidate in fall_persons)
+            or moving_person
+        )
+
         # add to the queue if not full
         if detected_objects_queue.full():
-            frame_manager.delete(f"{camera_name}{frame_time}")
+            frame_manager.delete_frame(camera_name, frame_time)
             continue
         else:
             fps_tracker.update()
@@ -973,7 +1347,10 @@ def process_frames(
                 )
             )
             detection_fps.value = object_detector.fps.eps()
-            frame_manager.close(f"{camera_name}{frame_time}")
+            frame_manager.close_frame(camera_name, frame_time)
+
+    if pending is not None:
+        frame_manager.delete_frame(camera_name, pending[0])
 
     motion_detector.stop()
     requestor.stop()
@@ -3,6 +3,7 @@ export interface VigisionStats {
   cpu_usages: { [pid: string]: CpuStats };
   detectors: { [detectorKey: string]: DetectorStats };
   gpu_usages?: { [gpuKey: string]: GpuStats };
+  pose_estimators: { [poseEstimatorKey: string]: PoseEstimatorStats };
   processes: { [processKey: string]: ExtraProcessStats };
   service: ServiceStats;
   detection_fps: number;
@@ -13,11 +14,17 @@ export type CameraStats = {
   audio_rms: number;
   camera_fps: number;
   capture_pid: number;
+  corrupt_reads: number;
+  detect_rate: number;
+  detection_dropped: number;
   detection_enabled: number;
   detection_fps: number;
+  fall_filtered: number;
   ffmpeg_pid: number;
+  mosaic_fill: number;
   pid: number;
   process_fps: number;
+  short_reads: number;
   skipped_fps: number;
 };
 
@@ -29,9 +36,18 @@ export type CpuStats = {
 };
 
 export type DetectorStats = {
+  batch_size: number;
   detection_start: number;
   inference_speed: number;
   pid: number;
+  queue_wait: number;
+};
+
+export type PoseEstimatorStats = {
+  batch_size: number;
+  estimation_start: number;
+  inference_speed: number;
+  pid: number;
 };
 
 export type ExtraProcessStats = {